@@ -0,0 +1,346 @@
+'''
+File: hot_paths.py
+Company: Tether Education Inc.
+
+Micro-benchmarks of the hot paths of the matching. Run them and save the
+timings as a JSON baseline, then compare a later run against it. From the
+repository root:
+
+    python -m benchmarks.hot_paths run --output baseline.json
+    python -m benchmarks.hot_paths run --output current.json
+    python -m benchmarks.hot_paths compare baseline.json current.json
+
+compare exits with status 1 when a benchmark is slower than the baseline
+by more than the threshold.
+'''
+
+from typing import Callable, Dict, List, Tuple
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+from schoolchoice_da.entities import (Applicant, DeferredAcceptanceAlgorithm,
+    PolicyMaker, Program)
+from schoolchoice_da.entities.applicants_queue import QUEUE_TYPES
+from schoolchoice_da.synthetic import generate_market
+
+
+BENCHMARKS : Dict[str, Tuple[List[int], Callable]] = {}
+
+
+def benchmark(name: str, sizes: List[int]) -> Callable:
+    '''
+    Register a benchmark. The decorated function receives a size and a
+    numpy Generator and returns a (run, reset) pair: run is timed and reset,
+    which may be None, is called before every run without being timed.
+
+    Args:
+        name (str): Benchmark name
+        sizes (List[int]): Sizes to run, from smaller to larger
+    '''
+    def register(function: Callable) -> Callable:
+        BENCHMARKS[name] = (sizes, function)
+        return function
+    return register
+
+
+def build_market(n_applicants: int, rng: np.random.Generator) -> Dict:
+    '''
+    Synthetic market of two grades with about 20 applicants per program.
+
+    Args:
+        n_applicants (int): Number of applicants
+        rng (np.random.Generator)
+
+    Returns:
+        Dict: The DataFrames expected by PolicyMaker
+    '''
+    return generate_market(n_applicants=n_applicants,
+                            n_programs=max(n_applicants//20, 8),
+                            n_grades=2,
+                            random_state=rng)
+
+
+def build_policy_maker(n_applicants: int,
+        rng: np.random.Generator,
+        **kwargs) -> PolicyMaker:
+    '''
+    PolicyMaker over build_market, with every rule active. kwargs go to
+    PolicyMaker.
+    '''
+    with warnings.catch_warnings(), \
+            contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        return PolicyMaker(**build_market(n_applicants, rng),
+                            sibling_priority_activation=True,
+                            linked_postulation_activation=True,
+                            secured_enrollment_assignment=True,
+                            forced_secured_enrollment_assignment=True,
+                            transfer_capacity_activation=True,
+                            **kwargs)
+
+
+def _get_queue_applicants(size: int, rng: np.random.Generator) -> Tuple:
+    applicants = [Applicant(applicant_id=i, grade_id=1, links=[], siblings=[],
+                            vpostulation=np.array(['P']),
+                            vpostulation_scores=np.array([score]),
+                            vinstitution_id=np.array(['I']),
+                            vpriorities=np.array([0]),
+                            vquota_id=np.array([0]),
+                            vpriority_profile=np.array([1]))
+                for i, score in enumerate(rng.random(3*size).tolist())]
+    return applicants, [applicant.vscores[0] for applicant in applicants]
+
+
+def _register_queue_benchmarks(queue_type: str) -> None:
+    queue_class = QUEUE_TYPES[queue_type]
+
+    def fill(size, rng):
+        applicants, scores = _get_queue_applicants(size, rng)
+        queue = queue_class(size)
+        queue.reset_assignment()
+        for applicant, score in zip(applicants[:size], scores[:size]):
+            queue.add_applicant_to_program(applicant)
+            queue.add_score_to_program(score)
+        return queue, applicants, scores
+
+    @benchmark(f'Applicant_Queue.get_cut_off_score[{queue_type}]',
+                [100, 1000, 10000])
+    def get_cut_off_score(size, rng):
+        queue, _, _ = fill(size, rng)
+        def run():
+            for _ in range(size):
+                queue.get_cut_off_score()
+        return run, None
+
+    @benchmark(f'Applicant_Queue.reassign_applicants_and_scores[{queue_type}]',
+                [100, 1000, 10000])
+    def reassign_applicants_and_scores(size, rng):
+        queue, applicants, scores = fill(size, rng)
+        held = list(zip(applicants[:size], scores[:size]))
+        proposals = list(zip(applicants[size:], scores[size:]))
+        def reset():
+            queue.set_assignment([applicant for applicant, _ in held],
+                                [score for _, score in held])
+        def run():
+            for applicant, score in proposals:
+                cut_off_score = queue.get_cut_off_score()
+                if score < cut_off_score:
+                    queue.reassign_applicants_and_scores(applicant, score,
+                        queue.get_cut_off_applicant(cut_off_score))
+        return run, reset
+
+
+for _queue_type in QUEUE_TYPES:
+    _register_queue_benchmarks(_queue_type)
+
+
+@benchmark('DeferredAcceptanceAlgorithm.match_applicant_to_program',
+            [100, 1000, 10000])
+def match_applicant_to_program(size, rng):
+    applicants, _ = _get_queue_applicants(size, rng)
+    program = Program(program_id='P', quota_id=0, institution_id='I',
+                        grade_id=1, regular_capacity=size,
+                        special_vacancies={})
+    match = DeferredAcceptanceAlgorithm.match_applicant_to_program
+    def reset():
+        program._reset_matching_attributes()
+        for applicant in applicants:
+            applicant._reset_matching_attributes()
+    def run():
+        for applicant in applicants:
+            match(applicant, program, option_n=0)
+    return run, reset
+
+
+POLICY_MAKER_SIZES = [1000, 5000, 20000]
+
+
+@benchmark('PolicyMaker._add_postulation_data', POLICY_MAKER_SIZES)
+def add_postulation_data(size, rng):
+    market = build_market(size, rng)
+    policy_maker = build_policy_maker(100, rng)
+    def run():
+        policy_maker._add_postulation_data(
+            applicants=market['applicants'].copy(),
+            applications=market['applications'].copy())
+    return run, None
+
+
+def _register_round_benchmark(method: str) -> None:
+    @benchmark(f'PolicyMaker.{method}', POLICY_MAKER_SIZES)
+    def round_adjustment(size, rng):
+        policy_maker = build_policy_maker(size, rng)
+        policy_maker.match_applicants_and_programs()
+        # Applicants of the last grade, with their siblings and links of the
+        # first grade matched
+        applicants_df = policy_maker.applicants_df.loc[
+            policy_maker.applicants_df['grade_id'] == policy_maker.last_round]
+        applicants = policy_maker._get_applicant_objects(
+            applicants_df).tolist()
+        function = getattr(policy_maker, method)
+        def reset():
+            for applicant in applicants:
+                applicant._reset_matching_attributes()
+        def run():
+            function(applicants_df)
+        return run, reset
+
+
+for _method in ['_apply_sib_priority', '_apply_linked_reorder',
+                '_check_quota_postulation_order', '_set_secured_places']:
+    _register_round_benchmark(_method)
+
+
+@benchmark('PolicyMaker.get_results', POLICY_MAKER_SIZES)
+def get_results(size, rng):
+    policy_maker = build_policy_maker(size, rng)
+    policy_maker.match_applicants_and_programs()
+    return policy_maker.get_results, None
+
+
+def _register_engine_benchmark(engine: str) -> None:
+    @benchmark(f'PolicyMaker.match_applicants_and_programs[{engine}]',
+                POLICY_MAKER_SIZES)
+    def match_applicants_and_programs(size, rng):
+        # End to end, with the results and waitlists read after the matching
+        policy_maker = build_policy_maker(size, rng, engine=engine)
+        def run():
+            policy_maker.match_applicants_and_programs()
+            policy_maker.get_results()
+            policy_maker.get_waitlists()
+        return run, None
+
+
+for _engine in ['object', 'array']:
+    _register_engine_benchmark(_engine)
+
+
+def run_benchmarks(
+        repeat: int = 5,
+        max_size: int = None,
+        name_filter: str = None,
+        seed: int = 0) -> Dict:
+    '''
+    Run the registered benchmarks.
+
+    Args:
+        repeat (int): Timed runs of each benchmark and size
+        max_size (int, optional): Skip larger sizes
+        name_filter (str, optional): Only run benchmarks whose name contains it
+        seed (int): Seed of the inputs
+
+    Returns:
+        Dict: "meta" with the environment and "results" with the "name",
+        "size", "repeat" and "min", "median" and "mean" seconds of each run.
+    '''
+    results = []
+    for name, (sizes, function) in BENCHMARKS.items():
+        if name_filter and (name_filter not in name):
+            continue
+        for size in sizes:
+            if (max_size is not None) and (size > max_size):
+                continue
+            run, reset = function(size, np.random.default_rng(seed))
+            times = []
+            for _ in range(repeat):
+                if reset is not None:
+                    reset()
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+            results.append({'name':name,
+                            'size':size,
+                            'repeat':repeat,
+                            'min':min(times),
+                            'median':statistics.median(times),
+                            'mean':statistics.mean(times)})
+            print(f'{name:<70} {size:>8} {min(times):12.6f}s', flush=True)
+    return {'meta':{'python':platform.python_version(),
+                    'numpy':np.__version__,
+                    'pandas':pd.__version__,
+                    'platform':platform.platform(),
+                    'time':time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results':results}
+
+
+def compare_benchmarks(
+        baseline: Dict,
+        current: Dict,
+        threshold: float = 0.25) -> pd.DataFrame:
+    '''
+    Compare the min time of the benchmarks run in both baseline and current.
+
+    Args:
+        baseline (Dict): Output of run_benchmarks
+        current (Dict): Output of run_benchmarks
+        threshold (float): Relative slowdown flagged as regression
+
+    Returns:
+        pd.DataFrame: "name", "size", "baseline", "current", "ratio" and
+        "status", which is "regression", "improvement" or "ok".
+    '''
+    columns = ['name', 'size', 'min']
+    comparison = pd.DataFrame(baseline['results'], columns=columns).merge(
+        pd.DataFrame(current['results'], columns=columns),
+        on=['name', 'size'], suffixes=('_baseline', '_current')).rename(
+        columns={'min_baseline':'baseline', 'min_current':'current'})
+    comparison['ratio'] = comparison['current']/comparison['baseline']
+    comparison['status'] = np.select(
+        [comparison['ratio'] > 1 + threshold,
+        comparison['ratio'] < 1/(1 + threshold)],
+        ['regression', 'improvement'], 'ok')
+    return comparison
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Run the benchmarks.')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--max-size', type=int, default=None)
+    run_parser.add_argument('--filter', default=None,
+                            help='Only run benchmarks whose name contains it.')
+    run_parser.add_argument('--seed', type=int, default=0)
+    compare_parser = commands.add_parser('compare',
+        help='Compare two runs and flag regressions.')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.25,
+        help='Relative slowdown flagged as regression. Default 0.25.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        report = run_benchmarks(repeat=args.repeat, max_size=args.max_size,
+                                name_filter=args.filter, seed=args.seed)
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    comparison = compare_benchmarks(baseline, current, args.threshold)
+    with pd.option_context('display.width', 200,
+                            'display.max_colwidth', 80):
+        print(comparison.to_string(index=False))
+    regressions = comparison.loc[comparison['status'] == 'regression']
+    if len(regressions) > 0:
+        print(f'{len(regressions)} regression(s) over {args.threshold:.0%}.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,3 @@
 from schoolchoice_da.da import *
 from schoolchoice_da.entities import *
+from schoolchoice_da.synthetic import generate_market
@@ -16,9 +16,15 @@ def da(vacancies, applicants, applications, priority_profiles, quota_order,
         forced_secured_enrollment_assignment= False,
         transfer_capacity_activation= False,
         check_inputs=True,
+        queue_type='list',
+        engine='object',
+        n_jobs=1,
+        profile=False,
         **kwargs):
     '''
-    Main method for the application of Deferred Acceptance Algorithm
+    Main method for the application of Deferred Acceptance Algorithm.
+    If profile is True, it returns the results and the profile DataFrame
+    with the wall time, CPU time and peak memory of each phase.
     '''
 
     print('*******************************************************')
@@ -37,6 +43,10 @@ def da(vacancies, applicants, applications, priority_profiles, quota_order,
     print('Students with Secured Enrollment: ', secured_enrollment_assignment)
     print('Forced Secured Enrollment: ', forced_secured_enrollment_assignment)
     print('Transfer Capacity: ', transfer_capacity_activation)
+    print('Queue Type: ', queue_type)
+    print('Engine: ', engine)
+    print('Parallel Jobs: ', n_jobs)
+    print('Profile: ', profile)
     print('*******************************************************')
     print('*******************************************************')
 
@@ -56,6 +66,10 @@ def da(vacancies, applicants, applications, priority_profiles, quota_order,
         forced_secured_enrollment_assignment = forced_secured_enrollment_assignment,
         transfer_capacity_activation = transfer_capacity_activation,
         check_inputs = check_inputs,
+        queue_type = queue_type,
+        engine = engine,
+        n_jobs = n_jobs,
+        profile = profile,
         **kwargs)
 
     print('>> Starting matching algorithm')
@@ -63,6 +77,10 @@ def da(vacancies, applicants, applications, priority_profiles, quota_order,
     print('>> Getting results')
 
     output = policy_maker.get_results()
+    if profile:
+        profile_df = policy_maker.get_profile()
+        print('>> Profile')
+        print(profile_df.to_string(index=False))
 
     print('*******************************************************')
     print('*******************************************************')
@@ -70,4 +88,6 @@ def da(vacancies, applicants, applications, priority_profiles, quota_order,
     print('>>> TETHER EDUCATION INC.  <<<')
     print('*******************************************************')
     print('*******************************************************')
+    if profile:
+        return output, profile_df
     return output
@@ -1,5 +1,12 @@
-from schoolchoice_da.entities.applicants_queue import Applicant_Queue
+from schoolchoice_da.entities.applicants_queue import Applicant_Queue, Heap_Applicant_Queue
 from schoolchoice_da.entities.applicants import Applicant
-from schoolchoice_da.entities.match import DeferredAcceptanceAlgorithm
+from schoolchoice_da.entities.applicant_store import ApplicantStore, ApplicantMap
+from schoolchoice_da.entities.match import DeferredAcceptanceAlgorithm, MatchObserver
+from schoolchoice_da.entities.array_match import ArrayDeferredAcceptanceAlgorithm, BatchDeferredAcceptanceAlgorithm
 from schoolchoice_da.entities.policymaker import PolicyMaker
 from schoolchoice_da.entities.programs import Program
+from schoolchoice_da.entities.simulation import LotterySimulation
+from schoolchoice_da.entities.waitlist import WaitlistStore
+from schoolchoice_da.entities.profiler import PhaseProfiler
+from schoolchoice_da.entities.validation import InputValidator, InputValidationError
+from schoolchoice_da.entities.market_cache import MarketCache
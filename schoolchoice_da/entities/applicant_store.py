@@ -0,0 +1,1147 @@
+'''
+File: applicant_store.py
+Company: Tether Education Inc.
+'''
+
+from typing import Any, Dict, Iterable, List, Tuple
+from bisect import bisect_right
+from collections.abc import MutableMapping
+import numpy as np
+import pandas as pd
+
+from schoolchoice_da.entities.applicants import Applicant
+
+
+def _factorize_with_na(values: np.ndarray) -> tuple:
+    '''
+    pd.factorize keeping nan as one more value instead of code -1.
+    '''
+    try:
+        return pd.factorize(values, use_na_sentinel=False)
+    except TypeError:
+        # pandas < 1.5
+        return pd.factorize(values, na_sentinel=None)
+
+
+class ApplicantStore:
+    '''
+    Postulation data of many applicants in shared typed arrays, one per
+    postulation column. The postulation of the i-th applicant is at
+    offsets[i]:offsets[i + 1] of every array, and Applicant objects hold
+    views of their slice instead of their own arrays and dicts.
+    Scores, priorities and profiles are kept as int64 or float64 arrays. Ids
+    are kept as object arrays whose elements are shared by every application
+    to the same id, so an id costs a reference and is still hashed as the
+    input id when programs are looked up. They are pickled as integer codes
+    and their distinct values.
+    '''
+    id_columns = ['vpostulation', 'vinstitution_id', 'vquota_id']
+    postulation_columns = ['vpostulation', 'vinstitution_id', 'vquota_id',
+                            'vpostulation_scores', 'vpriorities',
+                            'vpriority_profile']
+
+    def __init__(self, offsets: np.ndarray, columns: Dict[str, np.ndarray]):
+        '''
+        Args:
+            offsets (np.ndarray): n_applicants + 1 positions
+            columns (Dict[str, np.ndarray]): An array for each one of
+                postulation_columns, aligned with offsets. They are made
+                read-only, as the applicants copy them before any change.
+        '''
+        self.offsets = offsets
+        self.columns = columns
+        for array in columns.values():
+            array.flags.writeable = False
+
+    @classmethod
+    def from_applications(
+            cls,
+            applicant_ids: pd.Series,
+            applications: pd.DataFrame) -> 'ApplicantStore':
+        '''
+        Build the store straight from the applications, with one stable sort
+        by applicant, ranking_program and vquota_id on integer codes, so the
+        postulation of each applicant is ordered by ranking and the
+        applications to the same program by quota, with nan last.
+        Applications of applicants not in applicant_ids are dropped.
+
+        Args:
+            applicant_ids (pd.Series): applicant_id of each slice of the store
+            applications (pd.DataFrame): "applicant_id", "ranking_program" and
+                the postulation_columns
+
+        Returns:
+            ApplicantStore: Store with one slice per applicant_id
+        '''
+        positions = pd.Index(applicant_ids).get_indexer(
+            applications['applicant_id'])
+        keep = positions >= 0
+
+        def sort_codes(column):
+            # Codes in the order of the values, with nan last as sort_values
+            codes, uniques = pd.factorize(applications[column].to_numpy()[keep],
+                                            sort=True)
+            return np.where(codes < 0, len(uniques), codes)
+
+        positions = positions[keep]
+        order = np.lexsort((sort_codes('vquota_id'),
+                            sort_codes('ranking_program'), positions))
+        offsets = np.concatenate([[0], np.cumsum(
+            np.bincount(positions, minlength=len(applicant_ids)))])
+        columns = {}
+        for column in cls.postulation_columns:
+            if len(order) == 0:
+                columns[column] = np.zeros(0)
+                continue
+            values = applications[column].to_numpy()[keep][order]
+            columns[column] = cls._share(values) \
+                if column in cls.id_columns else cls._compact(values)
+        columns['vpostulation_scores'] = \
+            columns['vpostulation_scores'].astype(np.float64)
+        return cls(offsets.astype(np.int64), columns)
+
+    @staticmethod
+    def _share(values: np.ndarray) -> np.ndarray:
+        '''
+        Object array with one shared Python object for each distinct value.
+        '''
+        codes, uniques = pd.factorize(values)
+        return np.asarray(uniques, dtype=object)[codes]
+
+    @classmethod
+    def _compact(cls, values: np.ndarray) -> np.ndarray:
+        '''
+        Typed version of values: int64 or float64 if every value is a number,
+        and otherwise shared as in _share.
+        '''
+        if values.dtype != object:
+            return values
+        kind = pd.api.types.infer_dtype(values, skipna=False)
+        if kind == 'integer':
+            return values.astype(np.int64)
+        if kind in ('floating', 'mixed-integer-float'):
+            return values.astype(np.float64)
+        return cls._share(values)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        columns = {}
+        uniques = {}
+        for column, array in self.columns.items():
+            if array.dtype == object:
+                array, uniques[column] = _factorize_with_na(array)
+            columns[column] = array
+        return {'offsets':self.offsets, 'columns':columns, 'uniques':uniques}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        columns = state['columns']
+        for column, values in state['uniques'].items():
+            columns[column] = np.asarray(values, dtype=object)[
+                columns[column]]
+        self.__init__(state['offsets'], columns)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def take(self, positions: np.ndarray) -> 'ApplicantStore':
+        '''
+        Store with the postulations of the applicants in positions, in that
+        order.
+
+        Args:
+            positions (np.ndarray): Positions of the applicants
+
+        Returns:
+            ApplicantStore
+        '''
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.offsets[positions]
+        offsets, index = _get_ranges(starts,
+                                    self.offsets[positions + 1] - starts)
+        return ApplicantStore(offsets, {column: array[index]
+            for column, array in self.columns.items()})
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        Bytes of the offsets and postulation arrays. Object arrays only count
+        their references.
+        '''
+        return self.offsets.nbytes + sum(array.nbytes
+            for array in self.columns.values())
+
+    def get_postulation(self, i: int) -> Dict[str, np.ndarray]:
+        '''
+        Views of the postulation of the i-th applicant.
+
+        Args:
+            i (int): Position of the applicant
+
+        Returns:
+            Dict[str, np.ndarray]: {column: view}
+        '''
+        start = self.offsets[i]
+        end = self.offsets[i + 1]
+        return {column: array[start:end]
+            for column, array in self.columns.items()}
+
+    def get_applicants(
+            self,
+            applicants: pd.DataFrame,
+            applicant_characteristics: List[str] = [],
+            positions: Iterable[int] = None) -> List[Applicant]:
+        '''
+        Init an Applicant for each row of applicants, with views of its
+        postulation.
+
+        Args:
+            applicants (pd.DataFrame): Applicants, in the order of the store,
+                without the postulation columns
+            applicant_characteristics (List[str]): Columns to keep as
+                applicant characteristics
+            positions (Iterable[int], optional): Only init the applicants in
+                these positions, in this order. Default is every applicant.
+
+        Returns:
+            List[Applicant]
+        '''
+        if positions is None:
+            positions = np.arange(len(applicants))
+        else:
+            positions = np.asarray(positions, dtype=np.int64)
+            applicants = applicants.iloc[positions]
+        columns = list(self.columns.items())
+        applicant_objects = []
+        for start, end, row in zip(self.offsets[positions].tolist(),
+                                    self.offsets[positions + 1].tolist(),
+                                    applicants.to_dict(orient='records')):
+            characteristics = {key:row[key]
+                for key in applicant_characteristics}
+            applicant_objects.append(Applicant(
+                applicant_characteristics=characteristics, **row,
+                **{column: array[start:end] for column, array in columns}))
+        return applicant_objects
+
+
+def _get_ranges(
+        starts: np.ndarray,
+        lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Concatenate the ranges starts[i]:starts[i] + lengths[i].
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Offsets of each range in the result
+        and the positions of every range, concatenated.
+    '''
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    positions = np.arange(offsets[-1], dtype=np.int64) + \
+        np.repeat(np.asarray(starts, dtype=np.int64) - offsets[:-1], lengths)
+    return offsets, positions
+
+
+def _concatenate(arrays: List[np.ndarray], dtype: Any = None) -> np.ndarray:
+    if len(arrays) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(arrays)
+
+
+class Postulations:
+    '''
+    Current postulation of several applicants in flat arrays, as the rules
+    of a round leave it, so the rules and the array engines work on it
+    without creating Applicant objects. The current applications of the i-th
+    applicant (current_names) are at offsets[i]:offsets[i + 1], and the
+    arrays aligned with its original postulation (key_names), where scores,
+    priorities and profiles are looked up, at key_offsets[i]:key_offsets[i + 1].
+    row_names hold one value per applicant. Every array is a copy, so they
+    can be changed in place. Ids are pickled as integer codes and their
+    distinct values, as in ApplicantStore.
+    '''
+    current_names = ['vpostulation', 'vinstitution_id', 'vquota_id', 'vscores']
+    key_names = ['keys_program', 'keys_quota', 'vpostulation_scores',
+                'vpriorities', 'vpriority_profile', 'dynamic_priority']
+    row_names = ['has_dynamic_priority', 'cut_postulation', 'linked_grades']
+
+    def __init__(self,
+                 offsets: np.ndarray,
+                 columns: Dict[str, np.ndarray],
+                 key_offsets: np.ndarray,
+                 key_columns: Dict[str, np.ndarray],
+                 row_columns: Dict[str, np.ndarray]):
+        '''
+        Args:
+            offsets (np.ndarray): n_applicants + 1 positions in columns
+            columns (Dict[str, np.ndarray]): An array for each one of
+                current_names
+            key_offsets (np.ndarray): n_applicants + 1 positions in
+                key_columns
+            key_columns (Dict[str, np.ndarray]): An array for each one of
+                key_names. dynamic_priority is False where the applicant has
+                no dynamic priority.
+            row_columns (Dict[str, np.ndarray]): An array for each one of
+                row_names. linked_grades is None for the applicants whose
+                postulation was not reordered by linked postulation.
+        '''
+        self.offsets = offsets
+        self.columns = columns
+        self.key_offsets = key_offsets
+        self.key_columns = key_columns
+        self.row_columns = row_columns
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = {'offsets':self.offsets, 'key_offsets':self.key_offsets,
+                'row_columns':self.row_columns, 'uniques':{}}
+        for name in ('columns', 'key_columns'):
+            state[name] = {}
+            for column, array in getattr(self, name).items():
+                if array.dtype == object:
+                    array, state['uniques'][column] = \
+                        _factorize_with_na(array)
+                state[name][column] = array
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name in ('columns', 'key_columns'):
+            for column, array in state[name].items():
+                if column in state['uniques']:
+                    state[name][column] = np.asarray(
+                        state['uniques'][column], dtype=object)[array]
+        self.__init__(state['offsets'], state['columns'],
+                    state['key_offsets'], state['key_columns'],
+                    state['row_columns'])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_store(
+            cls,
+            store: ApplicantStore,
+            positions: np.ndarray) -> 'Postulations':
+        '''
+        Original postulation of the applicants in positions of store, as
+        Applicant objects created from it start.
+
+        Args:
+            store (ApplicantStore)
+            positions (np.ndarray): Positions in the store
+
+        Returns:
+            Postulations
+        '''
+        starts = store.offsets[positions]
+        offsets, index = _get_ranges(starts,
+                                    store.offsets[positions + 1] - starts)
+        columns = store.columns
+        scores = columns['vpostulation_scores'][index]
+        priorities = columns['vpriorities'][index].astype(np.float64)
+        n_applicants = len(positions)
+        return cls(offsets,
+            {'vpostulation':columns['vpostulation'][index],
+            'vinstitution_id':columns['vinstitution_id'][index],
+            'vquota_id':columns['vquota_id'][index],
+            'vscores':scores + priorities},
+            offsets.copy(),
+            {'keys_program':columns['vpostulation'][index],
+            'keys_quota':columns['vquota_id'][index],
+            'vpostulation_scores':scores,
+            'vpriorities':priorities,
+            'vpriority_profile':columns['vpriority_profile'][index],
+            'dynamic_priority':np.zeros(len(index), dtype=bool)},
+            {'has_dynamic_priority':np.zeros(n_applicants, dtype=bool),
+            'cut_postulation':np.zeros(n_applicants, dtype=bool),
+            'linked_grades':np.full(n_applicants, None, dtype=object)})
+
+    @classmethod
+    def from_applicants(cls, applicants: List[Applicant]) -> 'Postulations':
+        '''
+        Current postulation of Applicant objects.
+
+        Args:
+            applicants (List[Applicant])
+
+        Returns:
+            Postulations
+        '''
+        offsets = np.zeros(len(applicants) + 1, dtype=np.int64)
+        np.cumsum([len(applicant.vpostulation) for applicant in applicants],
+                out=offsets[1:])
+        key_offsets = np.zeros(len(applicants) + 1, dtype=np.int64)
+        np.cumsum([len(applicant._keys_program) for applicant in applicants],
+                out=key_offsets[1:])
+        dynamic_priority = [np.zeros(len(applicant._keys_program), dtype=bool)
+            if applicant.dynamic_priority is None
+            else applicant.dynamic_priority for applicant in applicants]
+        linked_grades = np.full(len(applicants), None, dtype=object)
+        for i, applicant in enumerate(applicants):
+            if applicant.linked_postulation_bool:
+                linked_grades[i] = applicant.linked_grades
+        return cls(offsets,
+            {name: _concatenate([getattr(applicant, name)
+                for applicant in applicants]) for name in cls.current_names},
+            key_offsets,
+            {'keys_program':_concatenate([applicant._keys_program
+                for applicant in applicants]),
+            'keys_quota':_concatenate([applicant._keys_quota
+                for applicant in applicants]),
+            'vpostulation_scores':_concatenate([
+                applicant._vpostulation_scores for applicant in applicants],
+                np.float64),
+            'vpriorities':_concatenate([applicant._vpriorities
+                for applicant in applicants], np.float64),
+            'vpriority_profile':_concatenate([applicant._vpriority_profile
+                for applicant in applicants]),
+            'dynamic_priority':_concatenate(dynamic_priority, bool)},
+            {'has_dynamic_priority':np.array([
+                applicant.dynamic_priority is not None
+                for applicant in applicants], dtype=bool),
+            'cut_postulation':np.array([applicant.cut_postulation
+                for applicant in applicants], dtype=bool),
+            'linked_grades':linked_grades})
+
+    @classmethod
+    def concatenate(cls, parts: List['Postulations']) -> 'Postulations':
+        '''
+        Join the applicants of parts, in order.
+
+        Args:
+            parts (List[Postulations])
+
+        Returns:
+            Postulations
+        '''
+        def join_offsets(offsets):
+            lengths = np.concatenate([np.diff(part) for part in offsets])
+            joined = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=joined[1:])
+            return joined
+
+        return cls(join_offsets([part.offsets for part in parts]),
+            {name: np.concatenate([part.columns[name] for part in parts])
+                for name in cls.current_names},
+            join_offsets([part.key_offsets for part in parts]),
+            {name: np.concatenate([part.key_columns[name] for part in parts])
+                for name in cls.key_names},
+            {name: np.concatenate([part.row_columns[name] for part in parts])
+                for name in cls.row_names})
+
+    def take(self, rows: np.ndarray) -> 'Postulations':
+        '''
+        Postulations of the applicants in rows, in that order.
+
+        Args:
+            rows (np.ndarray): Positions of the applicants
+
+        Returns:
+            Postulations
+        '''
+        rows = np.asarray(rows, dtype=np.int64)
+        offsets, index = _get_ranges(self.offsets[rows],
+            self.offsets[rows + 1] - self.offsets[rows])
+        key_offsets, key_index = _get_ranges(self.key_offsets[rows],
+            self.key_offsets[rows + 1] - self.key_offsets[rows])
+        return Postulations(offsets,
+            {name: array[index] for name, array in self.columns.items()},
+            key_offsets,
+            {name: array[key_index]
+                for name, array in self.key_columns.items()},
+            {name: array[rows] for name, array in self.row_columns.items()})
+
+    def cut(self, n_kept: np.ndarray) -> 'Postulations':
+        '''
+        Keep the first n_kept current applications of each applicant.
+
+        Args:
+            n_kept (np.ndarray): Applications kept by each applicant
+
+        Returns:
+            Postulations
+        '''
+        offsets, index = _get_ranges(self.offsets[:-1], n_kept)
+        return Postulations(offsets,
+            {name: array[index] for name, array in self.columns.items()},
+            self.key_offsets, self.key_columns, self.row_columns)
+
+    def get_owners(self) -> np.ndarray:
+        '''
+        Applicant of each current application.
+        '''
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def get_key_owners(self) -> np.ndarray:
+        '''
+        Applicant of each position of key_columns.
+        '''
+        return np.repeat(np.arange(len(self)), np.diff(self.key_offsets))
+
+    def apply(self, i: int, applicant: Applicant) -> None:
+        '''
+        Set the postulation of the i-th applicant in its Applicant object,
+        with views of the arrays.
+
+        Args:
+            i (int): Position of the applicant
+            applicant (Applicant)
+        '''
+        start, end = self.offsets[i:i + 2].tolist()
+        key_start, key_end = self.key_offsets[i:i + 2].tolist()
+        columns = self.columns
+        key_columns = self.key_columns
+        applicant.set_postulation_state(
+            vpostulation=columns['vpostulation'][start:end],
+            vinstitution_id=columns['vinstitution_id'][start:end],
+            vquota_id=columns['vquota_id'][start:end],
+            vscores=columns['vscores'][start:end],
+            vpriorities=key_columns['vpriorities'][key_start:key_end],
+            vpriority_profile=\
+                key_columns['vpriority_profile'][key_start:key_end],
+            dynamic_priority=\
+                key_columns['dynamic_priority'][key_start:key_end]
+                if self.row_columns['has_dynamic_priority'][i] else None,
+            cut_postulation=bool(self.row_columns['cut_postulation'][i]),
+            linked_grades=self.row_columns['linked_grades'][i])
+
+
+class ApplicantMap(MutableMapping):
+    '''
+    Dict of {applicant_id: Applicant} whose Applicant objects are created
+    from their ApplicantStore the first time they are read, so applicants
+    cost their row in the store until their round comes. get_many creates
+    the applicants of a round at once.
+    The matching state of each applicant (state_columns) is kept in arrays,
+    by the position of the applicant. release writes the state of the
+    applicants of a matched round in those arrays and drops the objects that
+    can be created again from their store, so only the applicants held by a
+    program queue, changed by the rules or pinned stay alive between rounds,
+    and objects created again take their state from the arrays.
+    get_match_state reads the arrays, so the applicants changed by the
+    matching must be released before.
+    The postulations changed by the rules of a round are kept as Postulations
+    blocks (set_postulations), so they are changed and read in bulk
+    (get_postulations) without creating the applicants, and applicants
+    created later take their postulation from them.
+    '''
+    state_columns = ['option_n', 'match', 'assigned_vacancy',
+                    'assigned_score', 'priority_profile']
+
+    def __init__(self, applicants: Dict[Any, Applicant] = None):
+        '''
+        Args:
+            applicants (Dict[Any, Applicant], optional): Applicants already
+                created. They are pinned, as they have no store.
+        '''
+        self._positions : Dict[Any, int] = {}
+        self._objects : Dict[Any, Applicant] = {}
+        # Applicants whose original postulation is not the one in the store
+        self._pinned = set()
+        # (store, applicants, characteristics), or None for created applicants
+        self._sources = []
+        self._starts : List[int] = []
+        self._n_positions = 0
+        self._empty = np.zeros(0, dtype=bool)
+        self._state = self._get_reset_state(self._empty)
+        self._assignment_types = np.zeros(0, dtype=np.int64)
+        # Postulations set by the rules, and the block and row of each
+        # position in them, or -1
+        self._postulation_blocks : List[Postulations] = []
+        self._block_sizes : List[int] = []
+        self._postulation_block = np.zeros(0, dtype=np.int64)
+        self._postulation_row = np.zeros(0, dtype=np.int64)
+        if applicants is not None:
+            self._add_objects(applicants)
+
+    @staticmethod
+    def _get_reset_state(empty: np.ndarray) -> Dict[str, np.ndarray]:
+        '''
+        State arrays of applicants in their reset state.
+
+        Args:
+            empty (np.ndarray): True for the applicants without postulation,
+                which are matched from the start
+        '''
+        return {'option_n':np.zeros(len(empty), dtype=np.int64),
+                'match':empty.copy(),
+                'assigned_vacancy':np.full(len(empty), None, dtype=object),
+                'assigned_score':np.full(len(empty), np.nan),
+                'priority_profile':np.full(len(empty), None, dtype=object)}
+
+    def _add_positions(
+            self,
+            applicant_ids: List,
+            source: Any,
+            empty: np.ndarray,
+            assignment_types: np.ndarray) -> None:
+        '''
+        Register applicant_ids in new positions, in their reset state.
+        Registered applicants with the same applicant_id are replaced and
+        keep their place.
+        '''
+        start = self._n_positions
+        self._starts.append(start)
+        self._sources.append(source)
+        self._n_positions += len(applicant_ids)
+        self._empty = np.concatenate([self._empty, empty])
+        self._assignment_types = np.concatenate([self._assignment_types,
+            np.asarray(assignment_types, dtype=np.int64)])
+        unset = np.full(len(applicant_ids), -1, dtype=np.int64)
+        self._postulation_block = np.concatenate([self._postulation_block,
+                                                unset])
+        self._postulation_row = np.concatenate([self._postulation_row, unset])
+        reset_state = self._get_reset_state(empty)
+        for column in self.state_columns:
+            self._state[column] = np.concatenate([self._state[column],
+                                                reset_state[column]])
+        if len(self._objects) > 0:
+            for applicant_id in applicant_ids:
+                self._objects.pop(applicant_id, None)
+        self._pinned.difference_update(applicant_ids)
+        self._positions.update(zip(applicant_ids,
+            range(start, start + len(applicant_ids))))
+
+    def add_store(
+            self,
+            store: ApplicantStore,
+            applicants: pd.DataFrame,
+            applicant_characteristics: List[str] = []) -> None:
+        '''
+        Register the applicants of a store without creating them. Registered
+        applicants with the same applicant_id are replaced and keep their
+        place.
+
+        Args:
+            store (ApplicantStore)
+            applicants (pd.DataFrame): Applicants, in the order of the store,
+                without the postulation columns
+            applicant_characteristics (List[str]): Columns to keep as
+                applicant characteristics
+        '''
+        assignment_types = applicants['special_assignment'].to_numpy() \
+            if 'special_assignment' in applicants.columns else \
+            np.zeros(len(applicants), dtype=np.int64)
+        self._add_positions(applicants['applicant_id'].tolist(),
+            (store, applicants, applicant_characteristics),
+            np.diff(store.offsets) == 0, assignment_types)
+
+    def _add_objects(self, applicants: Dict[Any, Applicant]) -> None:
+        '''
+        Register and pin applicants already created, with their current
+        matching state.
+        '''
+        applicant_ids = list(applicants)
+        objects = list(applicants.values())
+        self._add_positions(applicant_ids, None, np.array([
+            len(applicant.get_original_vpostulation()) == 0
+            for applicant in objects], dtype=bool),
+            [applicant.special_assignment for applicant in objects])
+        self._objects.update(applicants)
+        self._pinned.update(applicant_ids)
+        self._write_state(self.get_positions(applicant_ids), objects)
+
+    def _create(self, applicant_ids: List) -> None:
+        '''
+        Create the applicants, which must not be created yet, grouped by
+        source, and set the postulation given by the rules and the matching
+        state of the released ones.
+        '''
+        positions = np.array([self._positions[applicant_id]
+            for applicant_id in applicant_ids], dtype=np.int64)
+        sources = np.searchsorted(self._starts, positions, side='right') - 1
+        for source in np.unique(sources).tolist():
+            selected = np.flatnonzero(sources == source)
+            store, applicants, applicant_characteristics = \
+                self._sources[source]
+            created = store.get_applicants(applicants,
+                applicant_characteristics,
+                positions[selected] - self._starts[source])
+            for i, applicant in zip(selected.tolist(), created):
+                self._objects[applicant_ids[i]] = applicant
+
+        state = self._state
+        changed = np.flatnonzero((state['option_n'][positions] != 0) |
+            (state['match'][positions] != self._empty[positions]) |
+            pd.notna(state['assigned_vacancy'][positions]))
+        for i, position in zip(changed.tolist(), positions[changed].tolist()):
+            applicant = self._objects[applicant_ids[i]]
+            applicant.option_n = int(state['option_n'][position])
+            applicant.match = bool(state['match'][position])
+            applicant.assigned_vacancy = state['assigned_vacancy'][position]
+
+        blocks = self._postulation_block[positions]
+        rows = self._postulation_row[positions]
+        for i in np.flatnonzero(blocks >= 0).tolist():
+            self._postulation_blocks[blocks[i]].apply(rows[i],
+                self._objects[applicant_ids[i]])
+
+    def get_many(self, applicant_ids: Iterable) -> List[Applicant]:
+        '''
+        Applicants of applicant_ids, creating the missing ones at once.
+
+        Args:
+            applicant_ids (Iterable)
+
+        Returns:
+            List[Applicant]
+        '''
+        applicant_ids = list(applicant_ids)
+        objects = self._objects
+        missing = [applicant_id for applicant_id in dict.fromkeys(
+            applicant_ids) if applicant_id not in objects]
+        if len(missing) > 0:
+            self._create(missing)
+        return [objects[applicant_id] for applicant_id in applicant_ids]
+
+    def get_created(self, applicant_id: Any) -> Applicant:
+        '''
+        The applicant if it is registered and its object is alive, else None.
+
+        Args:
+            applicant_id (Any)
+        '''
+        return self._objects.get(applicant_id)
+
+    def get_positions(self, applicant_ids: Iterable) -> np.ndarray:
+        '''
+        Position of each applicant in the state arrays, or -1 if it is not
+        registered.
+
+        Args:
+            applicant_ids (Iterable)
+
+        Returns:
+            np.ndarray
+        '''
+        applicant_ids = list(applicant_ids)
+        positions = self._positions
+        return np.fromiter((positions.get(applicant_id, -1)
+            for applicant_id in applicant_ids), dtype=np.int64,
+            count=len(applicant_ids))
+
+    def get_match_state(self, positions: np.ndarray) -> Dict[str, np.ndarray]:
+        '''
+        Matching state of the applicants in positions, as written by the
+        last release: option_n, match, assigned_vacancy (Program or None),
+        assigned_score and the priority_profile of the assigned program.
+
+        Args:
+            positions (np.ndarray): Positions given by get_positions
+
+        Returns:
+            Dict[str, np.ndarray]: {column: array aligned with positions}
+        '''
+        return {column: array[positions]
+            for column, array in self._state.items()}
+
+    def get_assignment_types(self, positions: np.ndarray) -> np.ndarray:
+        '''
+        special_assignment of the applicants in positions.
+
+        Args:
+            positions (np.ndarray): Positions given by get_positions
+
+        Returns:
+            np.ndarray
+        '''
+        return self._assignment_types[positions]
+
+    def get_postulations(self, applicant_ids: Iterable) -> Postulations:
+        '''
+        Current postulation of applicants, read from their objects if they
+        are alive, else from the postulations set by the rules or from their
+        store.
+
+        Args:
+            applicant_ids (Iterable): Registered applicants
+
+        Returns:
+            Postulations: In the order of applicant_ids
+        '''
+        applicant_ids = list(applicant_ids)
+        positions = self.get_positions(applicant_ids)
+        objects = self._objects
+        alive = np.fromiter((applicant_id in objects
+            for applicant_id in applicant_ids), dtype=bool,
+            count=len(applicant_ids))
+        parts = []
+        selections = []
+        if alive.any():
+            selected = np.flatnonzero(alive)
+            parts.append(Postulations.from_applicants(
+                [objects[applicant_ids[i]] for i in selected.tolist()]))
+            selections.append(selected)
+        blocks = np.where(alive, -1, self._postulation_block[positions])
+        for block in np.unique(blocks[blocks >= 0]).tolist():
+            selected = np.flatnonzero(blocks == block)
+            parts.append(self._postulation_blocks[block].take(
+                self._postulation_row[positions[selected]]))
+            selections.append(selected)
+        from_store = ~alive & (blocks < 0)
+        sources = np.searchsorted(self._starts, positions, side='right') - 1
+        for source in np.unique(sources[from_store]).tolist():
+            selected = np.flatnonzero(from_store & (sources == source))
+            parts.append(Postulations.from_store(self._sources[source][0],
+                positions[selected] - self._starts[source]))
+            selections.append(selected)
+        if len(parts) == 0:
+            return Postulations.from_applicants([])
+        postulations = Postulations.concatenate(parts) if len(parts) > 1 \
+            else parts[0]
+        order = np.concatenate(selections)
+        if (order[1:] < order[:-1]).any():
+            postulations = postulations.take(np.argsort(order))
+        return postulations
+
+    def set_postulations(
+            self,
+            applicant_ids: List,
+            postulations: Postulations) -> None:
+        '''
+        Keep the postulations changed by a rule, and set them in the objects
+        of the applicants that are alive. reset_matching drops them.
+
+        Args:
+            applicant_ids (List): Registered applicants
+            postulations (Postulations): Aligned with applicant_ids. It must
+                not be changed afterwards.
+        '''
+        applicant_ids = list(applicant_ids)
+        positions = self.get_positions(applicant_ids)
+        self._unset_postulations(positions)
+        self._postulation_block[positions] = len(self._postulation_blocks)
+        self._postulation_row[positions] = np.arange(len(positions))
+        self._postulation_blocks.append(postulations)
+        self._block_sizes.append(len(positions))
+        objects = self._objects
+        for i, applicant_id in enumerate(applicant_ids):
+            applicant = objects.get(applicant_id)
+            if applicant is not None:
+                postulations.apply(i, applicant)
+
+    def _unset_postulations(self, positions: np.ndarray) -> None:
+        '''
+        Forget the postulations set in positions, dropping the blocks left
+        without rows.
+        '''
+        blocks = self._postulation_block[positions]
+        blocks, counts = np.unique(blocks[blocks >= 0], return_counts=True)
+        for block, count in zip(blocks.tolist(), counts.tolist()):
+            self._block_sizes[block] -= count
+            if self._block_sizes[block] == 0:
+                self._postulation_blocks[block] = None
+        self._postulation_block[positions] = -1
+
+    def get_changed_postulations(
+            self,
+            applicant_ids: Iterable) -> Tuple[List, Postulations]:
+        '''
+        Current postulation of the applicants of applicant_ids that may not
+        be the one in their store: the ones set by set_postulations and the
+        ones whose objects are alive.
+
+        Args:
+            applicant_ids (Iterable): Registered applicants
+
+        Returns:
+            Tuple[List, Postulations]: applicant_ids of those applicants and
+            their postulations
+        '''
+        applicant_ids = list(applicant_ids)
+        positions = self.get_positions(applicant_ids)
+        objects = self._objects
+        changed = [applicant_id for applicant_id, block in zip(applicant_ids,
+            self._postulation_block[positions].tolist())
+            if (block >= 0) or (applicant_id in objects)]
+        return changed, self.get_postulations(changed)
+
+    def set_match_state(
+            self,
+            applicant_ids: List,
+            positions: np.ndarray,
+            option_n: np.ndarray,
+            match: np.ndarray,
+            assigned_vacancy: np.ndarray,
+            assigned_score: np.ndarray,
+            priority_profile: np.ndarray) -> None:
+        '''
+        Write the matching state of applicants in the state arrays, and in
+        their objects if they are alive.
+
+        Args:
+            applicant_ids (List): Registered applicants
+            positions (np.ndarray): Their positions, given by get_positions
+            option_n (np.ndarray)
+            match (np.ndarray)
+            assigned_vacancy (np.ndarray): Program or None
+            assigned_score (np.ndarray)
+            priority_profile (np.ndarray)
+        '''
+        state = self._state
+        state['option_n'][positions] = option_n
+        state['match'][positions] = match
+        state['assigned_vacancy'][positions] = assigned_vacancy
+        state['assigned_score'][positions] = assigned_score
+        state['priority_profile'][positions] = priority_profile
+        objects = self._objects
+        if len(objects) == 0:
+            return
+        for i, applicant_id in enumerate(applicant_ids):
+            applicant = objects.get(applicant_id)
+            if applicant is not None:
+                applicant.option_n = int(option_n[i])
+                applicant.match = bool(match[i])
+                applicant.assigned_vacancy = assigned_vacancy[i]
+
+    def _write_state(
+            self,
+            positions: np.ndarray,
+            applicants: List[Applicant]) -> None:
+        '''
+        Copy the matching state of applicants to the state arrays. The
+        assigned score and profile are read as get_results did: applicants
+        assigned by DA are at their option_n, the ones forced into their SE
+        program are past the end.
+        '''
+        n_applicants = len(applicants)
+        programs = np.fromiter((applicant.assigned_vacancy
+            for applicant in applicants), dtype=object, count=n_applicants)
+        scores = np.full(n_applicants, np.nan)
+        profiles = np.full(n_applicants, None, dtype=object)
+        for i in np.flatnonzero(pd.notna(programs)).tolist():
+            applicant = applicants[i]
+            program = programs[i]
+            option_n = applicant.option_n \
+                if applicant.option_n < len(applicant.vscores) else None
+            scores[i] = program.get_applicant_score_in_program(applicant,
+                                                            option_n=option_n)
+            profiles[i] = applicant.vpriority_profile[program.program_id]
+        state = self._state
+        state['option_n'][positions] = np.fromiter((applicant.option_n
+            for applicant in applicants), dtype=np.int64, count=n_applicants)
+        state['match'][positions] = np.fromiter((applicant.match
+            for applicant in applicants), dtype=bool, count=n_applicants)
+        state['assigned_vacancy'][positions] = programs
+        state['assigned_score'][positions] = scores
+        state['priority_profile'][positions] = profiles
+
+    def sync_state(self, applicant_ids: Iterable) -> List:
+        '''
+        Write the matching state of the created applicants of applicant_ids
+        in the state arrays, keeping their objects.
+
+        Args:
+            applicant_ids (Iterable)
+
+        Returns:
+            List: applicant_ids of the created applicants
+        '''
+        objects = self._objects
+        created = [applicant_id for applicant_id in applicant_ids
+            if applicant_id in objects]
+        self._write_state(self.get_positions(created),
+            [objects[applicant_id] for applicant_id in created])
+        return created
+
+    def release(self, applicant_ids: Iterable) -> None:
+        '''
+        Write the matching state of the created applicants of applicant_ids
+        in the state arrays, and drop the ones that can be created again from
+        their store: not assigned, not pinned and with their original
+        postulation.
+
+        Args:
+            applicant_ids (Iterable)
+        '''
+        objects = self._objects
+        created = self.sync_state(applicant_ids)
+        applicants = [objects[applicant_id] for applicant_id in created]
+        pinned = self._pinned
+        for applicant_id, applicant in zip(created, applicants):
+            if (applicant.assigned_vacancy is None) and \
+                    (applicant_id not in pinned) and \
+                    applicant.has_original_postulation():
+                del objects[applicant_id]
+
+    def pin(self, applicants: Iterable[Applicant]) -> None:
+        '''
+        Keep the objects of applicants alive, as their original postulation
+        changed and they cannot be created again from their store.
+
+        Args:
+            applicants (Iterable[Applicant])
+        '''
+        self._pinned.update(applicant.id for applicant in applicants)
+
+    def reset_matching(self, applicant_ids: Iterable = None) -> None:
+        '''
+        Reset the matching state of applicants, in the state arrays and in
+        their objects if they are alive.
+
+        Args:
+            applicant_ids (Iterable, optional): Applicants to reset. Default
+                is every applicant.
+        '''
+        if applicant_ids is None:
+            self._state = self._get_reset_state(self._empty)
+            self._postulation_blocks = []
+            self._block_sizes = []
+            self._postulation_block[:] = -1
+            created = list(self._objects)
+        else:
+            applicant_ids = list(applicant_ids)
+            positions = self.get_positions(applicant_ids)
+            reset_state = self._get_reset_state(self._empty[positions])
+            for column in self.state_columns:
+                self._state[column][positions] = reset_state[column]
+            self._unset_postulations(positions)
+            created = [applicant_id for applicant_id in applicant_ids
+                if applicant_id in self._objects]
+        applicants = [self._objects[applicant_id] for applicant_id in created]
+        for applicant in applicants:
+            applicant._reset_matching_attributes()
+        self._write_state(self.get_positions(created), applicants)
+
+    def take(self, applicant_ids: Iterable) -> 'ApplicantMap':
+        '''
+        New map with the applicants of applicant_ids, their matching state
+        and the postulations set by the rules, registered from slices of
+        their stores without creating them, so it is pickled without the rest
+        of the applicants. Pinned applicants are copied as objects.
+
+        Args:
+            applicant_ids (Iterable): Registered applicants
+
+        Returns:
+            ApplicantMap
+        '''
+        applicant_ids = list(applicant_ids)
+        self.sync_state(applicant_ids)
+        positions = self.get_positions(applicant_ids)
+        pinned = np.fromiter((applicant_id in self._pinned
+            for applicant_id in applicant_ids), dtype=bool,
+            count=len(applicant_ids))
+        taken = ApplicantMap()
+        sources = np.searchsorted(self._starts, positions, side='right') - 1
+        for source in np.unique(sources[~pinned]).tolist():
+            selected = np.flatnonzero(~pinned & (sources == source))
+            store, applicants, applicant_characteristics = \
+                self._sources[source]
+            rows = positions[selected] - self._starts[source]
+            taken.add_store(store.take(rows), applicants.iloc[rows],
+                            applicant_characteristics)
+        if pinned.any():
+            taken._add_objects({applicant_ids[i]:
+                self._objects[applicant_ids[i]]
+                for i in np.flatnonzero(pinned).tolist()})
+        taken_positions = taken.get_positions(applicant_ids)
+        for column in self.state_columns:
+            taken._state[column][taken_positions] = \
+                self._state[column][positions]
+        with_blocks = [applicant_ids[i] for i in np.flatnonzero(~pinned &
+            (self._postulation_block[positions] >= 0)).tolist()]
+        if len(with_blocks) > 0:
+            taken.set_postulations(with_blocks,
+                                self.get_postulations(with_blocks))
+        return taken
+
+    def get_original_vpostulations(
+            self,
+            applicant_ids: Iterable) -> List[np.ndarray]:
+        '''
+        Original vpostulation of each applicant, read from the store for the
+        applicants not created.
+
+        Args:
+            applicant_ids (Iterable)
+
+        Returns:
+            List[np.ndarray]
+        '''
+        postulations = []
+        for applicant_id in applicant_ids:
+            applicant = self._objects.get(applicant_id)
+            if applicant is not None:
+                postulations.append(applicant.get_original_vpostulation())
+                continue
+            position = self._positions[applicant_id]
+            source = bisect_right(self._starts, position) - 1
+            store = self._sources[source][0]
+            i = position - self._starts[source]
+            postulations.append(store.columns['vpostulation'][
+                store.offsets[i]:store.offsets[i + 1]])
+        return postulations
+
+    def __getitem__(self, applicant_id: Any) -> Applicant:
+        applicant = self._objects.get(applicant_id)
+        if applicant is None:
+            self._create([applicant_id])
+            applicant = self._objects[applicant_id]
+        return applicant
+
+    def __setitem__(self, applicant_id: Any, applicant: Applicant) -> None:
+        self._add_objects({applicant_id: applicant})
+
+    def __delitem__(self, applicant_id: Any) -> None:
+        self._unset_postulations(np.array([self._positions[applicant_id]]))
+        del self._positions[applicant_id]
+        self._objects.pop(applicant_id, None)
+        self._pinned.discard(applicant_id)
+
+    def __contains__(self, applicant_id: Any) -> bool:
+        return applicant_id in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def keys(self):
+        return self._positions.keys()
+
+    def values(self) -> List[Applicant]:
+        return self.get_many(self._positions)
+
+    def items(self) -> List[Tuple[Any, Applicant]]:
+        return list(zip(self._positions, self.values()))
+
+    def update(self, other=(), **kwargs) -> None:
+        '''
+        As dict.update. The applicants of another ApplicantMap are registered
+        with their state, without creating them.
+        '''
+        if not isinstance(other, ApplicantMap):
+            applicants = dict(other, **kwargs)
+            if len(applicants) > 0:
+                self._add_objects(applicants)
+            return
+        shift = self._n_positions
+        for start, source in zip(other._starts, other._sources):
+            self._starts.append(shift + start)
+            self._sources.append(source)
+        self._n_positions += other._n_positions
+        self._empty = np.concatenate([self._empty, other._empty])
+        for column in self.state_columns:
+            self._state[column] = np.concatenate([self._state[column],
+                                                other._state[column]])
+        self._assignment_types = np.concatenate([self._assignment_types,
+                                                other._assignment_types])
+        blocks = other._postulation_block
+        self._postulation_block = np.concatenate([self._postulation_block,
+            np.where(blocks >= 0, blocks + len(self._postulation_blocks), -1)])
+        self._postulation_row = np.concatenate([self._postulation_row,
+                                                other._postulation_row])
+        self._postulation_blocks.extend(other._postulation_blocks)
+        self._block_sizes.extend(other._block_sizes)
+        applicant_ids = list(other._positions)
+        if len(self._objects) > 0:
+            for applicant_id in applicant_ids:
+                self._objects.pop(applicant_id, None)
+        self._pinned.difference_update(applicant_ids)
+        self._pinned.update(other._pinned)
+        self._positions.update((applicant_id, position + shift)
+            for applicant_id, position in other._positions.items())
+        self._objects.update(other._objects)
+        if len(kwargs) > 0:
+            self._add_objects(kwargs)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({len(self)} applicants)'
@@ -3,14 +3,91 @@ File: applicant.py
 Company: Tether Education Inc.
 '''
 
+from collections.abc import Mapping
 from typing import Any, List, Dict
 import numpy as np
-import pandas as pd
 import operator
 
 
+class PostulationMap(Mapping):
+    '''
+    Dict-like view of a postulation array of an Applicant, keyed by
+    (program_id, quota_id), or by program_id if by_program. Reads and writes
+    go to the array, so applicants do not keep a dict per postulation field.
+    As in a dict built from the postulation, the last position of a repeated
+    key holds its value.
+    '''
+    __slots__ = ('_programs', '_quotas', '_values', '_by_program')
+
+    def __init__(self,
+                 programs: np.ndarray,
+                 quotas: np.ndarray,
+                 values: np.ndarray,
+                 by_program: bool = False):
+        self._programs = programs
+        self._quotas = quotas
+        self._values = values
+        self._by_program = by_program
+
+    def _get_positions(self, key) -> List[int]:
+        # Postulations are short, so a scan is faster than numpy here
+        if self._by_program:
+            return [i for i, program_id in enumerate(self._programs.tolist())
+                    if program_id == key]
+        try:
+            program_id, quota_id = key
+        except (TypeError, ValueError):
+            raise KeyError(key) from None
+        return [i for i, (program, quota) in enumerate(zip(
+            self._programs.tolist(), self._quotas.tolist()))
+            if (program == program_id) and (quota == quota_id)]
+
+    def __getitem__(self, key) -> Any:
+        positions = self._get_positions(key)
+        if len(positions) == 0:
+            raise KeyError(key)
+        return self._values[positions[-1]]
+
+    def __setitem__(self, key, value) -> None:
+        positions = self._get_positions(key)
+        if len(positions) == 0:
+            raise KeyError(key)
+        self._values[positions] = value
+
+    def _keys(self) -> List:
+        if self._by_program:
+            return self._programs.tolist()
+        return list(zip(self._programs.tolist(), self._quotas.tolist()))
+
+    def copy(self) -> Dict:
+        return dict(zip(self._keys(), self._values.tolist()))
+
+    def __iter__(self):
+        return iter(self.copy())
+
+    def __len__(self) -> int:
+        return len(self.copy())
+
+    def items(self):
+        return self.copy().items()
+
+    def values(self):
+        return self.copy().values()
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.copy()})'
+
 
 class Applicant():
+    '''
+    Applicant with its postulation in arrays, usually views of an
+    ApplicantStore. Attributes are __slots__, and applicant_characteristics
+    are read through __getattr__.
+    The original postulation arrays are never modified in place. After a
+    reset the current postulation arrays are the original ones, and they are
+    copied the first time the matching modifies them, so a reset does not
+    copy arrays.
+    '''
     eval_dict={'<':operator.lt,
                 '<=':operator.le,
                 '>':operator.gt,
@@ -27,6 +104,23 @@ class Applicant():
 
     secured_enrollment_priority = 0
 
+    # Applicants share the tuple of characteristic names
+    _characteristic_names_cache = {}
+
+    __slots__ = ('__id', '__special_assignment', '__grade', '__vsiblings',
+                '__vlinks', '__se_program_id', '__se_quota_id',
+                '__characteristic_names', '__characteristic_values',
+                '__original_vpostulation', '__original_vinstitution_id',
+                '__original_vquota_id', '__original_vpostulation_scores',
+                '__original_vpriorities', '__original_vpriority_profile',
+                '__base_vpriorities', '__base_vscores', '_owns_arrays',
+                '_keys_program', '_keys_quota', '_vpostulation_scores',
+                '_vpriorities', '_vpriority_profile',
+                'option_n', 'linked_postulation', 'linked_postulation_bool',
+                'cut_postulation', 'reassign_quota_order', 'assigned_vacancy',
+                'match', 'vpostulation', 'vinstitution_id', 'vquota_id',
+                'vscores', 'dynamic_priority', 'linked_grades')
+
     def __init__(self,
                  applicant_id: Any,
                  grade_id: int,
@@ -44,7 +138,7 @@ class Applicant():
                  applicant_characteristics = {},
                  **kwargs):
         '''
-        Init a Applicant instance.
+        Init a Applicant instance. The postulation arrays are not copied.
 
         Args:
             applicant_id (Any): Hashable
@@ -69,18 +163,41 @@ class Applicant():
         self.__grade = grade_id
         self.__vsiblings = siblings
         self.__vlinks = links
-        self.__original_vpostulation = vpostulation
-        self.__original_vinstitution_id = vinstitution_id
-        self.__original_vquota_id = vquota_id
         self.__se_program_id = se_program_id if (se_program_id!=0 and se_program_id!='') else None
         self.__se_quota_id = se_quota_id if (se_program_id!=0 and se_program_id!='') else None
-        self._unpack_priorities_and_scores(vpostulation_scores,vpriorities,vpriority_profile)
-
-        if len(applicant_characteristics)>0:
-            self._unpack_applicant_characteristics(applicant_characteristics)
+        names = tuple(applicant_characteristics)
+        self.__characteristic_names = \
+            self._characteristic_names_cache.setdefault(names, names)
+        self.__characteristic_values = tuple(applicant_characteristics.values())
+
+        if isinstance(vpostulation,float):
+            # Applicants without applications have nan postulation arrays
+            vpostulation = vinstitution_id = vquota_id = \
+                vpostulation_scores = vpriorities = vpriority_profile = \
+                np.zeros(0)
+        self.__original_vpostulation = np.asarray(vpostulation)
+        self.__original_vinstitution_id = np.asarray(vinstitution_id)
+        self.__original_vquota_id = np.asarray(vquota_id)
+        self.__original_vpostulation_scores = \
+            np.asarray(vpostulation_scores, dtype=np.float64)
+        self.__original_vpriorities = np.asarray(vpriorities)
+        self.__original_vpriority_profile = np.asarray(vpriority_profile)
+        self._set_base_vscores()
 
         self._reset_matching_attributes()
 
+    def __getattr__(self, name: str) -> Any:
+        # Only called for names that are not set slots: characteristics
+        try:
+            names = object.__getattribute__(self,
+                '_Applicant__characteristic_names')
+        except AttributeError:
+            raise AttributeError(name) from None
+        if name in names:
+            return self.__characteristic_values[names.index(name)]
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'")
+
 
     @property
     def id(self):
@@ -110,6 +227,32 @@ class Applicant():
     def se_quota_id(self):
         return self.__se_quota_id
 
+    @property
+    def vpostulation_scores(self) -> PostulationMap:
+        '''
+        Scores of the current postulation, {(program_id, quota_id): score}.
+        '''
+        return PostulationMap(self._keys_program, self._keys_quota,
+                                self._vpostulation_scores)
+
+    @property
+    def vpriorities(self) -> PostulationMap:
+        '''
+        Priorities of the current postulation,
+        {(program_id, quota_id): priority}.
+        '''
+        return PostulationMap(self._keys_program, self._keys_quota,
+                                self._vpriorities)
+
+    @property
+    def vpriority_profile(self) -> PostulationMap:
+        '''
+        Priority profiles of the current postulation,
+        {program_id: priority_profile}.
+        '''
+        return PostulationMap(self._keys_program, self._keys_quota,
+                                self._vpriority_profile, by_program=True)
+
 
     def modify_original_vpostulation_scores(
             self,
@@ -122,42 +265,141 @@ class Applicant():
             quota_id (int): Quota to be modified
             lottery (float): New score
         '''
-        self.__original_vpostulation_scores[(program_id,quota_id)] = lottery
+        # The original arrays may be shared views, so they are replaced
+        scores = self.__original_vpostulation_scores.copy()
+        scores[(self.__original_vpostulation == program_id) &
+                (self.__original_vquota_id == quota_id)] = lottery
+        self.__original_vpostulation_scores = scores
+        self._set_base_vscores()
+
+    def set_original_vpostulation_scores(
+            self,
+            scores: np.ndarray) -> None:
+        '''
+        Replaces all the original_vpostulation_scores at once. Scores must be
+        aligned with the original vpostulation and vquota_id.
 
+        Args:
+            scores (Array[float]): New scores
+        '''
+        if len(self.__original_vpostulation) == 0:
+            return
+        self.__original_vpostulation_scores = np.array(scores,
+                                                        dtype=np.float64)
+        self._set_base_vscores()
 
-    def _unpack_priorities_and_scores(
-            self,
-            vpostulation_scores,
-            vpriorities,
-            vpriority_profile):
-        if isinstance(self.__original_vpostulation,float):
-            self.__original_vpostulation_scores = dict()
-            self.__original_vpriorities = dict()
-            self.__original_vpriority_profile = dict()
-        else:
-            self.__original_vpostulation_scores = {(pid,qid):score for pid,qid,score in zip(self.__original_vpostulation,self.__original_vquota_id,vpostulation_scores)}
-            self.__original_vpriorities = {(pid,qid):priority for pid,qid,priority in zip(self.__original_vpostulation,self.__original_vquota_id,vpriorities)}
-            self.__original_vpriority_profile = dict(zip(self.__original_vpostulation,vpriority_profile))
+    def get_original_vpostulation_scores(self) -> List[float]:
+        '''
+        Returns the original_vpostulation_scores aligned with the original
+        vpostulation and vquota_id.
 
+        Returns:
+            List[float]: Scores
+        '''
+        return self.__original_vpostulation_scores.tolist()
 
+    def get_original_vpostulation(self) -> np.ndarray:
+        '''
+        Returns the original vpostulation, before any change made during the
+        matching. It must not be modified.
 
-    def _unpack_applicant_characteristics(
+        Returns:
+            np.ndarray: program_id of each application
+        '''
+        return self.__original_vpostulation
+
+    def get_original_vpriorities(self) -> PostulationMap:
+        '''
+        Returns the original_vpriorities, before any change made during the
+        matching, such as sibling priority. It must not be modified.
+
+        Returns:
+            PostulationMap: {(program_id, quota_id): priority}
+        '''
+        return PostulationMap(self.__original_vpostulation,
+                                self.__original_vquota_id,
+                                self.__original_vpriorities)
+
+
+    def remove_original_postulation(
             self,
-            applicant_characteristics) -> None:
+            program_id,
+            quota_id) -> None:
+        '''
+        Drop the application to (program_id, quota_id) from the original
+        postulation arrays, as if it had been filtered out when the applicant
+        was created. The current postulation is kept until
+        _reset_matching_attributes.
+
+        Args:
+            program_id (Any): Program of the application
+            quota_id (int): Quota of the application
+        '''
+        keep = ~((self.__original_vpostulation == program_id) &
+                (self.__original_vquota_id == quota_id))
+        self.__original_vpostulation = self.__original_vpostulation[keep]
+        self.__original_vinstitution_id = \
+            self.__original_vinstitution_id[keep]
+        self.__original_vquota_id = self.__original_vquota_id[keep]
+        self.__original_vpostulation_scores = \
+            self.__original_vpostulation_scores[keep]
+        self.__original_vpriorities = self.__original_vpriorities[keep]
+        self.__original_vpriority_profile = \
+            self.__original_vpriority_profile[keep]
+        self._set_base_vscores()
+
+    def _set_base_vscores(self) -> None:
+        '''
+        Compute the priorities as floats and the vscores of the original
+        postulation, which every reset starts from. It must be called every
+        time the original scores or priorities change.
+        '''
+        self.__base_vpriorities = \
+            self.__original_vpriorities.astype(np.float64)
+        self.__base_vscores = self.__original_vpostulation_scores + \
+            self.__base_vpriorities
+
+    def _make_writable(self) -> None:
+        '''
+        Copy on write: replace the current vquota_id, vscores, priorities and
+        priority profiles by private copies, unless they were already copied
+        since the last reset. It must be called before modifying any of them
+        in place.
         '''
-        Description: Set all applicant_characteristics as attributes
+        if self._owns_arrays:
+            return
+        self.vquota_id = self.vquota_id.copy()
+        self.vscores = self.vscores.copy()
+        self._vpriorities = self._vpriorities.copy()
+        self._vpriority_profile = self._vpriority_profile.copy()
+        self._owns_arrays = True
+
+    def _update_vscores(self, indexes) -> None:
+        '''
+        Recompute vscores in indexes from vpostulation_scores and vpriorities.
+        It must be called every time one of them, vpostulation or vquota_id
+        changes in those indexes.
 
         Args:
-            applicant_characteristics (dict): Each key,value pair represents a
-                applicant characteristic
+            indexes (Iterable[int]): Positions of vpostulation to update
         '''
-        for key,value in applicant_characteristics.items():
-            setattr(self, key, value)
+        self._make_writable()
+        # Position of each key in vpostulation_scores and vpriorities arrays
+        positions = dict(zip(zip(self._keys_program.tolist(),
+                                self._keys_quota.tolist()),
+                            range(len(self._keys_program))))
+        for index in indexes:
+            position = positions.get((self.vpostulation[index],
+                                    self.vquota_id[index]))
+            self.vscores[index] = np.nan if position is None else \
+                self._vpostulation_scores[position] + \
+                self._vpriorities[position]
 
 
     def _reset_matching_attributes(self) -> None:
         '''
-        Reset all attributes related to matching algorithm.
+        Reset all attributes related to matching algorithm. The postulation
+        arrays are the original ones, nothing is copied until _make_writable.
         '''
         self.option_n = 0
         self.linked_postulation = False
@@ -165,24 +407,28 @@ class Applicant():
         self.cut_postulation = False
         self.reassign_quota_order = False
         self.assigned_vacancy = None
-        if isinstance(self.__original_vpostulation,float):
-            self.match = True
-            self.vpostulation = []
-            self.vinstitution_id = []
-            self.vquota_id = []
-            self.vpostulation_scores = dict()
-            self.vpriorities = dict()
-            self.vpriority_profile = dict()
-            self.dynamic_priority = None
-        else:
-            self.match = False
-            self.vpostulation = self.__original_vpostulation.copy()
-            self.vinstitution_id = self.__original_vinstitution_id.copy()
-            self.vquota_id = self.__original_vquota_id.copy()
-            self.vpostulation_scores = self.__original_vpostulation_scores.copy()
-            self.vpriorities = self.__original_vpriorities.copy()
-            self.vpriority_profile = self.__original_vpriority_profile.copy()
-            self.dynamic_priority = [False]*len(self.vpostulation)
+        self.match = len(self.__original_vpostulation) == 0
+        self.vpostulation = self.__original_vpostulation
+        self.vinstitution_id = self.__original_vinstitution_id
+        self.vquota_id = self.__original_vquota_id
+        self._keys_program = self.__original_vpostulation
+        self._keys_quota = self.__original_vquota_id
+        self._vpostulation_scores = self.__original_vpostulation_scores
+        # Priorities and profiles change with sibling priority and SE
+        self._vpriorities = self.__base_vpriorities
+        self._vpriority_profile = self.__original_vpriority_profile
+        self.vscores = self.__base_vscores
+        self._owns_arrays = False
+        self.dynamic_priority = None
+
+    def has_original_postulation(self) -> bool:
+        '''
+        True if the current postulation arrays are the original ones and no
+        rule changed them since the last reset.
+        '''
+        return (not self._owns_arrays) and \
+            (not self.linked_postulation_bool) and \
+            (self.vpostulation is self.__original_vpostulation)
 
 
     def reasign_priority_profile(
@@ -198,16 +444,47 @@ class Applicant():
                 priority profiles. This transition comes from priority_profiles
                 DataFrame.
         '''
+        self._make_writable()
         program_id = self.vpostulation[index]
         quota_id = self.vquota_id[index]
-        priority_profile = self.vpriority_profile[program_id]
+        vpriority_profile = self.vpriority_profile
+        priority_profile = vpriority_profile[program_id]
         new_priority_profile = \
             transition['priority_profile_sibling_transition'][priority_profile]
-        self.vpriority_profile[program_id] = new_priority_profile
+        vpriority_profile[program_id] = new_priority_profile
         self.vpriorities[(program_id,quota_id)] = \
             transition[f'priority_q{quota_id}'][new_priority_profile]
+        self._update_vscores([index])
+        if self.dynamic_priority is None:
+            self.dynamic_priority = np.zeros(len(self.vpostulation),
+                                            dtype=bool)
         self.dynamic_priority[index] = True
 
+    def set_sibling_priority(
+            self,
+            indexes: np.ndarray,
+            vpriority_profile: np.ndarray,
+            priorities: np.ndarray) -> None:
+        '''
+        Set the priority profiles and the priorities in indexes given by
+        sibling priority, as reasign_priority_profile does one index at a
+        time. The postulation must not be reordered yet.
+
+        Args:
+            indexes (Array[int]): Indexes with sibling priority
+            vpriority_profile (Array[int]): Priority profile of each
+                postulation
+            priorities (Array[float]): Priority of each one of indexes
+        '''
+        self._make_writable()
+        self._vpriority_profile[:] = vpriority_profile
+        self._vpriorities[indexes] = priorities
+        self.vscores[indexes] = self._vpostulation_scores[indexes] + priorities
+        if self.dynamic_priority is None:
+            self.dynamic_priority = np.zeros(len(self.vpostulation),
+                                            dtype=bool)
+        self.dynamic_priority[indexes] = True
+
     def reorder_postulation(
             self,
             linked_grades: List,
@@ -219,11 +496,13 @@ class Applicant():
         Args:
             linked_grades (List): List with all the linked grades
             new_postulation_arrays_order (List): List with indexes to
-            reorder postulation arrays.
+            reorder postulation arrays, or None to keep their order.
         '''
         self.linked_postulation_bool = True
         # Keep a register of the linked levels
         self.linked_grades = linked_grades
+        if new_postulation_arrays_order is None:
+            return
 
         # Reorder postulation arrays
         self.vpostulation = \
@@ -232,6 +511,8 @@ class Applicant():
             self.vinstitution_id[new_postulation_arrays_order]
         self.vquota_id = \
             self.vquota_id[new_postulation_arrays_order]
+        self.vscores = \
+            self.vscores[new_postulation_arrays_order]
 
     def set_secured_place_as_last_postulation(self) -> None:
         '''
@@ -240,24 +521,51 @@ class Applicant():
         SE priority.
         Raise if the postulation is not found
         '''
-        self.cut_postulation = True
         try:
             last_post_index = \
                 np.where(self.vpostulation == self.se_program_id)[0][-1]
         except:
             raise ValueError(f'Applicant {self.id} does not have the SE program {self.se_program_id} in vpostulation.')
+        key_indexes = np.where((self._keys_program == self.se_program_id) &
+                                (self._keys_quota == self.se_quota_id))[0]
+        vscore = np.nan
+        if len(key_indexes) > 0:
+            vscore = self._vpostulation_scores[key_indexes[-1]] + \
+                np.float64(self.secured_enrollment_priority)
         #The +1 ensures that [:last_index] includes the SE program
-        last_index = last_post_index+1
+        self.set_secured_place(last_post_index + 1, key_indexes,
+            np.where((self.vpostulation==self.se_program_id) &
+                    (self.vquota_id==self.se_quota_id))[0], vscore)
+
+    def set_secured_place(
+            self,
+            last_index: int,
+            key_indexes: np.ndarray,
+            indexes: np.ndarray,
+            vscore: float) -> None:
+        '''
+        Cut the postulation at last_index and give the secured enrollment
+        priority to (SE_program,SE_quota), with the positions already found
+        by set_secured_place_as_last_postulation.
+
+        Args:
+            last_index (int): Number of applications kept
+            key_indexes (List[int]): Positions of (SE_program,SE_quota) in
+                vpriorities
+            indexes (List[int]): Positions of (SE_program,SE_quota) in
+                vpostulation
+            vscore (float): vscore of (SE_program,SE_quota)
+        '''
+        self._make_writable()
+        self.cut_postulation = True
         # Keep only the postulation that are at the left of the
         # last secured program index
         self.vpostulation = self.vpostulation[:last_index]
         self.vinstitution_id = self.vinstitution_id[:last_index]
         self.vquota_id = self.vquota_id[:last_index]
-
-        try:
-            self.vpriorities[(self.se_program_id,self.se_quota_id)] = self.secured_enrollment_priority
-        except:
-            raise ValueError(f'Applicant {self.id} does not have the pair (SE_program,SE_quota) ({self.se_program_id},{self.se_quota_id}) in vpostulation.')
+        self.vscores = self.vscores[:last_index]
+        self._vpriorities[key_indexes] = self.secured_enrollment_priority
+        self.vscores[indexes] = vscore
 
 
     def check_attribute_criteria(self,
@@ -285,13 +593,76 @@ class Applicant():
             program_id (Any): Hashable present in vpostulation
             ordered_quotas (List): List containing the proper quota order.
         '''
+        self._make_writable()
         indexes_to_modify = np.where(self.vpostulation==program_id)[0]
         if len(indexes_to_modify)!=len(ordered_quotas):
             postulation_quotas = self.vquota_id[indexes_to_modify]
             self.vquota_id[indexes_to_modify]=[q for q in ordered_quotas if q in postulation_quotas]
         else:
             self.vquota_id[indexes_to_modify]=ordered_quotas
+        self._update_vscores(indexes_to_modify)
 
+    def set_postulation_quotas(
+            self,
+            indexes: np.ndarray,
+            vquota_id: np.ndarray,
+            vscores: np.ndarray) -> None:
+        '''
+        Set the quotas in indexes and their vscores, as
+        reorder_postulation_by_quota does one program at a time.
+
+        Args:
+            indexes (Array[int]): Indexes to modify
+            vquota_id (Array[Any]): Quota of each one of indexes
+            vscores (Array[float]): vscore of each one of indexes
+        '''
+        self._make_writable()
+        self.vquota_id[indexes] = vquota_id
+        self.vscores[indexes] = vscores
+
+    def set_postulation_state(
+            self,
+            vpostulation: np.ndarray,
+            vinstitution_id: np.ndarray,
+            vquota_id: np.ndarray,
+            vscores: np.ndarray,
+            vpriorities: np.ndarray,
+            vpriority_profile: np.ndarray,
+            dynamic_priority: np.ndarray,
+            cut_postulation: bool,
+            linked_grades: List) -> None:
+        '''
+        Set the postulation left by the rules of a round at once, as the
+        setters above leave it. The arrays are not copied and become owned by
+        the applicant.
+
+        Args:
+            vpostulation (Array[Any]): Current vpostulation
+            vinstitution_id (Array[Any]): Current vinstitution_id
+            vquota_id (Array[Any]): Current vquota_id
+            vscores (Array[float]): Current vscores
+            vpriorities (Array[float]): Priorities, aligned with the original
+                postulation
+            vpriority_profile (Array[Any]): Priority profiles, aligned with
+                the original postulation
+            dynamic_priority (Array[bool]): None if no sibling priority was
+                given
+            cut_postulation (bool): Postulation cut by secured enrollment
+            linked_grades (List): None if the postulation was not reordered
+                by linked postulation
+        '''
+        self.vpostulation = vpostulation
+        self.vinstitution_id = vinstitution_id
+        self.vquota_id = vquota_id
+        self.vscores = vscores
+        self._vpriorities = vpriorities
+        self._vpriority_profile = vpriority_profile
+        self._owns_arrays = True
+        self.dynamic_priority = dynamic_priority
+        self.cut_postulation = cut_postulation
+        self.linked_postulation_bool = linked_grades is not None
+        if linked_grades is not None:
+            self.linked_grades = linked_grades
 
 
     def _has_SE(self):
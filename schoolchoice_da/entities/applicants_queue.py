@@ -3,6 +3,8 @@ File: applicants_queue.py
 Company: Tether Education Inc.
 '''
 
+import heapq
+
 from schoolchoice_da.entities.applicants import Applicant
 
 
@@ -16,16 +18,58 @@ class Applicant_Queue:
             capacity (int): Queue capacity
         '''
         self.__original_capacity = capacity
+        # (ApplicantMap, applicant_ids) of the members set by
+        # set_assigned_ids, until they are read
+        self._assigned_ids = None
+
+    @property
+    def vassigned_applicants(self) -> list:
+        '''
+        Applicants assigned to the queue. The ones set by set_assigned_ids
+        are created the first time they are read.
+        '''
+        if self._assigned_ids is not None:
+            applicants, applicant_ids = self._assigned_ids
+            self._vassigned_applicants = applicants.get_many(applicant_ids)
+            self._assigned_ids = None
+        return self._vassigned_applicants
 
+    @vassigned_applicants.setter
+    def vassigned_applicants(self, applicants: list) -> None:
+        self._vassigned_applicants = applicants
+        self._assigned_ids = None
+
+    @property
+    def n_assigned(self) -> int:
+        '''
+        Number of applicants assigned, without creating the ones set by
+        set_assigned_ids.
+        '''
+        if self._assigned_ids is not None:
+            return len(self._assigned_ids[1])
+        return len(self._vassigned_applicants)
 
     @property
     def capacity(self) -> int:
         return self.__capacity
 
+    @property
+    def original_capacity(self) -> int:
+        return self.__original_capacity
+
     @property
     def over_capacity(self) -> int:
         return self.__over_capacity
 
+    @property
+    def last_admitted_score(self) -> float:
+        '''
+        Highest score in vassigned_scores, that is the score of the last
+        admitted applicant. It is updated as the queue changes and it is NaN
+        while the queue is empty.
+        '''
+        return self._last_admitted_score
+
     def modify_capacity(
             self,
             capacity_to_be_transfered: int) -> None:
@@ -37,6 +81,19 @@ class Applicant_Queue:
         '''
         self.__capacity = self.__capacity + capacity_to_be_transfered
 
+    def set_original_capacity(
+            self,
+            capacity: int) -> None:
+        '''
+        Replaces the original capacity, which is kept by reset_assignment,
+        and sets the current capacity to it.
+
+        Args:
+            capacity (int): New capacity
+        '''
+        self.__original_capacity = capacity
+        self.__capacity = capacity
+
     def modify_over_capacity(
             self,
             capacity_to_be_transfered: int):
@@ -56,7 +113,7 @@ class Applicant_Queue:
         Returns:
             bool: False if there are less applicants assigned than capacity.
         '''
-        if self.capacity > len(self.vassigned_applicants):
+        if self.capacity > self.n_assigned:
             return False
         else:
             return True
@@ -70,6 +127,11 @@ class Applicant_Queue:
         Args:
             applicant (Applicant): Applicant to append
         '''
+        if self._assigned_ids is not None:
+            applicants, applicant_ids = self._assigned_ids
+            if applicants.get_created(applicant.id) is applicant:
+                applicant_ids.append(applicant.id)
+                return
         self.vassigned_applicants.append(applicant)
 
     def add_score_to_program(self, score: float) -> None:
@@ -80,6 +142,8 @@ class Applicant_Queue:
             score (float): Score to append
         '''
         self.vassigned_scores.append(score)
+        if not (self._last_admitted_score >= score):
+            self._last_admitted_score = score
 
     def get_cut_off_score(self) -> float:
         '''
@@ -97,7 +161,7 @@ class Applicant_Queue:
 
         # Second case: capacity constrains -> Return max score of the array.
         if self.check_capacity_contraints():
-            return max(self.vassigned_scores)
+            return self._last_admitted_score
 
         # Third case: no capacity constrains -> Return 0.
         else:
@@ -131,10 +195,80 @@ class Applicant_Queue:
             new_score (float): Score to be added
             old_applicant (Applicant): Applicant to remove
         '''
-        self.vassigned_scores[self.vassigned_applicants.index(
-            old_applicant)] = new_score
-        self.vassigned_applicants[self.vassigned_applicants.index(
-            old_applicant)] = new_applicant
+        index = self.vassigned_applicants.index(old_applicant)
+        old_score = self.vassigned_scores[index]
+        self.vassigned_scores[index] = new_score
+        self.vassigned_applicants[index] = new_applicant
+        if old_score == self._last_admitted_score:
+            self._update_last_admitted_score()
+        elif new_score > self._last_admitted_score:
+            self._last_admitted_score = new_score
+
+    def remove_applicant_from_program(self, applicant) -> None:
+        '''
+        Remove applicant and his/her score from vassigned_applicants and
+        vassigned_scores.
+
+        Args:
+            applicant (Applicant): Applicant to remove
+        '''
+        index = self.vassigned_applicants.index(applicant)
+        del self.vassigned_applicants[index]
+        score = self.vassigned_scores.pop(index)
+        if score == self._last_admitted_score:
+            self._update_last_admitted_score()
+
+    def set_assignment(
+            self,
+            applicants: list,
+            scores: list) -> None:
+        '''
+        Replace vassigned_applicants and vassigned_scores in bulk, keeping
+        their order.
+
+        Args:
+            applicants (list): Applicants assigned to the queue
+            scores (list): Scores associated with applicants
+        '''
+        self.vassigned_applicants = list(applicants)
+        self.vassigned_scores = list(scores)
+        self._update_last_admitted_score()
+
+    def set_assigned_ids(
+            self,
+            applicants,
+            applicant_ids: list,
+            scores: list) -> None:
+        '''
+        Same as set_assignment with the applicant_ids of the applicants, so
+        they are not created until vassigned_applicants is read.
+
+        Args:
+            applicants (ApplicantMap): Map where the applicants are registered
+            applicant_ids (list): applicant_ids assigned to the queue
+            scores (list): Scores associated with applicant_ids
+        '''
+        self.set_assignment([], scores)
+        self._assigned_ids = (applicants, list(applicant_ids))
+
+    def get_assigned_ids(self) -> list:
+        '''
+        applicant_id of each assigned applicant, without creating the ones
+        set by set_assigned_ids.
+
+        Returns:
+            list: applicant_ids in the order of vassigned_scores
+        '''
+        if self._assigned_ids is not None:
+            return list(self._assigned_ids[1])
+        return [applicant.id for applicant in self._vassigned_applicants]
+
+    def _update_last_admitted_score(self) -> None:
+        '''
+        Recompute last_admitted_score from vassigned_scores.
+        '''
+        self._last_admitted_score = max(self.vassigned_scores) \
+            if self.vassigned_scores else float('nan')
 
     def reset_assignment(self) -> None:
         '''
@@ -144,4 +278,134 @@ class Applicant_Queue:
         self.__capacity = self.__original_capacity
         self.vassigned_applicants = []
         self.vassigned_scores = []
+        self._last_admitted_score = float('nan')
         self.tranfer_capacity = False
+
+
+class Heap_Applicant_Queue(Applicant_Queue):
+    '''
+    Applicant_Queue backed by a max-heap of (score, slot) entries, where slot
+    is the position of the entry in vassigned_scores and vassigned_applicants.
+    The cut-off lookup is O(1) and replacing the cut-off applicant is
+    O(log capacity).
+
+    Ties are broken as in Applicant_Queue: among equal scores the cut-off
+    applicant is the one in the lowest slot, which is the one list.index
+    would find.
+    '''
+
+    def add_score_to_program(self, score: float) -> None:
+        '''
+        Appends a float to vassigned_scores array and pushes it to the heap.
+        It must be called after add_applicant_to_program for the same
+        applicant.
+
+        Args:
+            score (float): Score to append
+        '''
+        self.vassigned_scores.append(score)
+        heapq.heappush(self._heap, (-score, len(self.vassigned_scores)-1))
+        self._last_admitted_score = -self._heap[0][0]
+
+    def get_cut_off_score(self) -> float:
+        '''
+        Same as Applicant_Queue.get_cut_off_score, reading the maximum score
+        from the top of the heap.
+
+        Returns:
+            float: Returns 'infty' if the queue has no capacity.
+            Return the maximum value in vassigned scores if the there are no
+            vacancies left. If there are vacancies left, return 0.
+        '''
+        if (self.capacity == 0):
+            return float('inf')
+
+        if self.check_capacity_contraints():
+            return -self._heap[0][0]
+
+        else:
+            return 0
+
+    def get_cut_off_applicant(self, cut_off_score: float) -> Applicant:
+        '''
+        Returns the Applicant instance from vassigned_applicants associated with
+        cut_off_score score from vassigned_scores.
+
+        Args:
+            cut_off_score (float): Score to search in vassigned_scores.
+
+        Returns:
+            Applicant: Applicant asociated with cut_off_score.
+        '''
+        score, slot = self._heap[0]
+        if -score == cut_off_score:
+            return self.vassigned_applicants[slot]
+        return super().get_cut_off_applicant(cut_off_score)
+
+    def reassign_applicants_and_scores(
+            self,
+            new_applicant,
+            new_score: float,
+            old_applicant) -> None:
+        '''
+        Replace the position of old_applicant with new_applicant and new_score
+        in vassigned_scores and vassigned_applicants. If old_applicant is the
+        cut-off applicant the heap is updated in O(log capacity), otherwise it
+        is rebuilt.
+
+        Args:
+            new_applicant (Applicant): Applicant te be added
+            new_score (float): Score to be added
+            old_applicant (Applicant): Applicant to remove
+        '''
+        slot = self._heap[0][1] if self._heap else None
+        if (slot is not None) and \
+                (self.vassigned_applicants[slot] is old_applicant):
+            heapq.heapreplace(self._heap, (-new_score, slot))
+        else:
+            slot = self.vassigned_applicants.index(old_applicant)
+            self._heap = [entry for entry in self._heap if entry[1] != slot]
+            self._heap.append((-new_score, slot))
+            heapq.heapify(self._heap)
+        self.vassigned_scores[slot] = new_score
+        self.vassigned_applicants[slot] = new_applicant
+        self._last_admitted_score = -self._heap[0][0]
+
+    def set_assignment(
+            self,
+            applicants: list,
+            scores: list) -> None:
+        '''
+        Replace vassigned_applicants and vassigned_scores in bulk, keeping
+        their order, and rebuild the heap.
+
+        Args:
+            applicants (list): Applicants assigned to the queue
+            scores (list): Scores associated with applicants
+        '''
+        super().set_assignment(applicants, scores)
+        self._heap = [(-score, slot)
+            for slot, score in enumerate(self.vassigned_scores)]
+        heapq.heapify(self._heap)
+
+    def remove_applicant_from_program(self, applicant) -> None:
+        '''
+        Remove applicant and his/her score from vassigned_applicants and
+        vassigned_scores, and rebuild the heap.
+
+        Args:
+            applicant (Applicant): Applicant to remove
+        '''
+        super().remove_applicant_from_program(applicant)
+        self.set_assignment(self.vassigned_applicants, self.vassigned_scores)
+
+    def reset_assignment(self) -> None:
+        '''
+        Reset all attributes related to matching.
+        '''
+        super().reset_assignment()
+        self._heap = []
+
+
+QUEUE_TYPES = {'list': Applicant_Queue,
+                'heap': Heap_Applicant_Queue}
@@ -0,0 +1,933 @@
+'''
+File: array_match.py
+Company: Tether Education Inc.
+'''
+
+from typing import Any, Dict, List, Tuple
+import heapq
+import math
+import numpy as np
+import pandas as pd
+
+from schoolchoice_da.entities.programs import Program
+from schoolchoice_da.entities.applicants import Applicant
+from schoolchoice_da.entities.applicant_store import (ApplicantMap,
+    Postulations, _get_ranges)
+from schoolchoice_da.entities.match import DeferredAcceptanceAlgorithm
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+class MarketArrays:
+    '''
+    Integer encoding of a market ready to be matched. Applicants and queues
+    are referred to by their position in applicant_ids and queues lists.
+    Preference lists are stored as one flat array plus offsets, so the
+    options of applicant a are in positions offsets[a]:offsets[a+1].
+    '''
+    def __init__(self,
+                 applicants: ApplicantMap,
+                 applicant_ids: List,
+                 positions: np.ndarray,
+                 postulations: Postulations,
+                 queues: List[Tuple[Program, int]],
+                 offsets: np.ndarray,
+                 pref_queues: np.ndarray,
+                 pref_scores: np.ndarray,
+                 option_n: np.ndarray,
+                 matched: np.ndarray,
+                 assigned_queue: np.ndarray,
+                 capacity: np.ndarray,
+                 held: Dict[int, Tuple[List[int], List[float]]],
+                 proposing: np.ndarray):
+        '''
+        Args:
+            applicants (ApplicantMap): Map where the applicants are registered
+            applicant_ids (List): applicant_id by index
+            positions (np.ndarray): Position of each applicant in applicants
+            postulations (Postulations): Postulation of each applicant, whose
+                current applications are the options
+            queues (List[Tuple[Program, int]]): (program, assignment type) by
+                queue index
+            offsets (np.ndarray): n_applicants+1 offsets into pref arrays
+            pref_queues (np.ndarray): Queue index of each option. -1 marks an
+                option that can not be proposed to.
+            pref_scores (np.ndarray): Score of each option
+            option_n (np.ndarray): Next option of each applicant
+            matched (np.ndarray): Match flag of each applicant
+            assigned_queue (np.ndarray): Queue holding each applicant or -1
+            capacity (np.ndarray): Capacity of each queue
+            held (Dict): {queue: ([applicants], [scores])} already assigned
+            proposing (np.ndarray): Applicants in proposing order, the last
+                one proposes first.
+        '''
+        self.applicants = applicants
+        self.applicant_ids = applicant_ids
+        self.positions = positions
+        self.postulations = postulations
+        self.queues = queues
+        self.offsets = offsets
+        self.pref_queues = pref_queues
+        self.pref_scores = pref_scores
+        self.option_n = option_n
+        self.matched = matched
+        self.assigned_queue = assigned_queue
+        self.capacity = capacity
+        self.held = held
+        self.proposing = proposing
+
+
+class ProposalError(Exception):
+    '''
+    Raised by the array engines when an applicant proposes to an option that
+    can not be matched.
+    '''
+    def __init__(self, applicant: int, option: int):
+        super().__init__(applicant, option)
+        self.applicant = applicant
+        self.option = option
+
+
+def _heap_before(slot_score, base, i, j):
+    '''
+    True if slot i goes before slot j in the max-heap of a queue: higher
+    score first and, among equal scores, lower slot first.
+    '''
+    score_i = slot_score[base + i]
+    score_j = slot_score[base + j]
+    return (score_i > score_j) or ((score_i == score_j) and (i < j))
+
+
+def _heap_sift_up(heap, slot_score, base, position):
+    slot = heap[base + position]
+    while position > 0:
+        parent = (position - 1) >> 1
+        if _heap_before(slot_score, base, slot, heap[base + parent]):
+            heap[base + position] = heap[base + parent]
+            position = parent
+        else:
+            break
+    heap[base + position] = slot
+
+
+def _heap_sift_down(heap, slot_score, base, size, position):
+    slot = heap[base + position]
+    while True:
+        child = 2*position + 1
+        if child >= size:
+            break
+        if (child + 1 < size) and _heap_before(slot_score, base,
+                heap[base + child + 1], heap[base + child]):
+            child += 1
+        if _heap_before(slot_score, base, heap[base + child], slot):
+            heap[base + position] = heap[base + child]
+            position = child
+        else:
+            break
+    heap[base + position] = slot
+
+
+def _deferred_acceptance_kernel(
+        offsets, pref_queues, pref_scores, option_n, matched, assigned_queue,
+        capacity, queue_start, queue_size, slot_applicant, slot_score, heap,
+        stack, stack_size, rejected_queues, rejected_applicants,
+        rejected_scores):
+    '''
+    Same loop as ArrayDeferredAcceptanceAlgorithm.run_arrays over preallocated
+    arrays, so it can be compiled. Slots of queue q are in
+    queue_start[q]:queue_start[q+1].
+
+    Returns:
+        (n_rejections, status, applicant, position, n_proposals, n_evictions,
+        longest_chain): status is 0 when the matching is done, 1 when
+        applicant can not propose to position and 2 when a queue ran out of
+        slots.
+    '''
+    n_rejections = 0
+    n_proposals = 0
+    n_evictions = 0
+    chain = 0
+    longest_chain = 0
+    inf = np.inf
+    while stack_size > 0:
+        stack_size -= 1
+        a = stack[stack_size]
+        if matched[a]:
+            continue
+        n_proposals += 1
+        chain += 1
+        position = offsets[a] + option_n[a]
+        if position >= offsets[a+1]:
+            return (n_rejections, 1, a, position, n_proposals, n_evictions,
+                    longest_chain)
+        q = pref_queues[position]
+        if q < 0:
+            return (n_rejections, 1, a, position, n_proposals, n_evictions,
+                    longest_chain)
+        score = pref_scores[position]
+        base = queue_start[q]
+        size = queue_size[q]
+
+        if capacity[q] == 0:
+            cut_off_score = inf
+        elif capacity[q] > size:
+            cut_off_score = 0.0
+        else:
+            cut_off_score = slot_score[base + heap[base]]
+
+        rejected = -1
+        rejected_score = 0.0
+        if cut_off_score == 0:
+            if base + size >= queue_start[q+1]:
+                return (n_rejections, 2, a, position, n_proposals,
+                        n_evictions, longest_chain)
+            slot_applicant[base + size] = a
+            slot_score[base + size] = score
+            heap[base + size] = size
+            queue_size[q] = size + 1
+            _heap_sift_up(heap, slot_score, base, size)
+            matched[a] = True
+            assigned_queue[a] = q
+        elif np.isinf(cut_off_score):
+            rejected = a
+            rejected_score = score
+        elif cut_off_score <= score:
+            rejected = a
+            rejected_score = score
+        else:
+            slot = heap[base]
+            rejected = slot_applicant[base + slot]
+            rejected_score = cut_off_score
+            slot_applicant[base + slot] = a
+            slot_score[base + slot] = score
+            _heap_sift_down(heap, slot_score, base, size, 0)
+            matched[a] = True
+            assigned_queue[a] = q
+            n_evictions += 1
+
+        if rejected >= 0:
+            rejected_queues[n_rejections] = q
+            rejected_applicants[n_rejections] = rejected
+            rejected_scores[n_rejections] = rejected_score
+            n_rejections += 1
+            option_n[rejected] += 1
+            assigned_queue[rejected] = -1
+            if option_n[rejected] < offsets[rejected+1] - offsets[rejected]:
+                matched[rejected] = False
+                stack[stack_size] = rejected
+                stack_size += 1
+                continue
+            else:
+                matched[rejected] = True
+        if chain > longest_chain:
+            longest_chain = chain
+        chain = 0
+    return (n_rejections, 0, -1, -1, n_proposals, n_evictions,
+            longest_chain)
+
+
+if njit is not None:
+    _heap_before = njit(cache=True)(_heap_before)
+    _heap_sift_up = njit(cache=True)(_heap_sift_up)
+    _heap_sift_down = njit(cache=True)(_heap_sift_down)
+    _deferred_acceptance_kernel = \
+        njit(cache=True)(_deferred_acceptance_kernel)
+
+
+class ArrayDeferredAcceptanceAlgorithm(DeferredAcceptanceAlgorithm):
+    '''
+    Applicant proposing Deferred Acceptance over an integer encoded market.
+    It follows the same proposal order and tie handling as
+    DeferredAcceptanceAlgorithm, so it returns the same matching and
+    waitlists, but the loop only touches ints, floats and lists.
+
+    The market is encoded from the postulations and the state arrays of an
+    ApplicantMap (run_ids), and the result is written back in bulk, so the
+    applicants are not created. Applicants held by the queues are created
+    when the queues are read.
+
+    If numba is installed the loop is compiled, otherwise it runs in Python.
+    '''
+    def __init__(self, compiled: bool = True):
+        '''
+        Args:
+            compiled (bool): Use the numba compiled loop when available.
+        '''
+        super().__init__()
+        self.compiled = compiled and (njit is not None)
+
+    def run(self,
+            applicants: Dict[Any, Applicant],
+            programs: Dict[Tuple[Any, int], Program]) -> None:
+        '''
+        Run Deferred Acceptance matching algorithm
+
+        Args:
+            applicants (dict): Applicants to be matched
+            programs (dict): Programs to be matched
+        '''
+        self.run_ids(ApplicantMap(applicants), list(applicants), programs)
+
+    def run_ids(self,
+            applicants: ApplicantMap,
+            applicant_ids: List,
+            programs: Dict[Tuple[Any, int], Program]) -> None:
+        '''
+        Run Deferred Acceptance matching algorithm over the applicants of
+        applicant_ids, without creating them.
+
+        Args:
+            applicants (ApplicantMap): Map where the applicants are registered
+            applicant_ids (List): Applicants to be matched
+            programs (dict): Programs to be matched
+        '''
+        market = self.encode_market(applicants, programs, applicant_ids)
+        try:
+            result = self._run_market(market)
+        except ProposalError as error:
+            self._raise_proposal_error(market, error)
+        *result, self.stats = result
+        self.decode_market(market, *result)
+
+    def _run_market(self, market: MarketArrays) -> Tuple:
+        '''
+        Run the loop of the engine over market.
+
+        Returns:
+            Tuple: Output of run_arrays
+        '''
+        result = None
+        if self.compiled:
+            result = self.run_compiled(market)
+        if result is None:
+            result = self.run_arrays(market)
+        return result
+
+    @staticmethod
+    def run_arrays(market: MarketArrays) -> Tuple:
+        '''
+        Run Deferred Acceptance over the arrays of market. Each queue keeps a
+        max-heap of (score, slot) entries, as Heap_Applicant_Queue does.
+
+        Args:
+            market (MarketArrays): Encoded market
+
+        Returns:
+            Tuple: option_n, matched and assigned_queue lists, the
+            {queue: (applicants, scores)} assignment, the list of
+            (queue, applicant, score) rejections in the order they happened
+            and the counters of the run, as in DeferredAcceptanceAlgorithm.
+        '''
+        offsets = market.offsets.tolist()
+        pref_queues = market.pref_queues.tolist()
+        pref_scores = market.pref_scores.tolist()
+        option_n = market.option_n.tolist()
+        matched = market.matched.tolist()
+        assigned_queue = market.assigned_queue.tolist()
+        capacity = market.capacity.tolist()
+
+        members = {}
+        scores = {}
+        heaps = {}
+        for q, (q_members, q_scores) in market.held.items():
+            members[q] = list(q_members)
+            scores[q] = list(q_scores)
+            heaps[q] = [(-score, slot) for slot, score in enumerate(q_scores)]
+            heapq.heapify(heaps[q])
+
+        rejections = []
+        n_proposals = n_evictions = 0
+        chain = longest_chain = 0
+        inf = float('inf')
+        heappush = heapq.heappush
+        heapreplace = heapq.heapreplace
+        remaining_proposals = market.proposing.tolist()
+        while remaining_proposals:
+            a = remaining_proposals.pop()
+            if matched[a]:
+                continue
+            n_proposals += 1
+            chain += 1
+            position = offsets[a] + option_n[a]
+            if position >= offsets[a+1]:
+                raise ProposalError(a, position)
+            q = pref_queues[position]
+            if q < 0:
+                raise ProposalError(a, position)
+            score = pref_scores[position]
+            q_members = members.get(q)
+            if q_members is None:
+                q_members = members[q] = []
+                scores[q] = []
+                heaps[q] = []
+            heap = heaps[q]
+
+            if capacity[q] == 0:
+                cut_off_score = inf
+            elif capacity[q] > len(q_members):
+                cut_off_score = 0
+            else:
+                cut_off_score = -heap[0][0]
+
+            rejected = -1
+            if cut_off_score == 0:
+                matched[a] = True
+                assigned_queue[a] = q
+                heappush(heap, (-score, len(q_members)))
+                q_members.append(a)
+                scores[q].append(score)
+            elif math.isinf(cut_off_score):
+                rejected = a
+                rejected_score = score
+            elif cut_off_score <= score:
+                rejected = a
+                rejected_score = score
+            else:
+                slot = heap[0][1]
+                rejected = q_members[slot]
+                rejected_score = cut_off_score
+                heapreplace(heap, (-score, slot))
+                q_members[slot] = a
+                scores[q][slot] = score
+                matched[a] = True
+                assigned_queue[a] = q
+                n_evictions += 1
+
+            if rejected >= 0:
+                rejections.append((q, rejected, rejected_score))
+                option_n[rejected] += 1
+                assigned_queue[rejected] = -1
+                if option_n[rejected] < offsets[rejected+1] - offsets[rejected]:
+                    matched[rejected] = False
+                    remaining_proposals.append(rejected)
+                    continue
+                else:
+                    matched[rejected] = True
+            longest_chain = max(longest_chain, chain)
+            chain = 0
+
+        assignment = {q: (members[q], scores[q]) for q in members}
+        stats = DeferredAcceptanceAlgorithm._get_stats(n_proposals,
+            len(rejections) - n_evictions, n_evictions, longest_chain)
+        return option_n, matched, assigned_queue, assignment, rejections, stats
+
+    @staticmethod
+    def run_compiled(market: MarketArrays) -> Tuple:
+        '''
+        Same as run_arrays, using the compiled loop.
+
+        Args:
+            market (MarketArrays): Encoded market
+
+        Returns:
+            Tuple: Same output as run_arrays, or None if a queue grows over
+            its capacity, which only the Python loop supports.
+        '''
+        n_applicants = len(market.option_n)
+        n_queues = len(market.capacity)
+        held_size = np.zeros(n_queues, dtype=np.int64)
+        for q, (q_members, _) in market.held.items():
+            held_size[q] = len(q_members)
+        queue_start = np.zeros(n_queues+1, dtype=np.int64)
+        np.cumsum(np.maximum(market.capacity, held_size) + 1,
+            out=queue_start[1:])
+        slot_applicant = np.full(queue_start[-1], -1, dtype=np.int64)
+        slot_score = np.zeros(queue_start[-1], dtype=np.float64)
+        heap = np.zeros(queue_start[-1], dtype=np.int64)
+        for q, (q_members, q_scores) in market.held.items():
+            base = queue_start[q]
+            slot_applicant[base:base+len(q_members)] = q_members
+            slot_score[base:base+len(q_members)] = q_scores
+            for slot in range(len(q_members)):
+                heap[base + slot] = slot
+                _heap_sift_up(heap, slot_score, base, slot)
+
+        option_n = market.option_n.copy()
+        matched = market.matched.copy()
+        assigned_queue = market.assigned_queue.copy()
+        n_options = len(market.pref_queues)
+        stack = np.zeros(len(market.proposing) + n_options + 1,
+            dtype=np.int64)
+        stack[:len(market.proposing)] = market.proposing
+        rejected_queues = np.zeros(n_options + 1, dtype=np.int64)
+        rejected_applicants = np.zeros(n_options + 1, dtype=np.int64)
+        rejected_scores = np.zeros(n_options + 1, dtype=np.float64)
+
+        (n_rejections, status, applicant, position, n_proposals, n_evictions,
+            longest_chain) = _deferred_acceptance_kernel(
+                market.offsets, market.pref_queues, market.pref_scores,
+                option_n, matched, assigned_queue, market.capacity,
+                queue_start, held_size, slot_applicant, slot_score, heap,
+                stack, len(market.proposing), rejected_queues,
+                rejected_applicants, rejected_scores)
+        if status == 1:
+            raise ProposalError(applicant, position)
+        if status == 2:
+            return None
+
+        assignment = {}
+        for q in np.flatnonzero(held_size).tolist():
+            base = queue_start[q]
+            assignment[q] = (
+                slot_applicant[base:base+held_size[q]].tolist(),
+                slot_score[base:base+held_size[q]].tolist())
+        rejections = list(zip(rejected_queues[:n_rejections].tolist(),
+                            rejected_applicants[:n_rejections].tolist(),
+                            rejected_scores[:n_rejections].tolist()))
+        stats = DeferredAcceptanceAlgorithm._get_stats(int(n_proposals),
+            int(n_rejections - n_evictions), int(n_evictions),
+            int(longest_chain))
+        return (option_n.tolist(), matched.tolist(), assigned_queue.tolist(),
+                assignment, rejections, stats)
+
+    def encode_market(self,
+            applicants: ApplicantMap,
+            programs: Dict[Tuple[Any, int], Program],
+            applicant_ids: List = None) -> MarketArrays:
+        '''
+        Encode applicants and programs as a MarketArrays instance, reading
+        the postulations and the matching state of the applicants from the
+        ApplicantMap. Applicants already held by a queue are encoded too, so
+        they can be rejected and keep proposing as in
+        DeferredAcceptanceAlgorithm.
+
+        Args:
+            applicants (ApplicantMap): Map where the applicants are
+                registered, or a dict of Applicant objects to be matched
+            programs (dict): Programs to be matched
+            applicant_ids (List): Applicants to be matched, if applicants is
+                an ApplicantMap
+
+        Returns:
+            MarketArrays: encoded market
+        '''
+        if not isinstance(applicants, ApplicantMap):
+            applicant_ids = list(applicants)
+            applicants = ApplicantMap(applicants)
+        program_list = list(programs.values())
+        program_index = pd.MultiIndex.from_tuples(list(programs.keys())) \
+            if len(programs) > 0 else None
+
+        applicant_ids = list(applicant_ids)
+        n_proposing = len(applicant_ids)
+        applicant_index = dict(zip(applicant_ids, range(n_proposing)))
+
+        queues = []
+        queue_objects = []
+        queue_index = {}
+        held = {}
+        parts = []
+        pref_queues = []
+        encoded = 0
+        # Held applicants of new queues are appended to applicant_ids, so
+        # their options are encoded in the next pass.
+        while encoded < len(applicant_ids):
+            batch = applicant_ids[encoded:]
+            encoded = len(applicant_ids)
+            postulations = applicants.get_postulations(batch)
+            batch_programs, batch_types = self._encode_options(postulations,
+                applicants.get_assignment_types(
+                    applicants.get_positions(batch)), program_index)
+
+            batch_queues = np.full(len(batch_programs), -1, dtype=np.int64)
+            valid = batch_programs >= 0
+            if valid.any():
+                keys = list(zip(batch_programs[valid].tolist(),
+                                batch_types[valid].tolist()))
+                for key in set(keys):
+                    if key in queue_index:
+                        continue
+                    program = program_list[key[0]]
+                    try:
+                        queue = program.get_assignment_type_queue(
+                                    assignment_type=key[1])
+                    except:
+                        queue_index[key] = -1
+                        continue
+                    q = queue_index[key] = len(queues)
+                    queues.append((program, key[1]))
+                    queue_objects.append(queue)
+                    if queue.n_assigned > 0:
+                        held[q] = (self._get_held_applicants(applicants,
+                            queue, applicant_ids, applicant_index),
+                            list(queue.vassigned_scores))
+                batch_queues[valid] = [queue_index[key] for key in keys]
+            batch_queues[np.isnan(postulations.columns['vscores'].astype(
+                np.float64))] = -1
+
+            parts.append(postulations)
+            pref_queues.append(batch_queues)
+
+        if len(parts) == 0:
+            parts.append(applicants.get_postulations([]))
+        postulations = Postulations.concatenate(parts) if len(parts) != 1 \
+            else parts[0]
+        positions = applicants.get_positions(applicant_ids)
+        # Applicants alive may have changed since their round was released
+        applicants.sync_state(applicant_ids)
+        state = applicants.get_match_state(positions)
+
+        assigned_queue = np.full(len(applicant_ids), -1, dtype=np.int64)
+        for q, (held_applicants, _) in held.items():
+            assigned_queue[held_applicants] = q
+
+        return MarketArrays(
+            applicants=applicants,
+            applicant_ids=applicant_ids,
+            positions=positions,
+            postulations=postulations,
+            queues=queues,
+            offsets=postulations.offsets,
+            pref_queues=np.concatenate(pref_queues) if pref_queues else \
+                np.zeros(0, dtype=np.int64),
+            pref_scores=postulations.columns['vscores'].astype(np.float64),
+            option_n=state['option_n'].copy(),
+            matched=state['match'].copy(),
+            assigned_queue=assigned_queue,
+            capacity=np.array([queue.capacity for queue in queue_objects],
+                dtype=np.int64),
+            held=held,
+            proposing=np.arange(n_proposing, dtype=np.int64))
+
+    @staticmethod
+    def _get_held_applicants(
+            applicants: ApplicantMap,
+            queue: Any,
+            applicant_ids: List,
+            applicant_index: Dict[Any, int]) -> List[int]:
+        '''
+        Index of each applicant held by queue, appending the new ones to
+        applicant_ids. Held applicants that are not registered in applicants,
+        as the ones matched with another dict by run, are registered with
+        their objects.
+        '''
+        held_ids = queue.get_assigned_ids()
+        missing = np.flatnonzero(applicants.get_positions(held_ids) < 0)
+        if len(missing) > 0:
+            held_objects = queue.vassigned_applicants
+            applicants.update({held_ids[i]: held_objects[i]
+                for i in missing.tolist()})
+        held_applicants = []
+        for applicant_id in held_ids:
+            a = applicant_index.get(applicant_id)
+            if a is None:
+                a = applicant_index[applicant_id] = len(applicant_ids)
+                applicant_ids.append(applicant_id)
+            held_applicants.append(a)
+        return held_applicants
+
+    @staticmethod
+    def _encode_options(
+            postulations: Postulations,
+            assignment_types: np.ndarray,
+            program_index: pd.MultiIndex) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Encode the current applications of postulations.
+
+        Args:
+            postulations (Postulations): Applicants to encode
+            assignment_types (np.ndarray): special_assignment of each
+                applicant
+            program_index (pd.MultiIndex): (program_id, quota_id) of the
+                programs, in the order of the programs list.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Per option, the program position
+            (-1 if missing) and the assignment type.
+        '''
+        n_options = postulations.offsets[-1]
+        if n_options == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if program_index is None:
+            program_positions = np.full(n_options, -1, dtype=np.int64)
+        else:
+            program_positions = program_index.get_indexer(
+                pd.MultiIndex.from_arrays([
+                    postulations.columns['vpostulation'],
+                    postulations.columns['vquota_id']]))
+        return (program_positions.astype(np.int64),
+                np.repeat(np.asarray(assignment_types, dtype=np.int64),
+                        np.diff(postulations.offsets)))
+
+    def decode_market(self,
+            market: MarketArrays,
+            option_n: List[int],
+            matched: List[bool],
+            assigned_queue: List[int],
+            assignment: Dict[int, Tuple[List[int], List[float]]],
+            rejections: List[Tuple[int, int, float]]) -> None:
+        '''
+        Write the result of run_arrays back in bulk: the matching state in
+        the ApplicantMap of market, the applicant_ids and scores held by each
+        queue and the rejections in the waitlists.
+        '''
+        applicant_ids = market.applicant_ids
+        queues = market.queues
+        option_n = np.asarray(option_n, dtype=np.int64)
+        matched = np.asarray(matched, dtype=bool)
+        assigned_queue = np.asarray(assigned_queue, dtype=np.int64)
+        # Only applicants that proposed or were rejected are written back
+        changed = np.flatnonzero((option_n != market.option_n) |
+            (matched != market.matched) |
+            (assigned_queue != market.assigned_queue))
+        # Unassigned applicants take the None at the end
+        queue_programs = np.full(len(queues) + 1, None, dtype=object)
+        for q, (program, _) in enumerate(queues):
+            queue_programs[q] = program
+        changed_queues = assigned_queue[changed]
+        scores = np.full(len(changed), np.nan)
+        profiles = np.full(len(changed), None, dtype=object)
+        assigned = np.flatnonzero(changed_queues >= 0)
+        if len(assigned) > 0:
+            applicants = changed[assigned]
+            options = market.offsets[applicants] + option_n[applicants]
+            scores[assigned] = market.pref_scores[options]
+            profiles[assigned] = self._get_priority_profiles(
+                market.postulations, applicants,
+                market.postulations.columns['vpostulation'][options])
+        market.applicants.set_match_state(
+            [applicant_ids[a] for a in changed.tolist()],
+            market.positions[changed], option_n[changed], matched[changed],
+            queue_programs[changed_queues], scores, profiles)
+
+        for q, (q_members, q_scores) in assignment.items():
+            program, assignment_type = queues[q]
+            program.get_assignment_type_queue(
+                assignment_type=assignment_type).set_assigned_ids(
+                market.applicants, [applicant_ids[a] for a in q_members],
+                q_scores)
+
+        if len(rejections) == 0:
+            return
+        rejected_queues, rejected, rejected_scores = \
+            [np.array(column) for column in zip(*rejections)]
+        with np.errstate(invalid='ignore'):
+            priorities = np.floor_divide(rejected_scores, 1)
+        # Programs may write in different stores
+        store_codes, stores = pd.factorize(np.array([
+            id(program.waitlist_store) for program, _ in queues]))
+        waitlist_indexes = np.array([program._waitlist_index
+            for program, _ in queues], dtype=np.int64)
+        first_queue = {code: q for q, code
+            in reversed(list(enumerate(store_codes.tolist())))}
+        rejected_stores = store_codes[rejected_queues]
+        for code in range(len(stores)):
+            selected = np.flatnonzero(rejected_stores == code) \
+                if len(stores) > 1 else np.arange(len(rejected))
+            queues[first_queue[code]][0].waitlist_store.add_events(
+                waitlist_indexes[rejected_queues[selected]],
+                [applicant_ids[a] for a in rejected[selected].tolist()],
+                priorities[selected])
+
+    @staticmethod
+    def _get_priority_profiles(
+            postulations: Postulations,
+            applicants: np.ndarray,
+            program_ids: np.ndarray) -> np.ndarray:
+        '''
+        Priority profile of each one of applicants in its program of
+        program_ids, as Applicant.vpriority_profile reads it: at the last
+        position of the program in the original postulation.
+        '''
+        key_offsets = postulations.key_offsets
+        starts = key_offsets[applicants]
+        offsets, positions = _get_ranges(starts,
+                                        key_offsets[applicants + 1] - starts)
+        owners = np.repeat(np.arange(len(applicants)), np.diff(offsets))
+        found = np.asarray(postulations.key_columns['keys_program'][
+            positions] == program_ids[owners], dtype=bool)
+        last = np.full(len(applicants), -1, dtype=np.int64)
+        np.maximum.at(last, owners[found], positions[found])
+        return postulations.key_columns['vpriority_profile'][last]
+
+    def _raise_proposal_error(self,
+            market: MarketArrays,
+            error: ProposalError) -> None:
+        '''
+        Fill self.errors with the failed proposal and raise a ValueError
+        as DeferredAcceptanceAlgorithm.run does.
+        '''
+        applicant_id = market.applicant_ids[error.applicant]
+        program_id = None
+        quota_id = None
+        if error.option < market.offsets[error.applicant + 1]:
+            program_id = market.postulations.columns['vpostulation'][
+                error.option]
+            quota_id = market.postulations.columns['vquota_id'][error.option]
+        self.errors['applicant_id'] = applicant_id
+        self.errors['program_id'] = program_id
+        self.errors['quota_id'] = quota_id
+        raise ValueError(f'Error while assigning applicant\
+            :{applicant_id} to program:{(program_id, quota_id)}')
+
+
+class BatchDeferredAcceptanceAlgorithm(ArrayDeferredAcceptanceAlgorithm):
+    '''
+    Applicant proposing Deferred Acceptance in synchronous rounds. In each
+    round every unmatched applicant proposes to his/her next option and every
+    queue keeps its best capacity applicants among the ones it held and the
+    new proposals, with one lexsort over the whole round.
+
+    Scores must be distinct inside each queue (lottery numbers break ties),
+    and then it returns the same applicant optimal stable matching as
+    DeferredAcceptanceAlgorithm. The waitlists have the same entries, but
+    entries with the same priority may be ranked in another order, since
+    the rejections are written round by round.
+    '''
+    def __init__(self):
+        super().__init__(compiled=False)
+
+    def _run_market(self, market: MarketArrays) -> Tuple:
+        self.check_distinct_scores(market)
+        return self.run_batches(market)
+
+    @staticmethod
+    def check_distinct_scores(market: MarketArrays) -> None:
+        '''
+        Raise if two applicants have the same score in a queue, counting the
+        applicants already held by it, since the synchronous rounds would
+        break the tie in another way than DeferredAcceptanceAlgorithm.
+
+        Args:
+            market (MarketArrays): Encoded market
+        '''
+        valid = market.pref_queues >= 0
+        applicants = [np.repeat(np.arange(len(market.offsets) - 1),
+            np.diff(market.offsets))[valid]]
+        queues = [market.pref_queues[valid]]
+        scores = [market.pref_scores[valid]]
+        for q, (q_members, q_scores) in market.held.items():
+            applicants.append(np.asarray(q_members, dtype=np.int64))
+            queues.append(np.full(len(q_members), q, dtype=np.int64))
+            scores.append(np.asarray(q_scores, dtype=np.float64))
+        applicants, queues, scores = [np.concatenate(column)
+            for column in (applicants, queues, scores)]
+        # The held applicants also apply to their queue, with the same score
+        order = np.lexsort((applicants, scores, queues))
+        applicants, queues, scores = \
+            applicants[order], queues[order], scores[order]
+        tied = np.flatnonzero((queues[1:] == queues[:-1]) &
+            (scores[1:] == scores[:-1]) & (applicants[1:] != applicants[:-1]))
+        if len(tied) > 0:
+            i = tied[0]
+            program, assignment_type = market.queues[queues[i]]
+            raise ValueError(f'Applicants {market.applicant_ids[applicants[i]]} and {market.applicant_ids[applicants[i + 1]]} have the same score {scores[i]} in program {(program.program_id, program.quota_id)}, assignment type {assignment_type}. The batch engine needs distinct scores in each queue.')
+
+    @staticmethod
+    def run_batches(market: MarketArrays) -> Tuple:
+        '''
+        Run Deferred Acceptance over the arrays of market in synchronous
+        rounds.
+
+        Args:
+            market (MarketArrays): Encoded market
+
+        Returns:
+            Tuple: Same output as ArrayDeferredAcceptanceAlgorithm.run_arrays.
+            Queue members are ordered by score. Since every unmatched
+            applicant proposes at once, longest_chain counts the rounds.
+        '''
+        offsets = market.offsets
+        lengths = np.diff(offsets)
+        option_n = market.option_n.copy()
+        matched = market.matched.copy()
+        assigned_queue = market.assigned_queue.copy()
+        capacity = market.capacity
+        held_score = np.zeros(len(option_n), dtype=np.float64)
+        for q, (q_members, q_scores) in market.held.items():
+            held_score[q_members] = q_scores
+
+        rejected_queues = []
+        rejected_applicants = []
+        rejected_scores = []
+        touched = np.zeros(len(capacity), dtype=bool)
+        n_proposals = n_evictions = n_rounds = 0
+        proposing = market.proposing[~matched[market.proposing]]
+        while len(proposing) > 0:
+            n_proposals += len(proposing)
+            n_rounds += 1
+            positions = offsets[proposing] + option_n[proposing]
+            queues = np.full(len(proposing), -1, dtype=np.int64)
+            has_option = positions < offsets[proposing+1]
+            queues[has_option] = market.pref_queues[positions[has_option]]
+            if (queues < 0).any():
+                first = int(np.flatnonzero(queues < 0)[0])
+                raise ProposalError(int(proposing[first]),
+                                    int(positions[first]))
+            scores = market.pref_scores[positions]
+
+            # Held applicants of the queues that received proposals compete
+            # again with the new ones.
+            touched[:] = False
+            touched[queues] = True
+            held = np.flatnonzero(assigned_queue >= 0)
+            held = held[touched[assigned_queue[held]]]
+
+            candidates = np.concatenate([held, proposing])
+            candidate_queues = np.concatenate([assigned_queue[held], queues])
+            candidate_scores = np.concatenate([held_score[held], scores])
+            is_new = np.concatenate([np.zeros(len(held), dtype=bool),
+                                    np.ones(len(proposing), dtype=bool)])
+            order = np.lexsort((candidates, is_new, candidate_scores,
+                                candidate_queues))
+            candidates = candidates[order]
+            candidate_queues = candidate_queues[order]
+            candidate_scores = candidate_scores[order]
+            is_new = is_new[order]
+
+            group_start = np.flatnonzero(np.r_[True,
+                candidate_queues[1:] != candidate_queues[:-1]])
+            group_size = np.diff(np.r_[group_start, len(candidates)])
+            rank = np.arange(len(candidates)) - \
+                np.repeat(group_start, group_size)
+            keep = rank < capacity[candidate_queues]
+
+            accepted = candidates[keep]
+            assigned_queue[accepted] = candidate_queues[keep]
+            held_score[accepted] = candidate_scores[keep]
+            matched[accepted] = True
+
+            rejected = candidates[~keep]
+            n_evictions += int((~keep & ~is_new).sum())
+            rejected_queues.append(candidate_queues[~keep])
+            rejected_applicants.append(rejected)
+            rejected_scores.append(candidate_scores[~keep])
+            option_n[rejected] += 1
+            assigned_queue[rejected] = -1
+            exhausted = option_n[rejected] >= lengths[rejected]
+            matched[rejected] = exhausted
+            proposing = np.sort(rejected[~exhausted])
+
+        order = np.lexsort((np.arange(len(assigned_queue)), held_score,
+                            assigned_queue))
+        order = order[assigned_queue[order] >= 0]
+        sorted_queues = assigned_queue[order]
+        group_start = np.flatnonzero(np.r_[True,
+            sorted_queues[1:] != sorted_queues[:-1]]) if len(order) > 0 \
+            else np.zeros(0, dtype=np.int64)
+        assignment = {}
+        for members, members_scores in zip(
+                np.split(order, group_start[1:]),
+                np.split(held_score[order], group_start[1:])):
+            if len(members) > 0:
+                assignment[int(assigned_queue[members[0]])] = \
+                    (members.tolist(), members_scores.tolist())
+
+        if rejected_queues:
+            rejections = list(zip(np.concatenate(rejected_queues).tolist(),
+                            np.concatenate(rejected_applicants).tolist(),
+                            np.concatenate(rejected_scores).tolist()))
+        else:
+            rejections = []
+        stats = DeferredAcceptanceAlgorithm._get_stats(n_proposals,
+            len(rejections) - n_evictions, n_evictions, n_rounds)
+        return (option_n.tolist(), matched.tolist(), assigned_queue.tolist(),
+                assignment, rejections, stats)
+
+
+ENGINES = {'object': DeferredAcceptanceAlgorithm,
+            'array': ArrayDeferredAcceptanceAlgorithm,
+            'batch': BatchDeferredAcceptanceAlgorithm}
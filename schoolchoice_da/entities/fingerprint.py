@@ -0,0 +1,53 @@
+'''
+File: fingerprint.py
+Company: Tether Education Inc.
+'''
+
+from typing import Any, Dict
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+def _hash_column(values: pd.Series) -> np.ndarray:
+    '''
+    Bytes that identify the values of a column: the values themselves for
+    numeric columns and row hashes for the rest. Columns of unhashable
+    objects, as lists, are hashed through their repr.
+    '''
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufcmM':
+        return np.ascontiguousarray(values.to_numpy())
+    try:
+        return pd.util.hash_pandas_object(values, index=False).to_numpy()
+    except TypeError:
+        return pd.util.hash_pandas_object(values.map(repr),
+                                            index=False).to_numpy()
+
+
+def get_fingerprint(frames: Dict[str, Any], **parameters) -> str:
+    '''
+    Content hash of DataFrames and parameters. It depends on the names,
+    dtypes and values of the columns, in order, but not on the index, so
+    the same inputs read again from disk give the same fingerprint.
+
+    Args:
+        frames (Dict[str, Any]): {name: DataFrame or None}
+        **parameters: Values whose repr is part of the fingerprint
+
+    Returns:
+        str: Hexadecimal digest
+    '''
+    digest = hashlib.sha256()
+    for name, frame in frames.items():
+        digest.update(f'frame {name}\n'.encode())
+        if not isinstance(frame, pd.DataFrame):
+            digest.update(f'{frame!r}\n'.encode())
+            continue
+        digest.update(f'{len(frame)}\n'.encode())
+        for i, column in enumerate(frame.columns):
+            values = frame.iloc[:, i]
+            digest.update(f'{column!r} {values.dtype}\n'.encode())
+            digest.update(_hash_column(values))
+    for name, value in sorted(parameters.items()):
+        digest.update(f'{name}={value!r}\n'.encode())
+    return digest.hexdigest()
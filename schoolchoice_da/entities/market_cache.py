@@ -0,0 +1,158 @@
+'''
+File: market_cache.py
+Company: Tether Education Inc.
+'''
+
+from typing import Any, Dict
+import gc
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+
+from schoolchoice_da.entities.applicant_store import (ApplicantStore,
+    _factorize_with_na)
+
+
+class _StorePickler(pickle.Pickler):
+    '''
+    Pickler that writes the arrays of each ApplicantStore to .npy files next
+    to the pickle, so they are memory-mapped when loaded. Object arrays are
+    written as integer codes, and their distinct values go in the pickle.
+    '''
+    def __init__(self, file, directory: str):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self._stores : Dict[int, tuple] = {}
+
+    def _save_array(self, name: str, array: np.ndarray) -> None:
+        np.save(os.path.join(self.directory, f'{name}.npy'), array,
+                allow_pickle=False)
+
+    def persistent_id(self, obj: Any) -> Any:
+        if type(obj) is not ApplicantStore:
+            return None
+        if id(obj) in self._stores:
+            return self._stores[id(obj)]
+        name = f'store_{len(self._stores)}'
+        self._save_array(f'{name}_offsets', obj.offsets)
+        uniques = {}
+        for column, array in obj.columns.items():
+            if array.dtype == object:
+                array, uniques[column] = _factorize_with_na(array)
+            self._save_array(f'{name}_{column}', array)
+        pid = self._stores[id(obj)] = \
+            ('ApplicantStore', name, list(obj.columns), uniques)
+        return pid
+
+
+class _StoreUnpickler(pickle.Unpickler):
+    '''
+    Unpickler of _StorePickler. Typed arrays of the stores are read-only
+    memory maps of their .npy files.
+    '''
+    def __init__(self, file, directory: str):
+        super().__init__(file)
+        self.directory = directory
+        self._stores : Dict[str, ApplicantStore] = {}
+
+    def _load_array(self, name: str) -> np.ndarray:
+        # A plain ndarray view keeps the map open without the memmap subclass
+        return np.load(os.path.join(self.directory, f'{name}.npy'),
+                        mmap_mode='r').view(np.ndarray)
+
+    def persistent_load(self, pid: Any) -> Any:
+        tag, name, columns, uniques = pid
+        if tag != 'ApplicantStore':
+            raise pickle.UnpicklingError(f'Unexpected persistent id "{tag}".')
+        if name in self._stores:
+            return self._stores[name]
+        arrays = {}
+        for column in columns:
+            array = self._load_array(f'{name}_{column}')
+            if column in uniques:
+                array = np.asarray(uniques[column], dtype=object)[array]
+            arrays[column] = array
+        store = self._stores[name] = ApplicantStore(
+            self._load_array(f'{name}_offsets'), arrays)
+        return store
+
+
+class MarketCache:
+    '''
+    Directory of prepared markets, one sub-directory per fingerprint of the
+    inputs and rules. A market is the state of a PolicyMaker after its
+    preprocessing: a pickle with the applicants, programs, waitlist seeds,
+    rules and partition index, plus a .npy file per array of the postulation
+    store, which is memory-mapped when loaded. Markets are written to a
+    temporary directory and renamed, so concurrent runs never read a partial
+    market, and markets written with another format_version are ignored.
+    '''
+    format_version = 3
+
+    def __init__(self, directory: str):
+        '''
+        Args:
+            directory (str): Cache directory, created when the first market is
+                saved
+        '''
+        self.directory = directory
+
+    def get_path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, fingerprint)
+
+    def load(self, fingerprint: str) -> Dict[str, Any]:
+        '''
+        Load a prepared market.
+
+        Args:
+            fingerprint (str)
+
+        Returns:
+            Dict[str, Any]: The state given to save, or None if the market is
+            not in the cache or was written with another format_version.
+        '''
+        path = self.get_path(fingerprint)
+        if not os.path.exists(os.path.join(path, 'market.pkl')):
+            return None
+        # The collector would scan the objects as they are unpickled
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(os.path.join(path, 'market.pkl'), 'rb') as file:
+                version, state = _StoreUnpickler(file, path).load()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if version != self.format_version:
+            return None
+        return state
+
+    def save(self, fingerprint: str, state: Dict[str, Any]) -> None:
+        '''
+        Save a prepared market, unless it is already in the cache.
+
+        Args:
+            fingerprint (str)
+            state (Dict[str, Any]): Picklable state. ApplicantStore objects
+                in it are written as .npy files.
+        '''
+        path = self.get_path(fingerprint)
+        if os.path.exists(path):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = tempfile.mkdtemp(prefix=f'.{fingerprint}.',
+                                    dir=self.directory)
+        try:
+            with open(os.path.join(temporary, 'market.pkl'), 'wb') as file:
+                _StorePickler(file, temporary).dump(
+                    (self.format_version, state))
+            try:
+                os.rename(temporary, path)
+            except OSError:
+                # Another run saved the same market first
+                if not os.path.exists(path):
+                    raise
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
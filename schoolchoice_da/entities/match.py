@@ -3,32 +3,104 @@ File: match.py
 Company: Tether Education Inc.
 '''
 
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
 import math
 
 from schoolchoice_da.entities.programs import Program
 from schoolchoice_da.entities.applicants import Applicant
+from schoolchoice_da.entities.applicant_store import ApplicantMap
+
+
+class MatchObserver:
+    '''
+    Receives the counters of each grade and assignment type round of the
+    matching. Subclass it and override the methods of interest, then attach
+    it with DeferredAcceptanceAlgorithm.add_observer.
+    '''
+    def on_round_start(
+            self,
+            grade: Any,
+            assignment_type: int,
+            n_applicants: int) -> None:
+        '''
+        Called before the round is matched.
+
+        Args:
+            grade (Any): grade_id of the round
+            assignment_type (int): Assignment type of the round
+            n_applicants (int): Applicants to be matched in the round
+        '''
+
+    def on_round_end(self, summary: Dict) -> None:
+        '''
+        Called after the round is matched.
+
+        Args:
+            summary (Dict): "grade", "assignment_type", "n_applicants",
+                "proposals", "rejections", "evictions", "longest_chain" and
+                "wall_time" of the round.
+        '''
 
 
 class DeferredAcceptanceAlgorithm:
     def __init__(self):
         self.errors = {}
+        self.observers = []
+        self.stats = self._get_stats()
+
+    @staticmethod
+    def _get_stats(
+            proposals: int = 0,
+            rejections: int = 0,
+            evictions: int = 0,
+            longest_chain: int = 0) -> Dict[str, int]:
+        '''
+        Counters of a run.
+
+        Args:
+            proposals (int): Proposals made
+            rejections (int): Proposals rejected by the program
+            evictions (int): Assigned applicants displaced by a proposal
+            longest_chain (int): Longest sequence of proposals where each one
+                is made by the applicant rejected by the previous one.
+
+        Returns:
+            Dict[str, int]
+        '''
+        return {'proposals':proposals,
+                'rejections':rejections,
+                'evictions':evictions,
+                'longest_chain':longest_chain}
+
+    def add_observer(self, observer: MatchObserver) -> None:
+        '''
+        Notify observer of every round matched with this algorithm.
+
+        Args:
+            observer (MatchObserver)
+        '''
+        self.observers.append(observer)
 
     def run(self,
             applicants: Dict[int, Applicant],
             programs: Dict[Tuple[int, int], Program]) -> None:
         '''
-        Run Deferred Acceptance matching algorithm
+        Run Deferred Acceptance matching algorithm. Counters of the run are
+        left in self.stats.
 
         Args:
             applicants (dict): Applicants to be matched
             programs (dict): Programs to be matched
         '''
+        proposals = rejections = evictions = 0
+        chain = longest_chain = 0
         remaining_proposals = list(applicants.values())
         while remaining_proposals:
             # Get next proposing applicant
             applicant = remaining_proposals.pop()
             if not applicant.match:
+                proposals += 1
+                chain += 1
                 # We get program and quota id that uses position n
                 program_id = applicant.vpostulation[applicant.option_n]
                 quota_id = applicant.vquota_id[applicant.option_n]
@@ -36,7 +108,8 @@ class DeferredAcceptanceAlgorithm:
                     program = programs[(program_id, quota_id)]
                     rejected_applicant = self.match_applicant_to_program(
                                             applicant,
-                                            program)
+                                            program,
+                                            option_n=applicant.option_n)
                 except:
                     self.errors['applicant_id'] = applicant.id
                     self.errors['program_id'] = program_id
@@ -44,6 +117,10 @@ class DeferredAcceptanceAlgorithm:
                     raise ValueError(f'Error while assigning applicant\
                         :{applicant.id} to program:{(program_id, quota_id)}')
                 if rejected_applicant:
+                    if rejected_applicant is applicant:
+                        rejections += 1
+                    else:
+                        evictions += 1
                     rejected_applicant.option_n += 1
 
                     if (rejected_applicant.option_n <
@@ -51,16 +128,41 @@ class DeferredAcceptanceAlgorithm:
                         (DeferredAcceptanceAlgorithm.
                             unmatch_applicant_of_program(
                             rejected_applicant))
+                        # It is popped next, continuing the chain
                         remaining_proposals.append(rejected_applicant)
+                        continue
                     else:
                         (DeferredAcceptanceAlgorithm
                             .applicant_match_with_None_program(
                             rejected_applicant))
+                if chain > longest_chain:
+                    longest_chain = chain
+                chain = 0
+        self.stats = self._get_stats(proposals, rejections, evictions,
+                                    longest_chain)
+
+    def run_ids(self,
+            applicants: ApplicantMap,
+            applicant_ids: List,
+            programs: Dict[Tuple[int, int], Program]) -> None:
+        '''
+        Run Deferred Acceptance matching algorithm over the applicants of
+        applicant_ids, creating their objects.
+
+        Args:
+            applicants (ApplicantMap): Map where the applicants are registered
+            applicant_ids (List): Applicants to be matched
+            programs (dict): Programs to be matched
+        '''
+        applicant_ids = list(applicant_ids)
+        self.run(dict(zip(applicant_ids, applicants.get_many(applicant_ids))),
+                programs)
 
     @staticmethod
     def match_applicant_to_program(
             applicant: Applicant,
-            program: Program) -> Any:
+            program: Program,
+            option_n: int = None) -> Any:
         '''
         Match applicant to program and quota if he/she got the score to enter
         the Applicant_Queue, and reject another (or him(her)self) if
@@ -69,6 +171,8 @@ class DeferredAcceptanceAlgorithm:
         Args:
             applicant (Applicant): Applicant to be match.
             programs (Dict[Tuple[Any, int], Program]): All programs.
+            option_n (int, optional): Position of program in the applicant
+                postulation, to read the score from vscores.
 
         Returns:
             Any: Applicant or None
@@ -80,7 +184,8 @@ class DeferredAcceptanceAlgorithm:
         # Obtener el puntaje del postulante en el programa-quota
         try:
             new_applicant_score = \
-                program.get_applicant_score_in_program(applicant)
+                program.get_applicant_score_in_program(applicant,
+                    option_n=option_n)
         except:
             raise ValueError(f'Error while getting score in vpostulation\
             :{applicant.vpostulation} and vquota:{applicant.vquota_id}')
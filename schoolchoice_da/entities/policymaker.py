@@ -3,16 +3,28 @@ File: policymaker.py
 Company: Tether Education Inc.
 '''
 
-from typing import Any, Dict, Tuple, List
+from typing import Any, Dict, Iterable, Optional, Tuple, List
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import itertools
+import copy
 import warnings
 import sys
 import os
+import time
 import pandas as pd
 import numpy as np
 
 from schoolchoice_da.entities.programs import Program
+from schoolchoice_da.entities.applicants_queue import QUEUE_TYPES
 from schoolchoice_da.entities.applicants import Applicant
-from schoolchoice_da.entities.match import DeferredAcceptanceAlgorithm
+from schoolchoice_da.entities.applicant_store import ApplicantStore, ApplicantMap, Postulations
+from schoolchoice_da.entities.waitlist import WaitlistStore
+from schoolchoice_da.entities.profiler import PhaseProfiler
+from schoolchoice_da.entities.validation import InputValidator, InputValidationError
+from schoolchoice_da.entities.fingerprint import get_fingerprint
+from schoolchoice_da.entities.market_cache import MarketCache
+from schoolchoice_da.entities.array_match import ENGINES
 
 
 class PolicyMaker:
@@ -35,6 +47,13 @@ class PolicyMaker:
             forced_secured_enrollment_assignment : bool = False,
             transfer_capacity_activation : bool = False,
             check_inputs : bool =True,
+            validation_cache : str = None,
+            market_cache : str = None,
+            queue_type : str = 'list',
+            engine : str = 'object',
+            n_jobs : int = 1,
+            track_waitlists : bool = True,
+            profile : bool = False,
             **kwargs
             ) -> None:
         '''
@@ -57,86 +76,989 @@ class PolicyMaker:
             transfer_capacity_activation (bool): Transfiere vacantes no utilizadas
             desde special a regular assignment.
             check_inputs (bool): Revisa que los dataframes cumplan ciertos requisitos.
+            validation_cache (str): Directorio donde se guardan las huellas de
+            los inputs ya validados, para no volver a revisarlos. Si es None no
+            se guardan.
+            market_cache (str): Directorio donde se guarda el mercado ya
+            preprocesado, identificado por la huella de los inputs y las
+            reglas. Si el mismo mercado ya está guardado, se carga en vez de
+            preprocesarlo de nuevo. Si es None, o si la lotería se sortea con
+            lottery_maker, no se guarda.
+            queue_type (str): Implementación de las colas de postulantes, 'list'
+            o 'heap'. 'heap' es más rápida en programas con muchas vacantes.
+            engine (str): Implementación del algoritmo DA. 'object' recorre los
+            objetos Applicant y Program, 'array' los codifica como arreglos de
+            enteros y entrega la misma asignación, 'batch' corre rondas de
+            propuestas simultáneas sobre esos arreglos. 'batch' exige puntajes
+            distintos dentro de cada cola, incluidos los postulantes ya
+            asignados, y si no levanta ValueError. Sus listas de espera tienen
+            las mismas entradas, pero las de igual prioridad pueden quedar en
+            otro orden.
+            n_jobs (int): Cantidad de procesos para asignar en paralelo los
+            submercados independientes. -1 usa todos los procesadores. Con
+            n_jobs distinto de 1, rematch vuelve a asignar el mercado completo.
+            track_waitlists (bool): Registra las listas de espera. Si es False
+            las listas de espera quedan vacías.
+            profile (bool): Registra el tiempo y la memoria de cada etapa del
+            preprocesamiento, de cada ronda de asignación y de get_results.
+            Ver get_profile.
         '''
+        if queue_type not in QUEUE_TYPES:
+            raise ValueError(f'Unexpected queue_type "{queue_type}". Use one of {list(QUEUE_TYPES)}.')
+        if engine not in ENGINES:
+            raise ValueError(f'Unexpected engine "{engine}". Use one of {list(ENGINES)}.')
+        self._queue_type = queue_type
+        self._engine = engine
+        self._n_jobs = os.cpu_count() if n_jobs in (-1, None) else n_jobs
+        self._matched = False
+        self.waitlists = WaitlistStore(enabled=track_waitlists)
+        self.profiler = PhaseProfiler(enabled=profile)
         self._set_rules(order = order,
                 sibling_priority_activation = sibling_priority_activation,
                 linked_postulation_activation = linked_postulation_activation,
                 secured_enrollment_assignment = secured_enrollment_assignment,
                 forced_secured_enrollment_assignment = forced_secured_enrollment_assignment,
                 transfer_capacity_activation = transfer_capacity_activation,
-                check_inputs = check_inputs)
-
-        self.check_inputs(vacancies=vacancies,
-                            applicants=applicants,
-                            applications=applications,
-                            priority_profiles=priority_profiles,
-                            quota_order=quota_order,
-                            siblings=siblings,
-                            links=links)
-        self._unpack_priority_profiles(priority_profiles)
-        self._unpack_quota_order(quota_order)
-
-        self.algorithm = DeferredAcceptanceAlgorithm()
-        applicants = self._add_sibling_and_linked_data(applicants=applicants,
-                                                        siblings=siblings,
-                                                        links=links)
-        applications = self._check_lottery(applications = applications,
-                                            applicants = applicants,
-                                            siblings = siblings,
-                                            **kwargs)
-        applications = self._filter_relevant_applications(vacancies = vacancies,
-                                            applications = applications,
-                                            applicants = applicants)
-        applicants = self._add_postulation_data(applicants=applicants,
-                                                applications=applications)
-        self.applicants_df = self._init_applicants(applicants=applicants)
-        self.applicants : Dict[Any,Applicant] = self._get_applicants_dict()
+                check_inputs = check_inputs,
+                validation_cache = validation_cache)
+
+        self.algorithm = ENGINES[self._engine]()
+
+        frames = {'vacancies':vacancies,
+                'applicants':applicants,
+                'applications':applications,
+                'priority_profiles':priority_profiles,
+                'quota_order':quota_order,
+                'siblings':siblings,
+                'links':links}
+        if (market_cache is not None) and \
+                ('lottery_number_quota' not in applications.columns):
+            # lottery_maker draws another lottery in each run, which is not
+            # part of the fingerprint
+            warnings.warn('market_cache is ignored, as applications has no "lottery_number_quota" column and the lottery is drawn again in each run.')
+            market_cache = None
+        cache = None if market_cache is None else MarketCache(market_cache)
+        state = None
+        if cache is not None:
+            fingerprint = self._get_market_fingerprint(frames, **kwargs)
+            with self.profiler.phase('load_market_cache'):
+                state = cache.load(fingerprint)
+        if state is not None:
+            self.__dict__.update(state)
+        else:
+            self._prepare_market(**frames, **kwargs)
+            if cache is not None:
+                with self.profiler.phase('save_market_cache'):
+                    cache.save(fingerprint, self._get_market_state())
 
-        self.programs : Dict[Tuple(Any,int),Program] = self._init_programs_to_dict(vacancies=vacancies)
-        self.add_unrelevant_applications_to_waitlist()
+    def _prepare_market(
+            self,
+            vacancies: pd.DataFrame,
+            applicants: pd.DataFrame,
+            applications: pd.DataFrame,
+            priority_profiles: pd.DataFrame,
+            quota_order: pd.DataFrame,
+            siblings: pd.DataFrame,
+            links: pd.DataFrame,
+            **kwargs) -> None:
+        '''
+        Check and preprocess the inputs into the applicants, programs,
+        waitlist seeds and partition index used in the matching.
+        '''
+        phase = self.profiler.phase
+        with phase('check_inputs'):
+            self.check_inputs(vacancies=vacancies,
+                                applicants=applicants,
+                                applications=applications,
+                                priority_profiles=priority_profiles,
+                                quota_order=quota_order,
+                                siblings=siblings,
+                                links=links)
+        with phase('unpack_rules'):
+            self._unpack_priority_profiles(priority_profiles)
+            self._unpack_quota_order(quota_order)
+
+        with phase('add_sibling_and_linked_data'):
+            applicants = self._add_sibling_and_linked_data(applicants=applicants,
+                                                            siblings=siblings,
+                                                            links=links)
+        with phase('check_lottery'):
+            applications = self._check_lottery(applications = applications,
+                                                applicants = applicants,
+                                                siblings = siblings,
+                                                **kwargs)
+        with phase('filter_relevant_applications'):
+            applications = self._filter_relevant_applications(vacancies = vacancies,
+                                                applications = applications,
+                                                applicants = applicants)
+        with phase('add_postulation_data'):
+            applicants, store = self._add_postulation_data(
+                applicants=applicants, applications=applications)
+        with phase('init_applicants'):
+            self.applicants_df, self.applicants = \
+                self._init_applicants(applicants=applicants, store=store)
+            self.waitlists.add_applicants(self.applicants_df['applicant_id'])
+
+        with phase('init_programs'):
+            self.programs : Dict[Tuple(Any,int),Program] = self._init_programs_to_dict(vacancies=vacancies)
+            self.add_unrelevant_applications_to_waitlist()
+        self._build_partition_index()
 
         self.ordered_grades = self._get_ordered_grades()
         self.assignment_types = self._get_assignment_types()
         self.first_round = self.ordered_grades[0]
         self.last_round = self.ordered_grades[-1]
 
+    def _get_market_fingerprint(
+            self,
+            frames: Dict[str, pd.DataFrame],
+            **kwargs) -> str:
+        '''
+        Fingerprint of the inputs and of every option that changes the
+        prepared market, used as its key in the market cache.
+
+        Args:
+            frames (Dict[str, pd.DataFrame]): {input name: DataFrame}
+            **kwargs: Options of lottery_maker
 
-    def match_applicants_and_programs(self) -> None:
+        Returns:
+            str
+        '''
+        return get_fingerprint(frames,
+            version=MarketCache.format_version,
+            order=self._order,
+            sibling_priority_activation=self._sibling_priority_activation,
+            linked_postulation_activation=self._linked_postulation_activation,
+            secured_enrollment_assignment=self._secured_enrollment_activation,
+            forced_secured_enrollment_assignment=\
+                self._forced_secured_enrollment_activation,
+            transfer_capacity_activation=self._transfer_capacity_activation,
+            check_inputs=self._check_inputs,
+            queue_type=self._queue_type,
+            track_waitlists=self.waitlists.enabled,
+            lottery_options=sorted(kwargs.items()))
+
+    def _get_market_state(self) -> Dict[str, Any]:
+        '''
+        Attributes of the prepared market, without the ones set by the
+        options that do not change it (engine, n_jobs, profile and
+        validation_cache).
+
+        Returns:
+            Dict[str, Any]
+        '''
+        return {key: value for key, value in self.__dict__.items()
+            if key not in ['algorithm', 'profiler', '_engine', '_n_jobs',
+                            '_validation_cache']}
+
+
+    def match_applicants_and_programs(self) -> pd.DataFrame:
         '''
         Match applicants and program objects, adjusting sibling priority,
         postulation order, linked postulation, secured enrollment and transfer
         capacity between rounds according to the rules in config.
+        If n_jobs is not 1, independent sub-markets are matched in parallel,
+        unless the market is a single sub-market.
+
+        Returns:
+            pd.DataFrame: Summary of each grade and assignment type round,
+            with the fields "grade", "assignment_type", "n_applicants",
+            "proposals", "rejections", "evictions", "longest_chain" and
+            "wall_time" (seconds spent by the algorithm).
         '''
+        self._matched = True
+        if self._n_jobs > 1:
+            with self.profiler.phase('match_in_parallel'):
+                summary = self._match_components_in_parallel()
+            if summary is not None:
+                return summary
+
+        summaries = []
         # For each grade
         for grade in self.ordered_grades:
             # Get all programs in such grade
-            programs_to_be_assigned = \
-                self._prep_programs_for_matching(
-                    grade=grade)
+            with self.profiler.phase('prep_programs', grade=grade):
+                programs_to_be_assigned = \
+                    self._prep_programs_for_matching(
+                        grade=grade)
             # For each assignment type
             for assignment_type in self.assignment_types:
-                # Get all students in such grade and assignment type, modifying
-                # them according to conditions specified in config.
-                applicants_to_be_assigned = \
-                    self._prep_applicants_for_matching(
+                with self.profiler.phase('match_round', grade=grade,
+                                        assignment_type=assignment_type):
+                    # Get all students in such grade and assignment type,
+                    # modifying them according to conditions specified in
+                    # config.
+                    applicant_ids = self._prep_applicants_for_matching(
                         grade=grade,
                         assignment_type=assignment_type)
 
-                # Make grade and assignment_type assignment
-                try:
-                    self.algorithm.run(applicants=applicants_to_be_assigned,
-                                   programs=programs_to_be_assigned)
-                except:
-                    self._check_grade_compatibility()
-                    raise ValueError(f'Error while assigning grade:{grade} and assignment_type:{assignment_type}')
-
-                # Apply transfer capacity or forced secured enrollment
-                self._after_round_adjustments(
-                    applicants_to_be_assigned=applicants_to_be_assigned,
+                    # Make grade and assignment_type assignment
+                    summaries.append(self._run_round(
+                        grade=grade,
+                        assignment_type=assignment_type,
+                        applicant_ids=applicant_ids,
+                        programs_to_be_assigned=programs_to_be_assigned))
+                    self._release_round(grade, assignment_type)
+
+                    # Apply transfer capacity or forced secured enrollment
+                    self._after_round_adjustments(
+                        grade=grade,
+                        assignment_type=assignment_type)
+        return self._get_round_summary(summaries)
+
+    def _run_round(
+            self,
+            grade: Any,
+            assignment_type: int,
+            applicant_ids: List,
+            programs_to_be_assigned: Dict[Tuple[Any, int], Program]) -> Dict:
+        '''
+        Match a grade and assignment type round, notifying the observers
+        attached to the algorithm. The applicants are read from
+        self.applicants, and the array engines do not create them.
+
+        Returns:
+            Dict: Summary of the round, as received by
+            MatchObserver.on_round_end
+        '''
+        observers = self.algorithm.observers
+        for observer in observers:
+            observer.on_round_start(grade, assignment_type,
+                                    len(applicant_ids))
+        start = time.perf_counter()
+        try:
+            self.algorithm.run_ids(applicants=self.applicants,
+                                applicant_ids=applicant_ids,
+                                programs=programs_to_be_assigned)
+        except:
+            self._check_grade_compatibility()
+            raise ValueError(f'Error while assigning grade:{grade} and assignment_type:{assignment_type}')
+        summary = {'grade':grade,
+                    'assignment_type':assignment_type,
+                    'n_applicants':len(applicant_ids),
+                    **self.algorithm.stats,
+                    'wall_time':time.perf_counter() - start}
+        for observer in observers:
+            observer.on_round_end(summary)
+        return summary
+
+    @staticmethod
+    def _get_round_summary(summaries: List[Dict]) -> pd.DataFrame:
+        return pd.DataFrame(summaries, columns=['grade', 'assignment_type',
+            'n_applicants', 'proposals', 'rejections', 'evictions',
+            'longest_chain', 'wall_time'])
+
+    def rematch(
+            self,
+            applicants: pd.DataFrame = None,
+            applications: pd.DataFrame = None,
+            removed_applicants: List = None,
+            vacancies: pd.DataFrame = None,
+            siblings: pd.DataFrame = None,
+            links: pd.DataFrame = None,
+            **kwargs) -> pd.DataFrame:
+        '''
+        Apply a small change of the inputs to an already matched market and
+        resume the matching from the current assignment, instead of running
+        it again from scratch. The result is the same as matching the changed
+        inputs in a new PolicyMaker.
+        Added applicants and capacity decreases resume the deferred acceptance
+        from the current assignment. Removed applicants and capacity increases
+        release seats, so only the applicants that proposed to those queues
+        (and, transitively, to the queues they leave) are matched again.
+        Removed or modified applicants release every queue they proposed to,
+        since they may have rejected other applicants there.
+        When sibling priority, linked postulation, transfer capacity or forced
+        secured enrollment are active, rounds depend on each other and the
+        whole market is matched again. With n_jobs other than 1 the whole
+        market is also matched again, in parallel.
+        If the market was not matched yet, inputs are updated but not matched.
+
+        Args:
+            applicants (pd.DataFrame): New or modified applicants, with the
+                same columns as the applicants DataFrame. Modified applicants
+                keep their place.
+            applications (pd.DataFrame): All the applications of applicants.
+            removed_applicants (List): applicant_ids to remove.
+            vacancies (pd.DataFrame): program_id, quota_id and the new
+                "regular_vacancies" or "special_i_vacancies" of quotas whose
+                capacity changes.
+            siblings (pd.DataFrame): Siblings of applicants.
+            links (pd.DataFrame): Links of applicants.
+
+        Returns:
+            pd.DataFrame: Summary of the rounds matched again, as in
+            match_applicants_and_programs. None if the market was not matched.
+        '''
+        if (applicants is None) != (applications is None):
+            raise ValueError('applicants and applications DataFrames must be provided together.')
+        removed_ids = [] if removed_applicants is None else list(removed_applicants)
+        if len(set(removed_ids) - self.applicants.keys()) != 0:
+            raise KeyError('There are removed_applicants that are not registered in the applicants DataFrame.')
+        incremental = self._matched and self.waitlists.enabled and \
+            (self._n_jobs == 1) and not (
+            self._sibling_priority_activation or
+            self._linked_postulation_activation or
+            self._transfer_capacity_activation or
+            self._forced_secured_enrollment_activation)
+
+        # Queues whose final assignment may change when seats are released
+        released_queues = {}
+        decreased_queues = []
+        # Rounds whose applicants may change, released at the end
+        changed_rounds = set()
+        capacity_changes, closed_programs = \
+            self._get_capacity_changes(vacancies)
+        for program, assignment_type, capacity in capacity_changes:
+            queue = program.get_assignment_type_queue(assignment_type)
+            if capacity > queue.original_capacity:
+                released_queues[(program.program_id, program.quota_id,
+                    assignment_type)] = (program, assignment_type)
+            elif capacity < queue.original_capacity:
+                decreased_queues.append((program, queue))
+                changed_rounds.add((program.grade_id, assignment_type))
+            queue.set_original_capacity(capacity)
+        # Applications to programs without vacancies are only kept in waitlist
+        for program in closed_programs:
+            self._close_program(program)
+
+        new_applicants = None
+        new_applicant_map = None
+        replaced_ids = []
+        if applicants is not None:
+            new_applicants, new_applicant_map = self._init_new_applicants(applicants=applicants,
+                                                    applications=applications,
+                                                    siblings=siblings,
+                                                    links=links,
+                                                    **kwargs)
+            replaced_ids = [applicant_id for applicant_id
+                in new_applicants['applicant_id']
+                if (applicant_id in self.applicants) and
+                (applicant_id not in removed_ids)]
+
+        for applicant_id in removed_ids + replaced_ids:
+            applicant = self.applicants[applicant_id]
+            program = applicant.assigned_vacancy
+            if program is not None:
+                program.get_assignment_type_queue(
+                    applicant.special_assignment).remove_applicant_from_program(
+                    applicant)
+            # The applicant may have held a seat in every queue it proposed
+            # to, rejecting others before being rejected, so all of them are
+            # matched again
+            for program_id, quota_id in zip(
+                    applicant.vpostulation[:applicant.option_n + 1],
+                    applicant.vquota_id[:applicant.option_n + 1]):
+                program = self.programs[(program_id, quota_id)]
+                released_queues[(program_id, quota_id,
+                    applicant.special_assignment)] = \
+                    (program, applicant.special_assignment)
+            self.waitlists.remove_applicant(applicant_id)
+        self._update_applicants(new_applicants=new_applicants,
+                                removed_ids=removed_ids,
+                                new_applicant_map=new_applicant_map)
+        if new_applicants is not None:
+            self.add_unrelevant_applications_to_waitlist()
+
+        if not self._matched:
+            return None
+        if not incremental:
+            self.reset_matching()
+            return self.match_applicants_and_programs()
+
+        proposers = {}
+        # Capacity decreases reject the worst assigned applicants
+        for program, queue in decreased_queues:
+            while len(queue.vassigned_applicants) > queue.capacity:
+                rejected_score = queue.last_admitted_score
+                rejected_applicant = queue.get_cut_off_applicant(rejected_score)
+                queue.remove_applicant_from_program(rejected_applicant)
+                program.add_applicant_to_waitlist(rejected_applicant.id,
+                                                    rejected_score//1)
+                rejected_applicant.option_n += 1
+                if rejected_applicant.option_n < \
+                        len(rejected_applicant.vpostulation):
+                    self.algorithm.unmatch_applicant_of_program(
+                        rejected_applicant)
+                    proposers[rejected_applicant.id] = rejected_applicant
+                else:
+                    self.algorithm.applicant_match_with_None_program(
+                        rejected_applicant)
+
+        # Released seats may go to anyone who proposed to those queues
+        for applicant in self._get_released_applicants(
+                released_queues.values()):
+            program = applicant.assigned_vacancy
+            if program is not None:
+                program.get_assignment_type_queue(
+                    applicant.special_assignment).remove_applicant_from_program(
+                    applicant)
+            for program_id, quota_id in zip(
+                    applicant.vpostulation[:applicant.option_n + 1],
+                    applicant.vquota_id[:applicant.option_n + 1]):
+                self.programs[(program_id, quota_id)].remove_applicant_from_waitlist(
+                    applicant.id, keep_seed=True)
+            applicant.option_n = 0
+            self.algorithm.unmatch_applicant_of_program(applicant)
+            proposers[applicant.id] = applicant
+
+        if new_applicants is not None:
+            self._check_quota_postulation_order(new_applicants)
+            if self._secured_enrollment_activation:
+                self._set_secured_places(new_applicants)
+            for applicant in self._get_applicant_objects(new_applicants):
+                proposers[applicant.id] = applicant
+
+        summaries = []
+        for grade in self.ordered_grades:
+            programs_to_be_assigned = \
+                self._prep_programs_for_matching(
+                    grade=grade)
+            for assignment_type in self.assignment_types:
+                applicants_to_be_assigned = {applicant_id:applicant
+                    for applicant_id,applicant in proposers.items()
+                    if (applicant.grade == grade) and
+                    (applicant.special_assignment == assignment_type)}
+                if len(applicants_to_be_assigned) == 0:
+                    continue
+                summaries.append(self._run_round(
                     grade=grade,
-                    assignment_type=assignment_type)
+                    assignment_type=assignment_type,
+                    applicant_ids=list(applicants_to_be_assigned),
+                    programs_to_be_assigned=programs_to_be_assigned))
+                changed_rounds.add((grade, assignment_type))
+        for grade, assignment_type in changed_rounds:
+            self._release_round(grade, assignment_type)
+        return self._get_round_summary(summaries)
+
+    def _get_capacity_changes(
+            self,
+            vacancies: pd.DataFrame) -> Tuple[List, List[Program]]:
+        '''
+        Unpack the new capacities of a vacancies DataFrame with the quotas
+        whose capacity changes.
 
+        Args:
+            vacancies (pd.DataFrame): Vacancies df
 
+        Returns:
+            Tuple[List, List[Program]]: (program, assignment_type, capacity)
+            of each change, and the programs left without vacancies.
+        '''
+        capacity_changes = []
+        closed_programs = []
+        if vacancies is None:
+            return capacity_changes, closed_programs
+        for row in vacancies.to_dict(orient='records'):
+            key = (row['program_id'], row['quota_id'])
+            if key not in self.programs:
+                raise KeyError(f'Program {key} is not registered in the vacancies DataFrame.')
+            program = self.programs[key]
+            changes = []
+            for column, capacity in row.items():
+                if column == 'regular_vacancies':
+                    changes.append((program, 0, capacity))
+                elif column in self.special_assignment_cols:
+                    changes.append((program, int(column.split('_')[1]), capacity))
+                elif '_vacancies' in column:
+                    raise KeyError(f'Unexpected column "{column}" in vacancies DataFrame.')
+            original_capacity = sum(program.get_assignment_type_queue(
+                assignment_type).original_capacity
+                for assignment_type in self.assignment_types)
+            new_capacity = original_capacity + sum(capacity -
+                program.get_assignment_type_queue(assignment_type).original_capacity
+                for _, assignment_type, capacity in changes)
+            if (original_capacity == 0) and (new_capacity > 0):
+                raise ValueError(f'Program {key} had no vacancies, so its applications were filtered out. Create a new PolicyMaker to add vacancies to it.')
+            if (original_capacity > 0) and (new_capacity == 0):
+                closed_programs.append(program)
+            capacity_changes += changes
+        return capacity_changes, closed_programs
+
+    def _close_program(
+            self,
+            program: Program) -> None:
+        '''
+        Filter out the applications to a program left without vacancies, as
+        _filter_relevant_applications does: they are removed from the original
+        postulation of the applicants and only kept in the program waitlist.
+        Applications to secured enrollment programs are kept.
+
+        Args:
+            program (Program)
+        '''
+        key = (program.program_id, program.quota_id)
+        secured_enrollment = self._secured_enrollment_activation or \
+            self._forced_secured_enrollment_activation
+        # Only the applicants that apply to the program are created
+        applicant_ids = list(self.applicants)
+        applicants = self.applicants.get_many(applicant_id
+            for applicant_id, vpostulation in zip(applicant_ids,
+                self.applicants.get_original_vpostulations(applicant_ids))
+            if (vpostulation == program.program_id).any())
+        # Priorities before the matching, as in the applications DataFrame
+        applicants = [applicant for applicant in applicants
+            if (key in applicant.get_original_vpriorities()) and
+            not (secured_enrollment and
+            applicant.se_program_id == program.program_id)]
+        program.seed_waitlist([applicant.id for applicant in applicants],
+            [applicant.get_original_vpriorities()[key]
+            for applicant in applicants])
+        for applicant in applicants:
+            applicant.remove_original_postulation(*key)
+        self._mark_modified(applicants)
+
+    def _init_new_applicants(
+            self,
+            applicants: pd.DataFrame,
+            applications: pd.DataFrame,
+            siblings: pd.DataFrame,
+            links: pd.DataFrame,
+            **kwargs) -> Tuple[pd.DataFrame, ApplicantMap]:
+        '''
+        Init applicant objects for applicants added by rematch, filtering their
+        applications with the current capacities.
+
+        Args:
+            applicants(pd.DataFrame): Applicants df
+            applications(pd.DataFrame): Applications df
+            siblings(pd.DataFrame): Siblings df
+            links(pd.DataFrame): Links df
+
+        Returns:
+            Tuple[pd.DataFrame, ApplicantMap]: applicants df ready to used in
+            matching and their applicants, as in _init_applicants
+        '''
+        applicants = applicants.copy()
+        if len(set(applicants['applicant_id'])) != len(applicants):
+            raise ValueError('applicant_id in the applicants database must be unique.')
+        if len(set(applications.applicant_id) -
+                set(applicants.applicant_id)) != 0:
+            raise ValueError('There are applications, with applicant_id not registered in applicants DataFrame.')
+        if (self._secured_enrollment_activation or
+                self._forced_secured_enrollment_activation) and \
+                ('secured_enrollment_program_id' in applicants.columns):
+            applicants['secured_enrollment_program_id'] = \
+                applicants['secured_enrollment_program_id'].fillna(0)
+            applicants['secured_enrollment_quota_id'] = \
+                applicants['secured_enrollment_quota_id'].fillna(0)
+
+        vacancies = pd.DataFrame([{'program_id':program.program_id,
+            'quota_id':program.quota_id,
+            'regular_vacancies':program.regular_assignment.original_capacity,
+            **{column:program.get_assignment_type_queue(
+                int(column.split('_')[1])).original_capacity
+                for column in self.special_assignment_cols}}
+            for program in self.programs.values()])
+        applicants = self._add_sibling_and_linked_data(applicants=applicants,
+                                                        siblings=siblings,
+                                                        links=links)
+        applications = self._check_lottery(applications = applications,
+                                            applicants = applicants,
+                                            siblings = siblings,
+                                            **kwargs)
+        applications = self._filter_relevant_applications(vacancies = vacancies,
+                                            applications = applications,
+                                            applicants = applicants)
+        applicants, store = self._add_postulation_data(applicants=applicants,
+                                                    applications=applications)
+        return self._init_applicants(applicants=applicants, store=store)
+
+    def _update_applicants(
+            self,
+            new_applicants: pd.DataFrame,
+            removed_ids: List,
+            new_applicant_map: ApplicantMap = None) -> None:
+        '''
+        Remove applicants from applicants_df and self.applicants, and add or
+        replace new_applicants. Replaced applicants keep their place and new
+        ones are appended.
+
+        Args:
+            new_applicants (pd.DataFrame): applicants df
+            removed_ids (List): applicant_ids to remove
+            new_applicant_map (ApplicantMap): applicants of new_applicants
+        '''
+        applicants_df = self.applicants_df.loc[
+            ~self.applicants_df['applicant_id'].isin(removed_ids)]
+        for applicant_id in removed_ids:
+            del self.applicants[applicant_id]
+        if new_applicants is not None:
+            positions = pd.Index(applicants_df['applicant_id']).get_indexer(
+                new_applicants['applicant_id'])
+            new_positions = np.where(positions >= 0, positions,
+                len(applicants_df) + np.arange(len(new_applicants)))
+            applicants_df = pd.concat([
+                applicants_df.assign(_position=np.arange(len(applicants_df)))
+                    .loc[~applicants_df['applicant_id'].isin(
+                        new_applicants['applicant_id'])],
+                new_applicants.assign(_position=new_positions)])
+            applicants_df = applicants_df.sort_values('_position',
+                kind='stable').drop(columns=['_position'])
+            self.applicants.update(new_applicant_map)
+        self.applicants_df = applicants_df.reset_index(drop=True)
+        self._build_partition_index()
+
+        self.ordered_grades = self._get_ordered_grades()
+        self.first_round = self.ordered_grades[0]
+        self.last_round = self.ordered_grades[-1]
+
+    def _get_released_applicants(self, queues) -> List[Applicant]:
+        '''
+        Get the applicants that proposed to any of the queues, that are the
+        ones assigned or in the waitlist with the queue assignment type. The
+        queues they are assigned to are released too, so their proposers are
+        added until no new queue is found.
+
+        Args:
+            queues (Iterable[Tuple[Program, int]]): (program, assignment_type)
+
+        Returns:
+            List[Applicant]: applicants to match again
+        '''
+        pending = list(queues)
+        seen = {(program.program_id, program.quota_id, assignment_type)
+            for program, assignment_type in pending}
+        released = {}
+        while pending:
+            program, assignment_type = pending.pop()
+            queue = program.get_assignment_type_queue(assignment_type)
+            candidates = list(queue.vassigned_applicants) + \
+                [self.applicants[applicant_id]
+                for applicant_id in program.waitlist_dict
+                if applicant_id in self.applicants]
+            for applicant in candidates:
+                if (applicant.special_assignment != assignment_type) or \
+                        (applicant.id in released):
+                    continue
+                released[applicant.id] = applicant
+                assigned_program = applicant.assigned_vacancy
+                if assigned_program is None:
+                    continue
+                key = (assigned_program.program_id, assigned_program.quota_id,
+                    assignment_type)
+                if key not in seen:
+                    seen.add(key)
+                    pending.append((assigned_program, assignment_type))
+        return list(released.values())
+
+
+
+    def get_market_components(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Find the connected components of the market. Applicants are linked to
+        every program_id they apply to and to their secured enrollment
+        program, and to their siblings and linked applicants when those rules
+        are active. Applicants and programs in different components never
+        interact, so they can be matched separately.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Component label of each row of
+            applicants_df and of each program in self.programs.
+        '''
+        applicant_ids = pd.Index(self.applicants_df['applicant_id'])
+        n_applicants = len(applicant_ids)
+        program_keys_ids = np.empty(len(self.programs), dtype=object)
+        program_keys_ids[:] = [key[0] for key in self.programs.keys()]
+        program_ids = pd.Index(pd.unique(program_keys_ids))
+
+        def explode(values):
+            lengths = np.array([len(v) if isinstance(v, (list, np.ndarray))
+                else 0 for v in values], dtype=np.int64)
+            sources = np.repeat(np.arange(n_applicants), lengths)
+            if lengths.sum() == 0:
+                return sources, np.zeros(0, dtype=object)
+            targets = np.concatenate([np.asarray(v, dtype=object)
+                for v, length in zip(values, lengths) if length > 0])
+            return sources, targets
+
+        sources = []
+        targets = []
+        applicants, postulation = explode(
+            self.applicants.get_original_vpostulations(
+                self.applicants_df['applicant_id']))
+        sources.append(applicants)
+        targets.append(n_applicants + program_ids.get_indexer(postulation))
+        if (self._secured_enrollment_activation or
+                self._forced_secured_enrollment_activation) and \
+                ('se_program_id' in self.applicants_df.columns):
+            se_program_ids = self.applicants_df['se_program_id'].to_numpy()
+            positions = program_ids.get_indexer(se_program_ids)
+            has_se = ~pd.Series(se_program_ids).isin([0, '']).to_numpy()
+            sources.append(np.arange(n_applicants))
+            targets.append(np.where((positions >= 0) & has_se,
+                n_applicants + positions, -1))
+        for rule, column in [(self._sibling_priority_activation, 'siblings'),
+                (self._linked_postulation_activation, 'links')]:
+            if rule and (column in self.applicants_df.columns):
+                applicants, related = explode(
+                    self.applicants_df[column].tolist())
+                sources.append(applicants)
+                targets.append(applicant_ids.get_indexer(related))
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+        valid = targets >= 0
+        labels = self._connected_components(
+            n_applicants + len(program_ids), sources[valid], targets[valid])
+
+        program_labels = labels[n_applicants +
+                                program_ids.get_indexer(program_keys_ids)]
+        return labels[:n_applicants], program_labels
+
+    @staticmethod
+    def _connected_components(
+            n_nodes: int,
+            sources: np.ndarray,
+            targets: np.ndarray) -> np.ndarray:
+        '''
+        Label each node with the smallest node of its connected component,
+        propagating minimum labels through the edges and jumping pointers.
+
+        Args:
+            n_nodes (int): Number of nodes
+            sources (np.ndarray): First node of each edge
+            targets (np.ndarray): Second node of each edge
+
+        Returns:
+            np.ndarray: Component label of each node
+        '''
+        labels = np.arange(n_nodes)
+        while True:
+            edge_labels = np.minimum(labels[sources], labels[targets])
+            new_labels = labels.copy()
+            np.minimum.at(new_labels, sources, edge_labels)
+            np.minimum.at(new_labels, targets, edge_labels)
+            while True:
+                jumped_labels = new_labels[new_labels]
+                if (jumped_labels == new_labels).all():
+                    break
+                new_labels = jumped_labels
+            if (new_labels == labels).all():
+                return labels
+            labels = new_labels
+
+    def _match_components_in_parallel(self) -> Optional[pd.DataFrame]:
+        '''
+        Split the market in its connected components, group them in balanced
+        sub-markets and match each sub-market in a process pool. Workers
+        receive slices of the postulation store and programs with their own
+        empty waitlist store, and return the matching as arrays, which are
+        written in self without creating the applicants, so get_results
+        returns the same frame as a serial run.
+
+        Returns:
+            Optional[pd.DataFrame]: None if the market is a single
+            component, which is faster to match in this process. Otherwise
+            the round summary as in match_applicants_and_programs, adding up
+            the sub-markets. longest_chain is the longest one of
+            any sub-market and wall_time adds the time of every process.
+            Observers only receive on_round_end, once the pool is done.
+        '''
+        applicant_labels, program_labels = self.get_market_components()
+        labels, sizes = np.unique(np.concatenate(
+            [applicant_labels, program_labels]), return_counts=True)
+        n_sub_markets = min(len(labels), 4*self._n_jobs)
+        if n_sub_markets < 2:
+            return None
+
+        # Largest components first, each one to the lightest sub-market
+        loads = [(0, i) for i in range(n_sub_markets)]
+        sub_market_of_label = np.zeros(len(labels), dtype=np.int64)
+        for position in np.argsort(-sizes, kind='stable').tolist():
+            load, i = heapq.heappop(loads)
+            sub_market_of_label[position] = i
+            heapq.heappush(loads, (load + int(sizes[position]), i))
+        applicant_sub_markets = sub_market_of_label[
+            np.searchsorted(labels, applicant_labels)]
+        program_sub_markets = sub_market_of_label[
+            np.searchsorted(labels, program_labels)]
+
+        program_items = list(self.programs.items())
+        sub_markets = []
+        sub_market_programs = []
+        for i in range(n_sub_markets):
+            programs = {key: program for (key, program), j
+                in zip(program_items, program_sub_markets) if j == i}
+            sub_markets.append(self._get_sub_market(
+                self.applicants_df.loc[applicant_sub_markets == i], programs))
+            sub_market_programs.append(list(programs.values()))
+
+        summaries = []
+        with ProcessPoolExecutor(max_workers=self._n_jobs) as pool:
+            for programs, (arrays, summary) in zip(sub_market_programs,
+                    pool.map(_match_sub_market, sub_markets)):
+                summaries.append(summary)
+                self._set_matching_arrays(programs, arrays)
+
+        summary = pd.concat(summaries).groupby(['grade', 'assignment_type'],
+            sort=False).agg(n_applicants=('n_applicants', 'sum'),
+                            proposals=('proposals', 'sum'),
+                            rejections=('rejections', 'sum'),
+                            evictions=('evictions', 'sum'),
+                            longest_chain=('longest_chain', 'max'),
+                            wall_time=('wall_time', 'sum')).reset_index()
+        for row in summary.to_dict('records'):
+            for observer in self.algorithm.observers:
+                observer.on_round_end(row)
+        return summary
+
+    def _get_sub_market(
+            self,
+            applicants_df: pd.DataFrame,
+            programs: Dict[Tuple[Any, int], Program]) -> 'PolicyMaker':
+        '''
+        PolicyMaker restricted to the applicants of applicants_df and to
+        programs, to be matched in a worker. Its applicants are registered
+        from slices of the store, and its programs are copies writing in
+        their own empty waitlist store, in the order of programs.
+
+        Args:
+            applicants_df (pd.DataFrame): Applicants of the sub-market
+            programs (Dict[Tuple[Any, int], Program]): Programs of the
+                sub-market
+
+        Returns:
+            PolicyMaker
+        '''
+        sub_market = copy.copy(self)
+        sub_market._n_jobs = 1
+        # Observers are notified here, not in the workers
+        sub_market.algorithm = copy.copy(self.algorithm)
+        sub_market.algorithm.observers = []
+        sub_market.profiler = PhaseProfiler(enabled=False)
+        sub_market.applicants_df = applicants_df
+        sub_market.applicants = self.applicants.take(
+            applicants_df['applicant_id'].tolist())
+        sub_market.waitlists = WaitlistStore(enabled=self.waitlists.enabled)
+        sub_market.programs = {}
+        for key, program in programs.items():
+            # The copy does not take the waitlist store of self
+            program = copy.deepcopy(program,
+                memo={id(self.waitlists):sub_market.waitlists})
+            program.set_waitlist_store(sub_market.waitlists)
+            sub_market.programs[key] = program
+        sub_market._build_partition_index()
+        return sub_market
+
+    def _get_matching_arrays(self) -> Dict[str, Any]:
+        '''
+        Matching of a sub-market as arrays, without Applicant or Program
+        objects, so it is sent back to the parent process cheaply. Programs
+        are given by their position in self.programs.
+
+        Returns:
+            Dict[str, Any]: The matching state of the applicants, the
+            postulations changed by the rules, the members and capacities of
+            each queue and the waitlist events.
+        '''
+        applicant_ids = self.applicants_df['applicant_id'].tolist()
+        state = self._get_match_state(applicant_ids)
+        program_list = list(self.programs.values())
+        program_index = {id(program): i
+            for i, program in enumerate(program_list)}
+        changed_ids, postulations = \
+            self.applicants.get_changed_postulations(applicant_ids)
+
+        queue_programs = []
+        queue_types = []
+        queue_attributes = []
+        member_ids = []
+        member_scores = []
+        for i, program in enumerate(program_list):
+            for assignment_type in self.assignment_types:
+                try:
+                    queue = program.get_assignment_type_queue(assignment_type)
+                except AttributeError:
+                    continue
+                queue_programs.append(i)
+                queue_types.append(assignment_type)
+                queue_attributes.append((queue.capacity, queue.over_capacity,
+                    getattr(queue, 'transfer_capacity', False),
+                    getattr(queue, 'receive_capacity', False)))
+                member_ids.append(queue.get_assigned_ids())
+                member_scores.append(queue.vassigned_scores)
+
+        events, event_applicant_ids, priorities = self.waitlists.get_events()
+        return {'applicant_ids':applicant_ids,
+            'option_n':state['option_n'],
+            'match':state['match'],
+            'assigned_program':np.fromiter((program_index.get(id(program), -1)
+                for program in state['assigned_vacancy']), dtype=np.int64,
+                count=len(applicant_ids)),
+            'assigned_score':state['assigned_score'],
+            'priority_profile':state['priority_profile'],
+            'changed_ids':changed_ids,
+            'postulations':postulations,
+            'program_attributes':np.array([(program.tranfer_capacity,
+                program.receive_capacity, program.over_capacity)
+                for program in program_list], dtype=bool).reshape(-1, 3),
+            'queue_programs':np.array(queue_programs, dtype=np.int64),
+            'queue_types':queue_types,
+            'queue_attributes':np.array(queue_attributes,
+                dtype=np.int64).reshape(-1, 4),
+            'member_offsets':np.concatenate([[0], np.cumsum(
+                [len(ids) for ids in member_ids], dtype=np.int64)]),
+            'member_ids':[applicant_id for ids in member_ids
+                for applicant_id in ids],
+            'member_scores':np.array([score for scores in member_scores
+                for score in scores], dtype=np.float64),
+            'event_programs':events,
+            'event_applicant_ids':event_applicant_ids,
+            'event_priorities':priorities}
+
+    def _set_matching_arrays(
+            self,
+            programs: List[Program],
+            arrays: Dict[str, Any]) -> None:
+        '''
+        Write the matching of a sub-market, given by _get_matching_arrays,
+        in the applicants, programs and waitlist store of self.
+
+        Args:
+            programs (List[Program]): Programs of the sub-market in self, in
+                the order of the sub-market
+            arrays (Dict[str, Any]): Output of _get_matching_arrays
+        '''
+        applicant_ids = arrays['applicant_ids']
+        program_array = np.empty(len(programs) + 1, dtype=object)
+        program_array[:len(programs)] = programs
+        self.applicants.set_match_state(applicant_ids,
+            self.applicants.get_positions(applicant_ids),
+            arrays['option_n'], arrays['match'],
+            program_array[arrays['assigned_program']],
+            arrays['assigned_score'], arrays['priority_profile'])
+        if len(arrays['changed_ids']) > 0:
+            self.applicants.set_postulations(arrays['changed_ids'],
+                                            arrays['postulations'])
+
+        for program, (transfer, receive, over_capacity) in zip(programs,
+                arrays['program_attributes'].tolist()):
+            program.tranfer_capacity = transfer
+            program.receive_capacity = receive
+            program.over_capacity = over_capacity
+        offsets = arrays['member_offsets'].tolist()
+        member_ids = arrays['member_ids']
+        member_scores = arrays['member_scores'].tolist()
+        for q, (i, assignment_type, attributes) in enumerate(zip(
+                arrays['queue_programs'].tolist(), arrays['queue_types'],
+                arrays['queue_attributes'].tolist())):
+            queue = programs[i].get_assignment_type_queue(assignment_type)
+            capacity, over_capacity, transfer, receive = attributes
+            queue.modify_capacity(capacity - queue.capacity)
+            queue.modify_over_capacity(over_capacity - queue.over_capacity)
+            if transfer:
+                queue.transfer_capacity = True
+            if receive:
+                queue.receive_capacity = True
+            queue.set_assigned_ids(self.applicants,
+                member_ids[offsets[q]:offsets[q + 1]],
+                member_scores[offsets[q]:offsets[q + 1]])
+
+        waitlist_indexes = np.array([program._waitlist_index
+            for program in programs], dtype=np.int64)
+        self.waitlists.add_events(
+            waitlist_indexes[arrays['event_programs']],
+            arrays['event_applicant_ids'], arrays['event_priorities'])
 
     def get_results(self) -> pd.DataFrame:
         '''
@@ -148,29 +1070,95 @@ class PolicyMaker:
             "priority_profile". If a students is not assigned, the last 5 fields
             are NaN.
         '''
-        def yield_applicants():
-            for applicant in self.applicants.values():
-                dict={'applicant_id':applicant.id}
-                dict['grade_id'] = applicant.grade
-                prog = applicant.assigned_vacancy
-                if prog is None:
-                    dict['program_id'] = None
-                    dict['institution_id'] = None
-                    dict['quota_id'] = None
-                    dict['assigned_score'] = None
-                    dict['priority_profile'] = None
-                else:
-                    dict['program_id'] = prog.program_id
-                    dict['institution_id'] = prog.institution_id
-                    dict['quota_id'] = prog.quota_id
-                    dict['assigned_score'] = \
-                                prog.get_applicant_score_in_program(applicant)
-                    dict['priority_profile'] = \
-                                applicant.vpriority_profile[prog.program_id]
-                yield dict
-        results = pd.DataFrame(yield_applicants())
+        with self.profiler.phase('get_results'):
+            # The state arrays hold the result of every applicant, so no
+            # Applicant object is created
+            applicant_ids = list(self.applicants)
+            state = self.applicants.get_match_state(
+                self.applicants.get_positions(applicant_ids))
+            grades = self.applicants_df['grade_id'].to_numpy()[
+                pd.Index(self.applicants_df['applicant_id']).get_indexer(
+                    applicant_ids)]
+            program_codes, programs = pd.factorize(state['assigned_vacancy'])
+            unassigned = program_codes < 0
+
+            def program_column(attribute):
+                # Unassigned applicants take the None at the end
+                values = np.fromiter((getattr(program, attribute)
+                    for program in programs), dtype=object,
+                    count=len(programs))
+                return np.append(values, None)[program_codes].tolist()
+
+            assigned_scores = state['assigned_score'].astype(object)
+            assigned_scores[unassigned] = None
+            results = pd.DataFrame({'applicant_id':applicant_ids,
+                'grade_id':grades.tolist(),
+                'program_id':program_column('program_id'),
+                'institution_id':program_column('institution_id'),
+                'quota_id':program_column('quota_id'),
+                'assigned_score':assigned_scores.tolist(),
+                'priority_profile':state['priority_profile'].tolist()})
         return results
 
+    def get_profile(self) -> pd.DataFrame:
+        '''
+        Return a DataFrame with the phases recorded when profile is True:
+        preprocessing stages, programs preparation and matching round of each
+        grade and assignment type, and get_results.
+
+        Returns:
+            pd.DataFrame: Profile df with the fields "phase", "grade",
+            "assignment_type", "wall_time" and "cpu_time" in seconds and
+            "peak_memory", the peak of memory traced by tracemalloc in bytes.
+            Use self.profiler.to_json() to get it as JSON.
+        '''
+        return self.profiler.get_report()
+
+    def get_waitlists(self) -> pd.DataFrame:
+        '''
+        Return a DataFrame with the waitlist of every program, ranked.
+
+        Returns:
+            pd.DataFrame: Waitlists df with the fields "program_id",
+            "quota_id", "applicant_id", "priority" and "waitlist_rank",
+            sorted by program and rank. Ties keep the order in which
+            applicants entered the waitlist.
+        '''
+        waitlists = self.waitlists.get_waitlists()
+        program_keys = pd.DataFrame(self.waitlists.program_keys,
+                                    columns=['program_id','quota_id'])
+        program_keys = program_keys.iloc[waitlists['program']]
+        waitlists.insert(0, 'program_id', program_keys['program_id'].to_numpy())
+        waitlists.insert(1, 'quota_id', program_keys['quota_id'].to_numpy())
+        return waitlists.drop(columns=['program'])
+
+    def get_cutoffs(self) -> pd.DataFrame:
+        '''
+        Return a DataFrame with the cut-off of each program, quota and
+        assignment type. The cut-off is the score of the last admitted
+        applicant, which each queue keeps updated during the matching.
+
+        Returns:
+            pd.DataFrame: Cutoffs df with the fields "program_id", "quota_id",
+            "assignment_type", "capacity", "n_assigned", "filled" and
+            "cutoff_score". capacity includes transferred vacancies, and
+            cutoff_score is NaN if nobody was assigned.
+        '''
+        def yield_queues():
+            for (program_id, quota_id), program in self.programs.items():
+                for assignment_type in self.assignment_types:
+                    queue = program.get_assignment_type_queue(assignment_type)
+                    dict={'program_id':program_id}
+                    dict['quota_id'] = quota_id
+                    dict['assignment_type'] = assignment_type
+                    dict['capacity'] = queue.capacity
+                    dict['n_assigned'] = queue.n_assigned
+                    dict['filled'] = queue.check_capacity_contraints()
+                    dict['cutoff_score'] = queue.last_admitted_score
+                    yield dict
+        cutoffs = pd.DataFrame(yield_queues())
+        return cutoffs
+
     def check_inputs(self,
             vacancies,
             applicants,
@@ -181,115 +1169,62 @@ class PolicyMaker:
             links) -> None:
         '''
         If _check_inputs==True, checks if inputs match certain constrains
-        specified in "Inputs_description.md" document.
+        specified in "Inputs_description.md" document. Every problem is
+        reported at once in an InputValidationError, whose errors attribute
+        is a table with one row per problem. If validation_cache was given,
+        inputs already validated in an earlier run are not checked again.
         '''
+        secured_enrollment_activation = self._secured_enrollment_activation \
+            or self._forced_secured_enrollment_activation
         if self._check_inputs:
-
-            for requested_column in ['program_id', 'quota_id',
-                    'institution_id', 'grade_id', 'regular_vacancies']:
-                if not (requested_column in vacancies.columns):
-                    raise KeyError(f'Expected column "{requested_column}" in vacancies DataFrame.')
-
-            for requested_column in ['applicant_id','grade_id']:
-                if not (requested_column in applicants.columns):
-                    raise KeyError(f'Expected column "{requested_column}" in applicants DataFrame.')
-            if len(set(applicants['applicant_id']))!= len(applicants):
-                raise ValueError('applicant_id in the applicants database must be unique.')
-            if self._secured_enrollment_activation or \
-                    self._forced_secured_enrollment_activation:
-                if not ('secured_enrollment_program_id' in applicants.columns):
-                    raise ValueError('Expected secured_enrollment program_id in applicants DataFrame when secured_enrollment_activation is on. \nTurn it off or add "secured_enrollment_program_id" to applicants DataFrame.')
-                if not ('secured_enrollment_quota_id' in applicants.columns):
-                    raise ValueError('Expected secured_enrollment quota_id in applicants DataFrame when secured_enrollment_activation is on. \nTurn it off or add "secured_enrollment_quota_id" to applicants DataFrame.')
+            validator = InputValidator(
+                sibling_priority_activation=self._sibling_priority_activation,
+                linked_postulation_activation=self._linked_postulation_activation,
+                secured_enrollment_activation=secured_enrollment_activation,
+                cache_dir=self._validation_cache)
+            errors = validator.validate_cached(vacancies=vacancies,
+                                                applicants=applicants,
+                                                applications=applications,
+                                                priority_profiles=priority_profiles,
+                                                quota_order=quota_order,
+                                                siblings=siblings,
+                                                links=links)
+            if len(errors) > 0:
+                raise InputValidationError(errors)
+
+            if secured_enrollment_activation:
                 #Prevent misleading nan values in secured_enrollment
                 applicants['secured_enrollment_program_id'] = \
                     applicants['secured_enrollment_program_id'].fillna(0)
                 applicants['secured_enrollment_quota_id'] = \
                     applicants['secured_enrollment_quota_id'].fillna(0)
 
-            for requested_column in ['applicant_id', 'program_id','quota_id',
-                'institution_id','ranking_program','priority_profile_program',
-                'priority_number_quota']:
-                if not (requested_column in applications.columns):
-                    raise KeyError(f'Expected column "{requested_column}" in applications DataFrame.')
-
-            if len(set(applications.applicant_id) -
-                set(applicants.applicant_id))!=0:
-                raise ValueError('There are applications, with applicant_id not registered in applicants DataFrame.')
-
-            if len(set(applicants.applicant_id) -
-                set(applications.applicant_id))!=0:
-                warnings.warn('There are applicants, without applications.')
-
-            if len(set(applications.program_id) -
-                set(vacancies.program_id))!=0:
-                raise ValueError('There are applications to programs that do not appear on the vacancies DataFrame.')
-
-            if self._linked_postulation_activation:
-                if not isinstance(links,pd.DataFrame):
-                    raise ValueError('Expected links dataframe when linked_postulation_activation is on. Turn it off or provide a links DataFrame.')
-                if not (('applicant_id' in links.columns) and
-                    ('linked_id' in links.columns) and (len(links.columns)==2)):
-                    raise ValueError('Unexpected column in links DataFrame. Expected "applicant_id" and "linked_id".')
-                if (len(set(links.applicant_id)-set(applicants.applicant_id)) +
-                    len(set(links.linked_id) - set(applicants.applicant_id)))!=0:
-                    raise ValueError('There are applicant_ids in links DataFrame that are not registred in the applicants DataFrame.')
-
-            for requested_column in ['priority_profile']:
-                if not (requested_column in priority_profiles.columns):
-                    raise KeyError(f'Expected column "{requested_column}" in priority_profiles DataFrame.')
-
-            if self._sibling_priority_activation:
-                if not isinstance(siblings,pd.DataFrame):
-                    raise ValueError('Expected siblings DataFrame when sibling_priority_activation is on. Turn it off or provide a siblings DataFrame.')
-                if not (('applicant_id' in siblings.columns) and
-                    ('sibling_id' in siblings.columns) and
-                    (len(siblings.columns)==2)):
-                    raise ValueError('Unexpected column in siblings DataFrame. Expected "applicant_id" and "sibling_id".')
-                if (len(set(siblings.applicant_id)-set(applicants.applicant_id)) +
-                    len(set(siblings.sibling_id) - set(applicants.applicant_id)))!=0:
-                    raise ValueError('There are applicant_ids in siblings DataFrame \
-                    that are not registred in the applicants DataFrame.')
-                if not ('priority_profile_sibling_transition' in
-                    priority_profiles.columns):
-                    raise KeyError(f'Expected column "priority_profile_sibling_transition" in priority_profiles DataFrame when sibling_priority_activation is on. Turn it off or add "priority_profile_sibling_transition" to priority_profiles DataFrame.')
-
-            for requested_column in ['priority_profile']:
-                if not (requested_column in quota_order.columns):
-                    raise KeyError(f'Expected column "{requested_column}" in quota_order DataFrame.')
-            if self._secured_enrollment_activation or \
-                    self._forced_secured_enrollment_activation:
-                for requested_column in ['secured_enrollment_indicator',
-                    'secured_enrollment_quota_id_criteria',
-                    'secured_enrollment_quota_id_value']:
-                    if not (requested_column in quota_order.columns):
-                        raise KeyError(f'Expected column "{requested_column}" in quota_order DataFrame when secured_enrollment_activation is on. Turn it off or add "{requested_column}" to priority_profiles DataFrame.')
-                if not quota_order['secured_enrollment_quota_id_criteria'].isin(
-                    ['<', '<=', '>', '>=', '=', '!=', '==', 'le', 'leq',
-                    'ge', 'geq', 'eq', 'neq']).all():
-                    raise ValueError('Unexpected value in "secured_enrollment_quota_id_criteria" column of the quota_order dataframe. Use strings such as "<", "<=", ">", ">=", "=", "!=", "==", "le", "leq", "ge", "geq", "eq" or "neq".')
-
-
     def _init_applicants(
             self,
-            applicants: pd.DataFrame) -> pd.DataFrame:
+            applicants: pd.DataFrame,
+            store: ApplicantStore) -> Tuple[pd.DataFrame, ApplicantMap]:
         '''
-        Init all applicants objects in a df
+        Prepare the applicants df and their applicants. Applicant objects are
+        not created here but when they are first read, usually when their
+        round is prepared.
 
         Args:
             applicants (pd.DataFrame): raw applicants dataframe
+            store (ApplicantStore): Postulations of applicants, in order
 
         Returns:
-            pd.DataFrame: applicants df ready to used in matching
+            Tuple[pd.DataFrame, ApplicantMap]: applicants df ready to used in
+            matching, and {applicant_id: Applicant}
         '''
         self.applicant_characteristics = [col for col in applicants.columns \
             if 'applicant_characteristic' in col]
 
-        applicant_objects = [self._init_applicant_object(**row) for
-                            row in applicants.to_dict(orient="records")]
-        applicants['applicant_object'] = applicant_objects
+        # The postulation is kept in the store, and applicants hold views
+        applicant_map = ApplicantMap()
+        applicant_map.add_store(store, applicants,
+                                self.applicant_characteristics)
 
-        return applicants
+        return applicants, applicant_map
 
     def _init_programs_to_dict(
             self,
@@ -317,21 +1252,55 @@ class PolicyMaker:
 
     def _get_applicants_dict(
             self,
-            query: str = '') -> Dict[int, Applicant]:
+            applicants_df: pd.DataFrame) -> Dict[int, Applicant]:
         '''
-        Returns the applicants as dict indexed by their applicant id according
-        to a query.
+        Returns the applicants of applicants_df as dict indexed by their
+        applicant id, creating the ones not created yet.
+
+        Args:
+            applicants_df (pd.DataFrame): Subset of applicants_df
 
         Returns:
             Dict[int, Applicant]: {Applicant_id: Applicant_object}
         '''
+        applicant_ids = applicants_df['applicant_id'].tolist()
+        return dict(zip(applicant_ids, self.applicants.get_many(applicant_ids)))
+
+    def _get_applicant_objects(
+            self,
+            applicants_df: pd.DataFrame) -> np.ndarray:
+        '''
+        Applicant of each row of applicants_df, creating the ones not created
+        yet.
 
-        applicants_df = self.applicants_df
-        if len(query) > 0:
-            applicants_df = applicants_df.query(query)
-        return (applicants_df[['applicant_id', 'applicant_object']]
-                .set_index('applicant_id')
-                .to_dict(orient='dict'))['applicant_object']
+        Args:
+            applicants_df (pd.DataFrame): Subset of applicants_df
+
+        Returns:
+            np.ndarray: Object array aligned with applicants_df
+        '''
+        # fromiter does not probe the applicants for the array protocol
+        return np.fromiter(self.applicants.get_many(
+            applicants_df['applicant_id'].tolist()), dtype=object,
+            count=len(applicants_df))
+
+    def _build_partition_index(self) -> None:
+        '''
+        Index the positions in applicants_df of the applicants of each
+        (grade, assignment_type) round and the keys of the programs of each
+        grade, so a round is selected without scanning the whole market.
+        Must be called again when applicants_df or programs change.
+        '''
+        if 'special_assignment' in self.applicants_df.columns:
+            self._round_positions = self.applicants_df.groupby(
+                ['grade_id', 'special_assignment'], sort=False).indices
+        else:
+            self._round_positions = self.applicants_df.groupby('grade_id',
+                sort=False).indices
+        self._grade_program_keys = {}
+        for key, program in self.programs.items():
+            self._grade_program_keys.setdefault(
+                program.grade_id, []).append(key)
 
     def _set_rules(
             self,
@@ -353,6 +1322,8 @@ class PolicyMaker:
             kwargs['forced_secured_enrollment_assignment']
         self._check_inputs = \
             kwargs['check_inputs']
+        self._validation_cache = \
+            kwargs['validation_cache']
 
     def _get_ordered_grades(self) -> List:
         '''
@@ -390,59 +1361,71 @@ class PolicyMaker:
         Args:
             grade (int)
         '''
-        return {k:prog for k,prog in self.programs.items() if prog.grade_id==grade}
+        return {key: self.programs[key]
+                for key in self._grade_program_keys.get(grade, [])}
+
+    def _get_round_applicants_df(
+            self,
+            grade: int,
+            assignment_type: int) -> pd.DataFrame:
+        '''
+        Rows of applicants_df of the applicants of a round, in the same
+        order. If there is no special assignment, all the applicants of the
+        grade.
+
+        Args:
+            grade (int)
+            assignment_type (int)
+        '''
+        key = (grade, assignment_type) \
+            if 'special_assignment' in self.applicants_df.columns else grade
+        positions = self._round_positions.get(key)
+        if positions is None:
+            return self.applicants_df.iloc[:0]
+        return self.applicants_df.iloc[positions]
 
     def _prep_applicants_for_matching(
             self,
             grade: int,
-            assignment_type: int) -> Dict[int, Applicant]:
+            assignment_type: int) -> List:
         '''
         Considering what happen in last rounds, prepare the subset of
-        applicants to be matched.
+        applicants to be matched. The rules change the postulations kept in
+        self.applicants, so the applicants are not created.
 
         Args:
             grade (int)
             assignment_type (int)
+
+        Returns:
+            List: applicant_ids of the round
         '''
         # Select all applicants in such grade and assignment type
-        if 'special_assignment' in self.applicants_df.columns:
-            q1 = (f'((grade_id == {grade}) &'
-                  f' (special_assignment == {assignment_type}))')
-        else:
-            q1 = (f'(grade_id == {grade})')
-        stus_to_be_assigned_df = self.applicants_df.query(q1)
+        stus_to_be_assigned_df = self._get_round_applicants_df(grade,
+                                                            assignment_type)
         if grade != self.first_round:
             # Apply Dynamic sibling priority
             if (self._sibling_priority_activation):
-                stus_to_be_assigned_df.loc[:, 'applicant_object'].apply(
-                  self._apply_sib_priority)
+                self._apply_sib_priority(stus_to_be_assigned_df)
             # Apply Linked postulation reorder
             if (self._linked_postulation_activation):
-                stus_to_be_assigned_df.loc[:, 'applicant_object'].apply(
-                    self._apply_linked_reorder)
+                self._apply_linked_reorder(stus_to_be_assigned_df)
         # Get the right quota postulation order
-        stus_to_be_assigned_df.loc[:, 'applicant_object'].apply(
-            self._check_quota_postulation_order)
+        self._check_quota_postulation_order(stus_to_be_assigned_df)
         # Apply Secured Enrollment adjustments
         if (self._secured_enrollment_activation):
-            stus_to_be_assigned_se_df = stus_to_be_assigned_df[
-                    stus_to_be_assigned_df.se_program_id!=0]
-            stus_to_be_assigned_se_df.loc[:, 'applicant_object'].apply(
-                lambda applicant: \
-                applicant.set_secured_place_as_last_postulation())
-        return self._get_applicants_dict(query=q1)
+            self._set_secured_places(stus_to_be_assigned_df)
+        return stus_to_be_assigned_df['applicant_id'].tolist()
 
     def _after_round_adjustments(
             self,
-            applicants_to_be_assigned: Dict[int, Applicant],
             grade: int,
             assignment_type: int) -> None:
         '''
         Considering what happen in the last round, transfer capacities
-        and force secured enrollment
+        and force secured enrollment. The round must be released.
 
         Args:
-            applicants_to_be_assigned (Dict[int, Applicant])
             grade (int)
             assignment_type (int)
         '''
@@ -452,163 +1435,482 @@ class PolicyMaker:
                                             assignment_type=assignment_type)
 
         if (self._forced_secured_enrollment_activation):
-            # For each student
-            for _,applicant in applicants_to_be_assigned.items():
-                # If it has SE
-                if applicant._has_SE():
-                    # Apply forced SE
-                    self._match_secured_enrollment_applicant(applicant)
+            self._match_secured_enrollment_applicants(
+                self._get_round_applicants_df(grade, assignment_type))
+
+    def _release_round(
+            self,
+            grade: int,
+            assignment_type: int) -> None:
+        '''
+        Write the matching state of the applicants of a matched round in the
+        state arrays of self.applicants, dropping the Applicant objects that
+        are not held by a program queue and can be created again from their
+        store. get_results and the rules of later rounds read those arrays.
+
+        Args:
+            grade (int)
+            assignment_type (int)
+        '''
+        self.applicants.release(self._get_round_applicants_df(grade,
+            assignment_type)['applicant_id'].tolist())
 
 
     def _apply_sib_priority(
             self,
-            applicant: Applicant) -> None:
+            applicants_df: pd.DataFrame) -> None:
         '''
-        Search all the siblings of a applicant. If they are matched in schools
-        that are inside the postulation of the applicant, change vpriorities.
+        Give sibling priority to the applicants of a round at once. The
+        sibling edges are joined with the current assignment of the siblings,
+        and the applications of unmatched applicants to the institutions of
+        those assignments get priority_profile_sibling_transition, once per
+        application, as in Applicant.reasign_priority_profile.
 
         Args:
-            applicant (Applicant)
+            applicants_df (pd.DataFrame): Applicants of the round, with the
+                "siblings" column
         '''
-        if ~applicant.match:
-            if len(applicant.vsiblings) > 0:
-                schools_with_sib = set()
-                for sibling_id in applicant.vsiblings:  # Check all the siblings
-                    # Get the sibling from applicants graph
-                    sibling = self.applicants[sibling_id]
-                    # Check if the sibling is alredy matched to some program.
-                    if (sibling.match) and (sibling.assigned_vacancy is not None):
-                        # Give me the school where the sibling was accepted and
-                        # append it to the array.
-                        schools_with_sib.add(
-                            sibling.assigned_vacancy.institution_id)
-
-                applicant_schools_ids = applicant.vinstitution_id
-                # Return the indexes of applicant_schools_ids where there is
-                # coincidence with schools_with_sib
-                indexes_to_change_sibling_priority = [i for i, id in
-                    enumerate(applicant_schools_ids) if id in schools_with_sib]
+        pairs = self._get_assigned_relatives(applicants_df, 'siblings')
+        # Only unmatched applicants with an assigned sibling may change
+        applicant_ids = applicants_df['applicant_id'].to_numpy()
+        positions = np.unique(pairs['applicant'].to_numpy())
+        positions = positions[~self._get_match_state(
+            applicant_ids[positions].tolist())['match']]
+        if len(positions) == 0:
+            return
+        applicant_ids = applicant_ids[positions]
+        postulations = self.applicants.get_postulations(applicant_ids.tolist())
+        pairs = pairs.loc[pairs['applicant'].isin(positions)]
+        changed = self._get_applications_to_institutions(
+            postulations, np.searchsorted(positions, pairs['applicant']),
+            pairs['institution_id'].to_numpy())
+        if not changed.any():
+            return
+        applications = postulations.get_owners()
+
+        # The n-th changed application to a program gets the profile of the
+        # last application to it transitioned n times, and every application
+        # to the program ends with the profile transitioned once per change.
+        # The postulation is not reordered yet, so key positions are the
+        # positions of the applications.
+        program_codes, program_ids = pd.factorize(
+            postulations.columns['vpostulation'].astype(object))
+        groups = applications*len(program_ids) + program_codes
+        key_columns = postulations.key_columns
+        profiles = key_columns['vpriority_profile']
+        last_positions = pd.Series(np.arange(len(groups))).groupby(
+            groups, sort=False).transform('last').to_numpy()
+        profile_codes = self._priority_profile_index.get_indexer(
+            profiles[last_positions])
+        changes = pd.Series(changed.astype(np.int64)).groupby(groups,
+                                                                sort=False)
+        n_changes = changes.transform('sum').to_numpy()
+        new_profile_codes = self._transition_profiles(profile_codes,
+                                                        n_changes)
+        changed_codes = self._transition_profiles(profile_codes[changed],
+            changes.cumsum().to_numpy()[changed])
+        quotas = postulations.columns['vquota_id'][changed]
+        quota_codes, quota_ids = pd.factorize(quotas.astype(object))
+        quota_columns = np.array([self._priority_quota_columns[
+            f'priority_q{quota_id}'] for quota_id in quota_ids],
+            dtype=np.int64)
+        priorities = self._priority_profile_priorities[changed_codes,
+                                                    quota_columns[quota_codes]]
+        new_profiles = profiles.copy()
+        new_profiles[n_changes > 0] = self._priority_profile_index.to_numpy()[
+            new_profile_codes[n_changes > 0]]
+
+        # As Applicant.set_sibling_priority, for the applicants with a
+        # changed application
+        key_columns['vpriority_profile'] = new_profiles
+        key_columns['vpriorities'][changed] = priorities
+        key_columns['dynamic_priority'][changed] = True
+        postulations.columns['vscores'][changed] = \
+            key_columns['vpostulation_scores'][changed] + priorities
+        postulations.row_columns['has_dynamic_priority'][:] = True
+        rows = np.unique(applications[changed])
+        self.applicants.set_postulations(applicant_ids[rows].tolist(),
+                                        postulations.take(rows))
+
+    def _transition_profiles(
+            self,
+            profile_codes: np.ndarray,
+            n_transitions: np.ndarray) -> np.ndarray:
+        '''
+        Apply priority_profile_sibling_transition n_transitions times.
 
-                # We loop over all the indexes to change priority
-                for index in indexes_to_change_sibling_priority:
-                    applicant.reasign_priority_profile(index,
-                        self.priority_profile_transition)
+        Args:
+            profile_codes (np.ndarray): Positions of the priority profiles in
+                the priority_profiles DataFrame
+            n_transitions (np.ndarray): Transitions of each profile
 
+        Returns:
+            np.ndarray: Positions of the transitioned priority profiles
+        '''
+        profile_codes = profile_codes.copy()
+        for step in range(n_transitions.max(initial=0)):
+            move = n_transitions > step
+            if (profile_codes[move] < 0).any():
+                raise KeyError('There are priority profiles that are not registered in priority_profiles DataFrame.')
+            profile_codes[move] = \
+                self._sibling_transition[profile_codes[move]]
+        if (profile_codes[n_transitions > 0] < 0).any():
+            raise KeyError('There are priority profiles that are not registered in priority_profiles DataFrame.')
+        return profile_codes
 
     def _apply_linked_reorder(
             self,
-            applicant: Applicant) -> None:
+            applicants_df: pd.DataFrame) -> None:
         '''
-        Check if a applicant has linked applicants that were match to
-        a program, and reorder the postulation of the applicant, considering
-        his/her preferences and the schools that coincide with their
-        assigned linked applicants.
+        Reorder the postulation of the unmatched applicants of a round with
+        linked applicants at once. The links are joined with the current
+        assignment of the linked applicants, and the applications to the
+        institutions of those assignments go first, keeping the order of
+        preference within both parts.
 
         Args:
-            applicant (Applicant)
+            applicants_df (pd.DataFrame): Applicants of the round, with the
+                "links" column
         '''
-        if not applicant.match:
-            if len(applicant.vlinks) > 0:
-                schools_with_linked = set()
-                linked_grades = set()
-                # Check all the linked postulations
-                for link_applicant_id in applicant.vlinks:
-                    # Get the linked applicant from applicants graph
-                    linked = self.applicants[link_applicant_id]
-                    # Check if the linked is alredy matched to some program.
-                    if (linked.match) and (linked.assigned_vacancy is not None):
-                        # Give me the school where the linked was accepted and
-                        # append it to the array.
-                        schools_with_linked.add(
-                                    linked.assigned_vacancy.institution_id)
-                        linked_grades.add(
-                                    linked.assigned_vacancy.grade_id)
-
-                #Translate the array vpostulation from program_id to institution_id
-                applicant_schools_ids = applicant.vinstitution_id
-                linked_grades = list(linked_grades)
+        links = applicants_df['links'].to_numpy()
+        candidates = np.flatnonzero(np.fromiter(map(len, links),
+            dtype=np.int64, count=len(links)) > 0)
+        applicant_ids = applicants_df['applicant_id'].to_numpy()
+        candidates = candidates[~self._get_match_state(
+            applicant_ids[candidates].tolist())['match']]
+        if len(candidates) == 0:
+            return
+        pairs = self._get_assigned_relatives(applicants_df, 'links')
+        pairs = pairs.loc[pairs['applicant'].isin(candidates)]
+        applicant_ids = applicant_ids[candidates].tolist()
+        postulations = self.applicants.get_postulations(applicant_ids)
+        pair_applicants = np.searchsorted(candidates, pairs['applicant'])
+        changed = self._get_applications_to_institutions(
+            postulations, pair_applicants, pairs['institution_id'].to_numpy())
+
+        # Stable partition of each postulation, with the applications to the
+        # institutions of the linked applicants first
+        order = np.lexsort((~changed, postulations.get_owners()))
+        postulations.columns = {name: array[order]
+            for name, array in postulations.columns.items()}
+        linked_grades = [set() for _ in candidates]
+        for i, grade in zip(pair_applicants.tolist(),
+                            pairs['grade_id'].tolist()):
+            linked_grades[i].add(grade)
+        # Candidates without linked applicants assigned keep their order
+        row_linked_grades = postulations.row_columns['linked_grades']
+        for i, grades in enumerate(linked_grades):
+            row_linked_grades[i] = list(grades)
+        self.applicants.set_postulations(applicant_ids, postulations)
+
+    def _get_assigned_relatives(
+            self,
+            applicants_df: pd.DataFrame,
+            column: str) -> pd.DataFrame:
+        '''
+        Join the siblings or links of applicants with the program where they
+        are currently assigned. Relatives that are not assigned, or were
+        removed by rematch, are skipped.
 
-                # Indexes of applicant_schools_ids where there is coincidence
-                # with schools_with_linked, ordered from more to least preferred
-                indexes_to_put_in_first_place = [i for i, id in \
-                    enumerate(applicant_schools_ids) if id in schools_with_linked]
+        Args:
+            applicants_df (pd.DataFrame): Applicants, with column
+            column (str): "siblings" or "links"
 
+        Returns:
+            pd.DataFrame: "applicant" (position in applicants_df),
+            "institution_id" and "grade_id" of each assigned relative, in
+            the order of column.
+        '''
+        relatives = applicants_df[column].to_numpy()
+        n_relatives = np.fromiter(map(len, relatives), dtype=np.int64,
+                                count=len(relatives))
+        relative_ids = np.fromiter(itertools.chain.from_iterable(relatives),
+                                dtype=object, count=n_relatives.sum())
+        # Matching state of the released rounds, without creating relatives
+        positions = self.applicants.get_positions(relative_ids)
+        registered = positions >= 0
+        state = self.applicants.get_match_state(positions[registered])
+        programs = np.full(len(relative_ids), None, dtype=object)
+        programs[registered] = np.where(state['match'],
+                                        state['assigned_vacancy'], None)
+        assigned = np.asarray(pd.notna(programs), dtype=bool)
+        programs = programs[assigned].tolist()
+        return pd.DataFrame({
+            'applicant':np.repeat(np.arange(len(relatives)),
+                                    n_relatives)[assigned],
+            'institution_id':pd.Series([program.institution_id
+                for program in programs], dtype=object),
+            'grade_id':pd.Series([program.grade_id
+                for program in programs], dtype=object)})
+
+    @staticmethod
+    def _get_applications_to_institutions(
+            postulations: Postulations,
+            pair_applicants: np.ndarray,
+            pair_institutions: np.ndarray) -> np.ndarray:
+        '''
+        Find the current applications of applicants to the institutions
+        paired with them.
 
-                # Indexes of applicant_schools_ids where there is NO coincidence
-                # with schools_with_linked, ordered from more to least preferred
-                indexes_to_put_after_first_place = [i for i in \
-                    range(len(applicant_schools_ids)) if i \
-                    not in indexes_to_put_in_first_place]
+        Args:
+            postulations (Postulations): Postulation of the applicants
+            pair_applicants (np.ndarray): Position in postulations of each
+                pair
+            pair_institutions (np.ndarray): institution_id of each pair
 
-                new_postulation_arrays_order = indexes_to_put_in_first_place + \
-                                                indexes_to_put_after_first_place
-                # Reorder postulation in applicant object
-                applicant.reorder_postulation(linked_grades,
-                                            new_postulation_arrays_order)
+        Returns:
+            np.ndarray: Whether each application is to an institution paired
+            with its applicant.
+        '''
+        n_applications = postulations.offsets[-1]
+        if n_applications == 0:
+            return np.zeros(0, dtype=bool)
+        institution_codes, institutions = pd.factorize(np.concatenate([
+            postulations.columns['vinstitution_id'].astype(object),
+            np.asarray(pair_institutions, dtype=object)]))
+        n_institutions = len(institutions)
+        return np.isin(
+            postulations.get_owners()*n_institutions + \
+                institution_codes[:n_applications],
+            np.asarray(pair_applicants)*n_institutions + \
+                institution_codes[n_applications:])
+
+    def _get_match_state(self, applicant_ids: List) -> Dict[str, np.ndarray]:
+        '''
+        Matching state of applicants, as ApplicantMap.get_match_state,
+        without creating them.
 
+        Args:
+            applicant_ids (List)
 
+        Returns:
+            Dict[str, np.ndarray]: {column: array aligned with applicant_ids}
+        '''
+        self.applicants.sync_state(applicant_ids)
+        return self.applicants.get_match_state(
+            self.applicants.get_positions(applicant_ids))
 
     def _check_quota_postulation_order(
             self,
-            applicant: Applicant) -> None:
-        '''
-        Check the postulation order of student and correct it following the
-        info from self.quota_order_dict. This modifies the quota postulation
-        order, but not the program postulation order
-
-        Args:
-            applicant (Applicant)
-        '''
-        if ~applicant.match:
-            # If the applicant has a priority that needs reorder
-            if not set(applicant.vpriority_profile.values()).isdisjoint(
-                self.quota_order_dict_keys):
-                #Get the programs where the student has such priority
-                tuples_to_modify = [(program_id,priority_profiles)
-                    for program_id,priority_profiles
-                    in applicant.vpriority_profile.items()
-                    if priority_profiles in self.quota_order_dict_keys]
-
-                for program_id,priority_profile in tuples_to_modify:
-                    # Loop over all programs that need reorder
-                    # priority_profile = applicant.vpriority_profile[program_id]
-                    pp_quota_order_list = self.quota_order_dict[priority_profile].copy()
-                    secured_enrollment_indicator = \
-                        (applicant.se_program_id==program_id)
-                    # Check criteria
-                    for pp_dict in pp_quota_order_list:
-                        # Check SE criteria
-                        if self._secured_enrollment_activation:
-                            if pp_dict['secured_enrollment_indicator'] \
-                                !=secured_enrollment_indicator:
-                                continue
-                            if secured_enrollment_indicator:
-                                if not applicant.check_attribute_criteria(
-                                    attribute = 'se_quota_id',
-                                    criteria =
-                                        pp_dict['secured_enrollment_quota_id_criteria'],
-                                    value =
-                                        pp_dict['secured_enrollment_quota_id_value']):
-                                    continue
-                        # Check other characteristics criteria
-                        aux_attribute_criteria=True
-                        for applicant_characteristic in \
-                            self.quota_order_characteristics:
-                            if not applicant.check_attribute_criteria(
-                                attribute = applicant_characteristic,
-                                criteria =
-                                    pp_dict[f'{applicant_characteristic}_criteria'],
-                                value =
-                                    pp_dict[f'{applicant_characteristic}_value']):
-                                aux_attribute_criteria=False
-                                break
-                        if not aux_attribute_criteria:
-                            continue
-                        # If satisfies all criterias, reorder the quotas
-                        applicant.reorder_postulation_by_quota(
-                            program_id=program_id,
-                            ordered_quotas=pp_dict['ordered_quotas'])
+            applicants_df: pd.DataFrame) -> None:
+        '''
+        Check the postulation order of the applicants and correct it following
+        the rules compiled from quota_order. The rules of the priority profile
+        of each (applicant, program) are checked in order, and each rule met
+        reorders the quotas of the applicant in that program. This modifies
+        the quota postulation order, but not the program postulation order.
+        The rules are evaluated at once over every (applicant, program) of
+        applicants_df, without creating the applicants.
 
+        Args:
+            applicants_df (pd.DataFrame): Applicants
+        '''
+        if (len(self._quota_order_rules) == 0) or (len(applicants_df) == 0):
+            return
+        applicant_ids = applicants_df['applicant_id'].to_numpy()
+        postulations = self.applicants.get_postulations(applicant_ids.tolist())
+        # Only applicants with a profile in quota_order may be reordered
+        profile_codes = self._quota_order_profiles.get_indexer(
+            postulations.key_columns['vpriority_profile'])
+        positions = np.unique(postulations.get_key_owners()[profile_codes >= 0])
+        if len(positions) == 0:
+            return
+        postulations = postulations.take(positions)
+
+        groups = self._get_quota_order_groups(postulations)
+        passing = self._eval_quota_order_rules(
+            applicants_df.iloc[positions], groups)
+        met = passing.any(axis=1)
+        if not met.any():
+            return
+        # Distinct sets of rules met, and the one of each group
+        rule_sets, rule_set_codes = np.unique(passing[met], axis=0,
+                                            return_inverse=True)
+        groups = groups.loc[met].assign(rule_set=rule_set_codes.ravel())
+        rows, vquota_id = self._reorder_quota_groups(postulations, groups,
+                                                    rule_sets)
+        vscores = self._get_quota_vscores(postulations, rows, vquota_id)
+
+        # As Applicant.set_postulation_quotas, for the applicants with a
+        # changed quota or vscore
+        current_vscores = postulations.columns['vscores'][rows]
+        changed = np.asarray(postulations.columns['vquota_id'][rows] !=
+            vquota_id, dtype=bool) | ~((current_vscores == vscores) |
+            (np.isnan(current_vscores) & np.isnan(vscores)))
+        postulations.columns['vquota_id'][rows] = vquota_id
+        postulations.columns['vscores'][rows] = vscores
+        owners = np.unique(postulations.get_owners()[rows[changed]])
+        if len(owners) > 0:
+            self.applicants.set_postulations(
+                applicant_ids[positions[owners]].tolist(),
+                postulations.take(owners))
+
+    def _get_quota_order_groups(
+            self,
+            postulations: Postulations) -> pd.DataFrame:
+        '''
+        (applicant, program) groups of postulations whose priority profile
+        has rules in quota_order. The profile of a program is the one of its
+        last application, as in Applicant.vpriority_profile.
+
+        Args:
+            postulations (Postulations)
+
+        Returns:
+            pd.DataFrame: "applicant" (row in postulations), "program_id" and
+            "profile" (position of the profile in quota_order_dict)
+        '''
+        keys = pd.DataFrame({'applicant':postulations.get_key_owners(),
+            'program_id':postulations.key_columns['keys_program'],
+            'profile':self._quota_order_profiles.get_indexer(
+                postulations.key_columns['vpriority_profile'])})
+        groups = keys.groupby(['applicant', 'program_id'], sort=False)[
+            'profile'].last().reset_index()
+        return groups.loc[groups['profile'] >= 0].reset_index(drop=True)
+
+    def _eval_quota_order_rules(
+            self,
+            applicants_df: pd.DataFrame,
+            groups: pd.DataFrame) -> np.ndarray:
+        '''
+        Evaluate the compiled quota_order rules over every group, as masks.
+
+        Args:
+            applicants_df (pd.DataFrame): Applicants, aligned with the
+                "applicant" column of groups
+            groups (pd.DataFrame): Output of _get_quota_order_groups
+
+        Returns:
+            np.ndarray: True where the group (row) meets the rule (column)
+        '''
+        owners = groups['applicant'].to_numpy()
+        profiles = groups['profile'].to_numpy()
+        if self._secured_enrollment_activation:
+            se_program_id, se_quota_id = \
+                self._get_secured_enrollments(applicants_df)
+            se_quota_id = se_quota_id[owners]
+            secured_enrollment_indicator = np.asarray(se_program_id[owners] ==
+                groups['program_id'].to_numpy(dtype=object), dtype=bool)
+        passing = np.zeros((len(groups), len(self._quota_order_rules)),
+                            dtype=bool)
+        for r, rule in enumerate(self._quota_order_rules):
+            mask = profiles == rule['profile']
+            if self._secured_enrollment_activation:
+                indicator, criteria, value = rule['secured_enrollment']
+                mask &= secured_enrollment_indicator == indicator
+                if indicator:
+                    mask[mask] = np.asarray(
+                        criteria(se_quota_id[mask], value), dtype=bool)
+            for column, criteria, value in rule['criteria']:
+                characteristic = applicants_df[column].to_numpy()[owners]
+                mask[mask] = np.asarray(
+                    criteria(characteristic[mask], value), dtype=bool)
+            passing[:, r] = mask
+        return passing
+
+    def _reorder_quota_groups(
+            self,
+            postulations: Postulations,
+            groups: pd.DataFrame,
+            rule_sets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Reorder the quotas of the current applications of each group with the
+        rules it meets, as Applicant.reorder_postulation_by_quota. Groups with
+        the same rules and quotas are reordered once.
+
+        Args:
+            postulations (Postulations)
+            groups (pd.DataFrame): Groups with a "rule_set" column, the row
+                of rule_sets they meet
+            rule_sets (np.ndarray): Distinct rows of rules met
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Rows of the current applications
+            of the groups, by group, and their new quota
+        '''
+        applications = pd.DataFrame({'applicant':postulations.get_owners(),
+            'program_id':postulations.columns['vpostulation'],
+            'vquota_id':postulations.columns['vquota_id']})
+        applications['row'] = np.arange(len(applications))
+        applications = applications.merge(groups[['applicant', 'program_id',
+            'rule_set']], on=['applicant', 'program_id'])
+        group_codes = applications.groupby(['applicant', 'program_id'],
+            sort=False).ngroup().to_numpy()
+        applications = applications.iloc[np.argsort(group_codes,
+                                                    kind='stable')]
+
+        # (rule set, quotas) of each group, in the order of applications
+        starts = np.flatnonzero(np.diff(np.sort(group_codes), prepend=-1))
+        bounds = starts.tolist() + [len(applications)]
+        quotas = applications['vquota_id'].tolist()
+        patterns = list(zip(
+            applications['rule_set'].to_numpy()[starts].tolist(),
+            [tuple(quotas[start:end])
+                for start, end in zip(bounds[:-1], bounds[1:])]))
+        new_quotas = {(rule_set, pattern_quotas): self._reorder_quotas(
+            np.flatnonzero(rule_sets[rule_set]), pattern_quotas)
+            for rule_set, pattern_quotas in set(patterns)}
+        vquota_id = np.empty(len(applications), dtype=object)
+        vquota_id[:] = [quota for pattern in patterns
+            for quota in new_quotas[pattern]]
+        return applications['row'].to_numpy(), vquota_id
+
+    def _reorder_quotas(
+            self,
+            rules: np.ndarray,
+            quotas: Tuple) -> List:
+        '''
+        Quotas of the applications to a program after applying rules in
+        order.
+
+        Args:
+            rules (np.ndarray): Positions of the rules
+            quotas (Tuple): Current quota of each application, in order
+
+        Returns:
+            List: New quota of each application
+        '''
+        new_quotas = np.array(quotas, dtype=object)
+        for r in rules.tolist():
+            ordered_quotas = self._quota_order_rules[r]['ordered_quotas']
+            if len(new_quotas) != len(ordered_quotas):
+                new_quotas[:] = [quota for quota in ordered_quotas
+                    if quota in new_quotas]
+            else:
+                new_quotas[:] = ordered_quotas
+        return new_quotas.tolist()
+
+    def _get_quota_vscores(
+            self,
+            postulations: Postulations,
+            rows: np.ndarray,
+            vquota_id: np.ndarray) -> np.ndarray:
+        '''
+        vscores of the current applications in rows with quotas vquota_id,
+        from the last position of their (program, quota) key, or nan if the
+        applicant did not apply to that quota.
+
+        Args:
+            postulations (Postulations)
+            rows (np.ndarray): Rows of the current applications
+            vquota_id (np.ndarray): New quota of each one of rows
+
+        Returns:
+            np.ndarray: vscores of rows
+        '''
+        key_columns = postulations.key_columns
+        keys = pd.DataFrame({'applicant':postulations.get_key_owners(),
+            'program_id':key_columns['keys_program'],
+            'vquota_id':key_columns['keys_quota'],
+            'vscores':key_columns['vpostulation_scores'] +
+                key_columns['vpriorities']}).drop_duplicates(
+            ['applicant', 'program_id', 'vquota_id'], keep='last')
+        applications = pd.DataFrame({
+            'applicant':postulations.get_owners()[rows],
+            'program_id':postulations.columns['vpostulation'][rows],
+            'vquota_id':vquota_id})
+        return applications.merge(keys, how='left', on=['applicant',
+            'program_id', 'vquota_id'])['vscores'].to_numpy(dtype=np.float64)
 
     def _reasign_programs_capacity(
             self,
@@ -621,10 +1923,8 @@ class PolicyMaker:
             current_grade (int): int
             assignment_type (int): int
         '''
-        for program in self.programs.values():
-            if (program.grade_id != current_grade):
-                continue
-
+        for program in self._prep_programs_for_matching(
+                                        current_grade).values():
             capacity_to_transfer = \
                 program.get_capacity_to_transfer(
                                 from_assignment_type=assignment_type)
@@ -632,26 +1932,127 @@ class PolicyMaker:
                 continue
             program.transfer_capacity(capacity_to_transfer=capacity_to_transfer)
 
-    def _match_secured_enrollment_applicant(
+    @staticmethod
+    def _get_secured_enrollments(
+            applicants_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        se_program_id and se_quota_id of the applicants, with None for the
+        applicants without secured enrollment, as in Applicant.
+
+        Args:
+            applicants_df (pd.DataFrame)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Object arrays aligned with
+            applicants_df.
+        '''
+        if 'se_program_id' not in applicants_df.columns:
+            return (np.full(len(applicants_df), None, dtype=object),
+                    np.full(len(applicants_df), None, dtype=object))
+        se_program_id = applicants_df['se_program_id'].to_numpy(dtype=object)
+        se_quota_id = applicants_df['se_quota_id'].to_numpy(dtype=object) \
+            if 'se_quota_id' in applicants_df.columns else \
+            np.zeros(len(applicants_df), dtype=object)
+        # 0 or "" is no secured enrollment
+        has_secured_enrollment = \
+            np.asarray(se_program_id != 0, dtype=bool) & \
+            np.asarray(se_program_id != '', dtype=bool)
+        return (np.where(has_secured_enrollment, se_program_id, None),
+                np.where(has_secured_enrollment, se_quota_id, None))
+
+    def _set_secured_places(
             self,
-            applicant: Applicant) -> None:
+            applicants_df: pd.DataFrame) -> None:
         '''
-        Description: match a applicant with secure enrollment to his/her
-        secured option in case he/she didn't match any program.
-        This method changes atributtes of Applicant and Program Object.
+        Cut the postulation of every applicant with secured enrollment in
+        applicants_df after the secured program, and give the secured
+        enrollment priority to the secured (program, quota), as
+        Applicant.set_secured_place_as_last_postulation does one applicant
+        at a time.
 
         Args:
-            applicant (Applicant)
+            applicants_df (pd.DataFrame): Applicants
         '''
-        # Applicant match to None program
-        if (applicant.match) & (applicant.assigned_vacancy is None):
-            secured_program = self.programs[(applicant.se_program_id,
-                                             applicant.se_quota_id)]
+        se_program_id, se_quota_id = \
+            self._get_secured_enrollments(applicants_df)
+        positions = np.flatnonzero(np.not_equal(se_program_id, None))
+        if len(positions) == 0:
+            return
+        applicant_ids = applicants_df['applicant_id'].to_numpy()[positions]
+        postulations = self.applicants.get_postulations(applicant_ids.tolist())
+        se_program_id = se_program_id[positions]
+        se_quota_id = se_quota_id[positions]
+
+        # Last application to the secured program
+        offsets = postulations.offsets
+        owners = postulations.get_owners()
+        vpostulation = postulations.columns['vpostulation'].astype(object)
+        vquota_id = postulations.columns['vquota_id'].astype(object)
+        in_program = np.asarray(vpostulation == se_program_id[owners],
+                                dtype=bool)
+        last_index = np.full(len(applicant_ids), -1, dtype=np.int64)
+        np.maximum.at(last_index, owners[in_program],
+            np.flatnonzero(in_program) - offsets[owners[in_program]])
+        missing = np.flatnonzero(last_index < 0)
+        if len(missing) > 0:
+            raise ValueError(f'Applicant {applicant_ids[missing[0]]} does not have the SE program {se_program_id[missing[0]]} in vpostulation.')
+        secured = np.flatnonzero(in_program & np.asarray(
+            vquota_id == se_quota_id[owners], dtype=bool))
+
+        # Positions of the secured (program, quota) in the original order, and
+        # its vscore with the secured enrollment priority
+        key_columns = postulations.key_columns
+        key_owners = postulations.get_key_owners()
+        keys = np.flatnonzero(
+            np.asarray(key_columns['keys_program'].astype(object) ==
+                se_program_id[key_owners], dtype=bool) &
+            np.asarray(key_columns['keys_quota'].astype(object) ==
+                se_quota_id[key_owners], dtype=bool))
+        last_key = np.full(len(applicant_ids), -1, dtype=np.int64)
+        np.maximum.at(last_key, key_owners[keys], keys)
+        vpriorities = key_columns['vpriorities']
+        vpriorities[keys] = Applicant.secured_enrollment_priority
+        vscores = key_columns['vpostulation_scores'] + vpriorities
+        vscore = np.where(last_key >= 0, vscores[last_key], np.nan)
+
+        # As Applicant.set_secured_place
+        postulations.columns['vscores'][secured] = vscore[owners[secured]]
+        postulations.row_columns['cut_postulation'][:] = True
+        self.applicants.set_postulations(applicant_ids.tolist(),
+            postulations.cut(last_index + 1))
+
+    def _match_secured_enrollment_applicants(
+            self,
+            applicants_df: pd.DataFrame) -> None:
+        '''
+        Match the applicants with secured enrollment in applicants_df that
+        did not match any program to their secured option. This changes
+        attributes of the Applicant and Program objects, and the applicants
+        of each secured program are forced into it at once.
 
-            secured_program._force_secured_enrollment_match(
-                applicant)
-            applicant.match = True
-            applicant.assigned_vacancy = secured_program
+        Args:
+            applicants_df (pd.DataFrame): Applicants
+        '''
+        se_program_id, se_quota_id = \
+            self._get_secured_enrollments(applicants_df)
+        positions = np.flatnonzero(np.not_equal(se_program_id, None))
+        applicant_ids = applicants_df['applicant_id'].to_numpy()[positions]
+        state = self._get_match_state(applicant_ids.tolist())
+        unassigned = state['match'] & \
+            np.equal(state['assigned_vacancy'], None)
+        secured_applicants = {}
+        for key, applicant in zip(zip(se_program_id[positions][unassigned],
+                                    se_quota_id[positions][unassigned]),
+                                self.applicants.get_many(
+                                    applicant_ids[unassigned].tolist())):
+            secured_applicants.setdefault(key, []).append(applicant)
+        for key, applicants in secured_applicants.items():
+            secured_program = self.programs[key]
+            secured_program._force_secured_enrollment_matches(applicants)
+            for applicant in applicants:
+                applicant.match = True
+                applicant.assigned_vacancy = secured_program
+        self.applicants.release(applicant_ids[unassigned].tolist())
 
     def _check_grade_compatibility(self) -> None:
         '''
@@ -668,24 +2069,6 @@ class PolicyMaker:
                 raise ValueError(f'Student {applicant_id} from grade {app.grade} is applying to program {program_id} from grade {prog.grade_id}.')
         return
 
-    def _init_applicant_object(self, **row: Dict) -> Applicant:
-        '''
-        From applicants dataframe row, init an applicant object.
-
-        Args:
-            row (Dict): Row of applicants dataframe
-
-        Returns:
-            Applicant: applicant object
-        '''
-        applicant_characteristics = \
-            {key:row[key] for key in self.applicant_characteristics}
-        applicant = Applicant(
-                      applicant_characteristics=applicant_characteristics,
-                      **row)
-        return applicant
-
-
     def _init_program_object(self, row: Dict) -> Program:
         '''
         From vacancies dataframe row, init a program object.
@@ -699,6 +2082,8 @@ class PolicyMaker:
         special_vacancies = \
             {key:row[key] for key in self.special_assignment_cols}
         prog = Program(special_vacancies=special_vacancies,
+                       queue_type=self._queue_type,
+                       waitlist_store=self.waitlists,
                        **row)
         return prog
 
@@ -801,9 +2186,20 @@ class PolicyMaker:
 
         return applications
 
-    def add_unrelevant_applications_to_waitlist(self):
-        for _,(applicant_id,program_id,quota_id,priority_number_quota) in self.unrelevant_applications.iterrows():
-            self.programs[(program_id,quota_id)].add_applicant_to_waitlist(applicant_id,priority_number_quota)
+    def add_unrelevant_applications_to_waitlist(self) -> None:
+        '''
+        Seed the waitlists with the applications filtered out by
+        _filter_relevant_applications, writing the applications of each
+        program at once and in their original order.
+        '''
+        applications = self.unrelevant_applications
+        applicant_ids = applications['applicant_id'].to_numpy()
+        priorities = applications['priority_number_quota'].to_numpy(
+            dtype=float)
+        for key, positions in applications.groupby(['program_id', 'quota_id'],
+                sort=False).indices.items():
+            self.programs[key].seed_waitlist(applicant_ids[positions].tolist(),
+                                                priorities[positions].tolist())
         del self.unrelevant_applications
 
 
@@ -854,12 +2250,10 @@ class PolicyMaker:
     def _add_postulation_data(
             self,
             applicants: pd.DataFrame,
-            applications: pd.DataFrame) -> pd.DataFrame:
+            applications: pd.DataFrame) -> Tuple[pd.DataFrame, ApplicantStore]:
         '''
-        Transform and groupby applications data to merge it with
-        applicants data. Before we unpack them, we make sure they have all
-        requested columns.
-
+        Transform applications data into the postulation of each applicant.
+        Before we unpack them, we make sure they have all requested columns.
 
         Args:
             applicants(pd.DataFrame): Applicants df
@@ -867,38 +2261,8 @@ class PolicyMaker:
 
         Returns:
             applicants(pd.DataFrame): Updated version of the DataFrame
+            store(ApplicantStore): Postulation of each row of applicants
         '''
-        #We use a numpy level groupby.agg(list)
-        def gb_list(df):
-            aux_values = df.values.T
-            other_col_names = df.columns[1:]
-            keys = aux_values[0,:]
-            try:
-                keys = keys.astype(int)
-            except:
-                keys = keys.astype(str)
-            values = aux_values[1:,:]
-            ukeys, index = np.unique(keys, return_index=True, axis=0)
-            # split data columns according to those indices
-            arrays = np.split(values, index[1:], axis=1)
-            idx = pd.Index(ukeys.T,name='applicant_id')
-            list_agg_vals = dict()
-            for tup in zip(*arrays, other_col_names):
-                col_vals = tup[:-1] # first entries are the subarrays from above
-                col_name = tup[-1]  # last entry is data-column name
-
-                list_agg_vals[col_name] = col_vals
-
-            df2 = pd.DataFrame(data=list_agg_vals,index=idx)
-            return df2
-
-
-        #Postulations for same program are ordered by quota id. This is then
-        # modified by prep_applicants_for_matching considering the quota_order df
-        applications = applications.sort_values(['applicant_id',
-                                                    'ranking_program',
-                                                    'quota_id'])
-
         applications = applications.rename(\
             columns={'program_id':'vpostulation',
                         'lottery_number_quota':'vpostulation_scores',
@@ -912,25 +2276,17 @@ class PolicyMaker:
         if applications.vpostulation_scores.isna().sum()!=0:
             raise ValueError('There are Nan lottery numbers in applications dataframe')
 
-        int_vcolumns = ['vpostulation',
-                    'vinstitution_id',
-                    'vpriorities',
-                    'vquota_id',
-                    'vpriority_profile']
-        float_vcolumns = ['vpostulation_scores']
-        applications = applications[['applicant_id']+float_vcolumns+int_vcolumns]
-        grouped_int = gb_list(applications[['applicant_id']+int_vcolumns])
-        grouped_float = gb_list(applications[['applicant_id']+float_vcolumns])
-
-        applicants = applicants.join(grouped_int,on='applicant_id')
-        applicants = applicants.join(grouped_float,on='applicant_id')
+        #Postulations for same program are ordered by quota id. This is then
+        # modified by prep_applicants_for_matching considering the quota_order df
+        store = ApplicantStore.from_applications(applicants['applicant_id'],
+                                                applications)
 
         applicants = applicants.rename(columns={ \
                 'secured_enrollment_program_id':'se_program_id',
                 'secured_enrollment_quota_id':'se_quota_id'})
 
 
-        return applicants
+        return applicants, store
 
 
     def _unpack_priority_profiles(
@@ -950,6 +2306,23 @@ class PolicyMaker:
 
         self.priority_profile_transition = \
             priority_profiles.set_index(['priority_profile']).to_dict()
+        # Integer version for sibling priority: profiles are referred by
+        # their position in priority_profiles
+        self._priority_profile_index = \
+            pd.Index(priority_profiles['priority_profile'])
+        priority_columns = [col for col in priority_profiles.columns
+            if 'priority_q' in col]
+        self._priority_quota_columns = {col:i
+            for i, col in enumerate(priority_columns)}
+        self._priority_profile_priorities = \
+            priority_profiles[priority_columns].to_numpy(dtype=np.float64)
+        if 'priority_profile_sibling_transition' in priority_profiles.columns:
+            self._sibling_transition = \
+                self._priority_profile_index.get_indexer(
+                priority_profiles['priority_profile_sibling_transition'])
+        else:
+            self._sibling_transition = \
+                np.full(len(priority_profiles), -1, dtype=np.int64)
 
 
     def _unpack_quota_order(
@@ -1009,12 +2382,62 @@ class PolicyMaker:
                 for key in order_columns:
                     pp_dict.pop(key)
 
+        # Compile the rules for _check_quota_postulation_order, in the order
+        # they are applied: profile code, secured enrollment criteria,
+        # characteristic criteria and ordered quotas
+        self._quota_order_profiles = pd.Index(list(self.quota_order_dict))
+        self._quota_order_rules = [
+            {'profile':profile,
+            'secured_enrollment':(
+                pp_dict.get('secured_enrollment_indicator'),
+                Applicant.eval_dict.get(
+                    pp_dict.get('secured_enrollment_quota_id_criteria')),
+                pp_dict.get('secured_enrollment_quota_id_value')),
+            'criteria':[(applicant_characteristic,
+                Applicant.eval_dict[
+                    pp_dict[f'{applicant_characteristic}_criteria']],
+                pp_dict[f'{applicant_characteristic}_value'])
+                for applicant_characteristic in
+                self.quota_order_characteristics],
+            'ordered_quotas':pp_dict['ordered_quotas']}
+            for profile, pp in enumerate(self.quota_order_dict)
+            for pp_dict in self.quota_order_dict[pp]]
+
+
+    def _mark_modified(self, applicants: Iterable[Applicant]) -> None:
+        '''
+        Register applicants whose original postulation changed, so their
+        objects are kept instead of being created again from the store.
+
+        Args:
+            applicants (Iterable[Applicant])
+        '''
+        self.applicants.pin(applicants)
 
     def reset_matching(self):
         '''
-        Resets both programs and applicants
+        Resets both programs and applicants. Only the applicants whose
+        objects are alive are reset one by one, the state of the rest is
+        reset in the state arrays.
         '''
+        self._matched = False
         for program in self.programs.values():
             program._reset_matching_attributes()
-        for applicant in self.applicants.values():
-            applicant._reset_matching_attributes()
+        self.waitlists.reset()
+        self.applicants.reset_matching()
+
+
+def _match_sub_market(
+        policy_maker: PolicyMaker) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    '''
+    Match a sub-market in a worker process.
+
+    Args:
+        policy_maker (PolicyMaker): PolicyMaker restricted to a sub-market
+
+    Returns:
+        Tuple[Dict[str, Any], pd.DataFrame]: The matching as given by
+        PolicyMaker._get_matching_arrays, and the round summary
+    '''
+    summary = policy_maker.match_applicants_and_programs()
+    return policy_maker._get_matching_arrays(), summary
@@ -0,0 +1,115 @@
+'''
+File: profiler.py
+Company: Tether Education Inc.
+'''
+
+from typing import Any, Dict, List
+import contextlib
+import json
+import time
+import tracemalloc
+import pandas as pd
+
+
+class PhaseProfiler:
+    '''
+    Records wall time, CPU time and peak traced memory of named phases.
+    Phases can be nested, and each one reports its own peak, which is also
+    taken into account by the phases that contain it. Disabled profilers do
+    not measure anything.
+    '''
+    columns = ['phase', 'grade', 'assignment_type', 'wall_time', 'cpu_time',
+                'peak_memory']
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = True):
+        '''
+        Args:
+            enabled (bool): If False, phase does nothing.
+            trace_memory (bool): Measure the peak memory allocated by Python
+                with tracemalloc, which slows down the phases.
+        '''
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.records : List[Dict[str, Any]] = []
+        self._peaks : List[int] = []
+        self._started_tracing = False
+
+    def phase(self, name: str, grade: Any = None, assignment_type: int = None):
+        '''
+        Context manager that records the phase when it exits.
+
+        Args:
+            name (str): Phase name
+            grade (Any, optional): grade_id of a matching round
+            assignment_type (int, optional): Assignment type of a matching
+                round
+        '''
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._record(name, grade, assignment_type)
+
+    @contextlib.contextmanager
+    def _record(self, name: str, grade: Any, assignment_type: int):
+        self._start_memory_phase()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            self.records.append({'phase':name,
+                                'grade':grade,
+                                'assignment_type':assignment_type,
+                                'wall_time':wall_time,
+                                'cpu_time':cpu_time,
+                                'peak_memory':self._end_memory_phase()})
+
+    def _start_memory_phase(self) -> None:
+        if not self.trace_memory:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        peak = tracemalloc.get_traced_memory()[1]
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        self._peaks.append(0)
+        # Python < 3.9 can only report the peak since tracing started
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def _end_memory_phase(self) -> float:
+        if not self.trace_memory:
+            return float('nan')
+        peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        elif self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        return peak
+
+    def get_report(self) -> pd.DataFrame:
+        '''
+        Recorded phases, in the order they finished.
+
+        Returns:
+            pd.DataFrame: "phase", "grade", "assignment_type", "wall_time"
+            and "cpu_time" in seconds and "peak_memory" in bytes.
+        '''
+        return pd.DataFrame(self.records, columns=self.columns)
+
+    def to_json(self, **kwargs) -> str:
+        '''
+        Recorded phases as a JSON list of records.
+
+        Args:
+            kwargs: Passed to json.dumps
+
+        Returns:
+            str
+        '''
+        return json.dumps(self.records, default=str, **kwargs)
@@ -3,8 +3,10 @@ File: programs.py
 Company: Tether Education Inc.
 '''
 
-from schoolchoice_da.entities.applicants_queue import Applicant_Queue
+from typing import List
+from schoolchoice_da.entities.applicants_queue import QUEUE_TYPES
 from schoolchoice_da.entities.applicants import Applicant
+from schoolchoice_da.entities.waitlist import WaitlistStore
 
 
 
@@ -16,6 +18,8 @@ class Program:
                  grade_id: int,
                  regular_capacity: int,
                  special_vacancies = {},
+                 queue_type: str = 'list',
+                 waitlist_store: WaitlistStore = None,
                  **kwargs):
         '''
         Init a Program instance. A program is defined by its program and
@@ -29,12 +33,20 @@ class Program:
             regular_capacity (int):
             special_vacancies (dict): Dict with keys names "special_i_vacancies"
             for i =1,...,n. Values must be ints representing a capacity.
+            queue_type (str): Applicants queue implementation, 'list' or
+            'heap'. Both give the same matching.
+            waitlist_store (WaitlistStore): Store where the waitlist is
+            written, usually shared by all the programs of a market. If None,
+            the program keeps its own.
         '''
         self.__program_id = program_id
         self.__institution_id = institution_id
         self.__grade_id = grade_id
         self.__quota_id = quota_id
-        self.regular_assignment = Applicant_Queue(regular_capacity)
+        self._queue_class = QUEUE_TYPES[queue_type]
+        self.regular_assignment = self._queue_class(regular_capacity)
+        self.set_waitlist_store(WaitlistStore() if waitlist_store is None
+                                else waitlist_store)
 
         self._unpack_special_vacancies(special_vacancies)
 
@@ -56,19 +68,53 @@ class Program:
     def quota_id(self) -> int:
         return self.__quota_id
 
+    @property
+    def waitlist_dict(self) -> dict:
+        '''
+        Waitlist as {applicant_id: priority}, in priority order. It is built
+        from the waitlist store, so changes to it are not kept.
+        '''
+        return self.waitlist_store.get_waitlist(self._waitlist_index)
+
+    def set_waitlist_store(
+            self,
+            waitlist_store: WaitlistStore,
+            waitlist_index: int = None) -> None:
+        '''
+        Write the waitlist in waitlist_store.
+
+        Args:
+            waitlist_store (WaitlistStore)
+            waitlist_index (int, optional): Index of the program in
+                waitlist_store, if it is already registered.
+        '''
+        self.waitlist_store = waitlist_store
+        self._waitlist_index = waitlist_store.add_program(
+            (self.program_id, self.quota_id)) if waitlist_index is None \
+            else waitlist_index
+
     def get_applicant_score_in_program(
             self,
-            applicant: Applicant) -> float:
+            applicant: Applicant,
+            option_n: int = None) -> float:
         '''
         Receive a applicant and search the score
         associated for that applicant to self.
 
         Args:
             applicant (Applicant): Applicant instance
+            option_n (int, optional): Position of self in the applicant
+                postulation. If given, the score is read from vscores.
 
         Returns:
             float: score associated to the program
         '''
+        if option_n is not None:
+            score = applicant.vscores[option_n]
+            # Missing (program_id, quota_id) pairs are nan in vscores
+            if score != score:
+                raise KeyError((self.program_id,self.quota_id))
+            return score
 
         # Score of the applicant at (program , quota_id)
         # (could be selection score or lotery number)
@@ -116,7 +162,7 @@ class Program:
             self.tranfer_capacity = True
             assignment.transfer_capacity = True
             capacity_to_be_transfered = \
-                (assignment.capacity - len(assignment.vassigned_applicants))
+                (assignment.capacity - assignment.n_assigned)
 
             assignment.modify_capacity(-capacity_to_be_transfered)
         return capacity_to_be_transfered
@@ -162,7 +208,40 @@ class Program:
         assignment.add_score_to_program(applicant_score)
 
         #Remove applicant from waitlist
-        self.waitlist_dict.pop(secured_applicant.id,None)
+        self.waitlist_store.remove(self._waitlist_index, secured_applicant.id)
+
+    def _force_secured_enrollment_matches(
+            self,
+            secured_applicants: List[Applicant]) -> None:
+        '''
+        Same as _force_secured_enrollment_match for several applicants, in
+        order, modifying the over capacity of each assignment type once and
+        removing all of them from the waitlist at once.
+
+        Args:
+            secured_applicants (List[Applicant]):
+                Applicants to be forced into assignment
+        '''
+        self.over_capacity = True
+        applicants_by_assignment_type = {}
+        for applicant in secured_applicants:
+            applicants_by_assignment_type.setdefault(
+                applicant.special_assignment, []).append(applicant)
+
+        for assignment_type, applicants in \
+                applicants_by_assignment_type.items():
+            assignment = self.get_assignment_type_queue(
+                            assignment_type=assignment_type)
+            assignment.modify_over_capacity(len(applicants))
+            for applicant in applicants:
+                applicant_score = self.get_applicant_score_in_program(
+                                    applicant)
+                assignment.add_applicant_to_program(applicant)
+                assignment.add_score_to_program(applicant_score)
+
+        self.waitlist_store.add_many(self._waitlist_index,
+            [applicant.id for applicant in secured_applicants],
+            [float('nan')]*len(secured_applicants))
 
     def _reset_matching_attributes(self) -> None:
         '''
@@ -172,7 +251,7 @@ class Program:
         self.receive_capacity = False
         self.over_capacity = False
         self.regular_assignment.reset_assignment()
-        self.waitlist_dict = {}
+        self.waitlist_store.reset_program(self._waitlist_index)
         for i in self.special_assignment_types:
             getattr(self, f'special_{i}_assignment').reset_assignment()
 
@@ -193,7 +272,7 @@ class Program:
                 for keys in special_vacancies.keys()]
             for key,i in zip(special_vacancies.keys(),
                                         self.special_assignment_types):
-                setattr(self, f'special_{i}_assignment', Applicant_Queue(special_vacancies[key]))
+                setattr(self, f'special_{i}_assignment', self._queue_class(special_vacancies[key]))
         else:
             self.special_assignment_types = []
 
@@ -209,4 +288,52 @@ class Program:
             applicant_id: applicant_id to be added
             priority_number_quota (float): Score
         '''
-        self.waitlist_dict.update({applicant_id:priority_number_quota})
+        self.waitlist_store.add(self._waitlist_index, applicant_id,
+                                priority_number_quota)
+
+    def add_applicants_to_waitlist(
+        self,
+        applicant_ids,
+        priority_numbers_quota) -> None:
+        '''
+        Add several applicants to waitlist, in order.
+
+        Args:
+            applicant_ids (Iterable): applicant_ids to be added
+            priority_numbers_quota (Iterable[float]): Scores
+        '''
+        self.waitlist_store.add_many(self._waitlist_index, applicant_ids,
+                                        priority_numbers_quota)
+
+    def seed_waitlist(
+        self,
+        applicant_ids,
+        priority_numbers_quota) -> None:
+        '''
+        Add applicants that do not take part in the matching to the waitlist.
+        Unlike add_applicants_to_waitlist, these entries are kept by
+        _reset_matching_attributes.
+
+        Args:
+            applicant_ids (Iterable): applicant_ids to be added
+            priority_numbers_quota (Iterable[float]): Scores
+        '''
+        self.waitlist_store.seed(self._waitlist_index, applicant_ids,
+                                    priority_numbers_quota)
+
+    def remove_applicant_from_waitlist(
+        self,
+        applicant_id,
+        keep_seed: bool = False) -> None:
+        '''
+        Remove applicant from waitlist, including seeded entries unless
+        keep_seed is True.
+
+        Args:
+            applicant_id: applicant_id to be removed
+            keep_seed (bool): Keep the entry added by seed_waitlist
+        '''
+        if keep_seed:
+            self.waitlist_store.restore_seed(self._waitlist_index, applicant_id)
+        else:
+            self.waitlist_store.drop(self._waitlist_index, applicant_id)
@@ -0,0 +1,294 @@
+'''
+File: simulation.py
+Company: Tether Education Inc.
+'''
+
+from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+
+from schoolchoice_da.entities.policymaker import PolicyMaker
+
+
+TIE_BREAKING_TYPES = ['multiple', 'single']
+
+
+class LotterySimulation:
+    '''
+    Estimate admission probabilities of a prepared market by matching it once
+    per lottery draw. Only the lottery numbers change between draws, so the
+    inputs are processed once by PolicyMaker and each draw swaps the
+    applicants scores, resets and matches again.
+    '''
+    def __init__(
+            self,
+            policy_maker: PolicyMaker,
+            tie_breaking: str = 'multiple') -> None:
+        '''
+        Args:
+            policy_maker (PolicyMaker): Market to be simulated. Its lottery
+                numbers are restored after each run, and it is left reset.
+            tie_breaking (str): 'multiple' draws one lottery number per
+                application, 'single' draws one number per applicant that is
+                used in all his/her applications.
+        '''
+        if tie_breaking not in TIE_BREAKING_TYPES:
+            raise ValueError(f'Unexpected tie_breaking "{tie_breaking}". Use one of {TIE_BREAKING_TYPES}.')
+        self._tie_breaking = tie_breaking
+        self._policy_maker = policy_maker
+
+        self.applicant_ids = list(self._policy_maker.applicants.keys())
+        self.program_keys = list(self._policy_maker.programs.keys())
+        self._program_index = {key:i for i,key in enumerate(self.program_keys)}
+        self.queues = [(program_id, quota_id, assignment_type)
+            for program_id, quota_id in self.program_keys
+            for assignment_type in self._policy_maker.assignment_types]
+
+        self._original_scores = [
+            applicant.get_original_vpostulation_scores() for applicant
+            in self._policy_maker.applicants.get_many(self.applicant_ids)]
+        lengths = np.array([len(scores) for scores in self._original_scores],
+                            dtype=np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self._lengths = lengths
+
+    def run(
+            self,
+            n_draws: int,
+            random_state: int = None,
+            n_jobs: int = 1) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        '''
+        Match the market once per lottery draw and aggregate the results.
+        Draw i always uses the i-th child of random_state seed sequence, so
+        the results do not depend on n_jobs.
+
+        Args:
+            n_draws (int): Number of lottery draws
+            random_state (int): Seed of the lottery draws
+            n_jobs (int): Number of processes. -1 uses all the processors.
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: Assignment probabilities with
+            the fields "applicant_id", "program_id", "quota_id", "n_assigned"
+            and "probability" (program_id and quota_id are NaN for the
+            unassigned draws), and the cut-off distribution of each
+            "program_id", "quota_id" and "assignment_type" from
+            get_cutoff_distribution.
+        '''
+        n_jobs = os.cpu_count() if n_jobs in (-1, None) else n_jobs
+        seeds = np.random.SeedSequence(random_state).spawn(n_draws)
+        if (n_jobs > 1) and (n_draws > 1):
+            chunks = [chunk.tolist() for chunk in np.array_split(
+                np.arange(n_draws), min(n_draws, 4*n_jobs))]
+            methods = multiprocessing.get_all_start_methods()
+            # With fork the prepared market is inherited by the workers
+            # without being pickled.
+            context = multiprocessing.get_context(
+                'fork' if 'fork' in methods else None)
+            with ProcessPoolExecutor(max_workers=n_jobs,
+                                        mp_context=context,
+                                        initializer=_init_worker,
+                                        initargs=(self,)) as pool:
+                outputs = list(pool.map(_run_worker_draws,
+                    [[seeds[i] for i in chunk] for chunk in chunks]))
+        else:
+            outputs = [self.run_draws(seeds)]
+
+        codes = np.concatenate([output[0] for output in outputs])
+        counts = np.concatenate([output[1] for output in outputs])
+        self.cutoff_draws = np.concatenate([output[2] for output in outputs])
+        codes, inverse = np.unique(codes, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+        return (self._get_assignment_probabilities(codes, counts, n_draws),
+                self.get_cutoff_distribution())
+
+    def run_draws(
+            self,
+            seeds: List[np.random.SeedSequence]) -> Tuple:
+        '''
+        Match the market with the lottery drawn from each seed and restore
+        the original lottery numbers at the end.
+
+        Args:
+            seeds (List[np.random.SeedSequence]): One seed per draw
+
+        Returns:
+            Tuple: (codes, counts) of the applicant and program pairs
+            assigned, with code applicant*(n_programs+1) + program + 1 and
+            program -1 when unassigned, and the cut-off of each queue by draw.
+        '''
+        policy_maker = self._policy_maker
+        n_applicants = len(self.applicant_ids)
+        assigned = np.empty((len(seeds), n_applicants), dtype=np.int64)
+        cutoffs = np.empty((len(seeds), len(self.queues)), dtype=np.float64)
+        # Draws are already spread across processes, so each market is
+        # matched serially.
+        n_jobs = policy_maker._n_jobs
+        policy_maker._n_jobs = 1
+        # Waitlists are not used by the draws
+        track_waitlists = policy_maker.waitlists.enabled
+        policy_maker.waitlists.enabled = False
+        try:
+            for draw, seed in enumerate(seeds):
+                self._set_scores(self._draw_scores(
+                    np.random.default_rng(seed)))
+                policy_maker.reset_matching()
+                policy_maker.match_applicants_and_programs()
+                assigned[draw] = self._get_assigned_programs()
+                cutoffs[draw] = self._get_cutoffs()
+        finally:
+            self._set_scores(self._original_scores)
+            policy_maker.reset_matching()
+            policy_maker._n_jobs = n_jobs
+            policy_maker.waitlists.enabled = track_waitlists
+
+        codes = np.arange(n_applicants)*(len(self.program_keys) + 1) + \
+            assigned + 1
+        codes, counts = np.unique(codes, return_counts=True)
+        return codes, counts, cutoffs
+
+    def get_cutoff_distribution(
+            self,
+            quantiles: Tuple = (0.05, 0.25, 0.5, 0.75, 0.95)) -> pd.DataFrame:
+        '''
+        Summarize the cut-off of each queue, the highest score assigned, over
+        the draws of the last run. Draws where the queue is empty are not
+        considered.
+
+        Args:
+            quantiles (Tuple[float]): Quantiles to report
+
+        Returns:
+            pd.DataFrame: "program_id", "quota_id", "assignment_type",
+            "p_assigned" (fraction of draws with someone assigned), "mean",
+            "std", "min", "max" and one "q{quantile}" column per quantile.
+        '''
+        cutoffs = pd.DataFrame(self.cutoff_draws)
+        distribution = pd.DataFrame(self.queues,
+            columns=['program_id', 'quota_id', 'assignment_type'])
+        distribution['p_assigned'] = cutoffs.notna().mean().to_numpy()
+        distribution['mean'] = cutoffs.mean().to_numpy()
+        distribution['std'] = cutoffs.std().to_numpy()
+        distribution['min'] = cutoffs.min().to_numpy()
+        distribution['max'] = cutoffs.max().to_numpy()
+        for quantile in quantiles:
+            distribution[f'q{quantile}'] = \
+                cutoffs.quantile(quantile).to_numpy()
+        return distribution
+
+    def _draw_scores(self, rng: np.random.Generator) -> List[np.ndarray]:
+        '''
+        Draw the lottery numbers of every application.
+
+        Args:
+            rng (np.random.Generator)
+
+        Returns:
+            List[np.ndarray]: Scores of each applicant
+        '''
+        if self._tie_breaking == 'single':
+            scores = np.repeat(rng.random(len(self._lengths)), self._lengths)
+        else:
+            scores = rng.random(self._offsets[-1])
+        return np.split(scores, self._offsets[1:-1])
+
+    def _set_scores(self, scores: List) -> None:
+        '''
+        Set the original_vpostulation_scores of every applicant.
+
+        Args:
+            scores (List): Scores of each applicant
+        '''
+        applicants = self._policy_maker.applicants
+        for applicant_id, applicant_scores in zip(self.applicant_ids, scores):
+            applicants[applicant_id].set_original_vpostulation_scores(
+                applicant_scores)
+        self._policy_maker._mark_modified(applicants[applicant_id]
+            for applicant_id in self.applicant_ids)
+
+    def _get_assigned_programs(self) -> List[int]:
+        '''
+        Returns:
+            List[int]: Position in program_keys of the program assigned to
+            each applicant, or -1.
+        '''
+        applicants = self._policy_maker.applicants
+        assigned = []
+        for applicant_id in self.applicant_ids:
+            program = applicants[applicant_id].assigned_vacancy
+            if program is None:
+                assigned.append(-1)
+            else:
+                assigned.append(self._program_index[(program.program_id,
+                                                    program.quota_id)])
+        return assigned
+
+    def _get_cutoffs(self) -> List[float]:
+        '''
+        Returns:
+            List[float]: Highest score assigned to each queue, or NaN.
+        '''
+        programs = self._policy_maker.programs
+        cutoffs = []
+        for program_id, quota_id, assignment_type in self.queues:
+            queue = programs[(program_id, quota_id)].get_assignment_type_queue(
+                assignment_type)
+            cutoffs.append(queue.last_admitted_score)
+        return cutoffs
+
+    def _get_assignment_probabilities(
+            self,
+            codes: np.ndarray,
+            counts: np.ndarray,
+            n_draws: int) -> pd.DataFrame:
+        '''
+        Decode the (applicant, program) codes of run_draws.
+
+        Args:
+            codes (np.ndarray): Codes of the assigned pairs
+            counts (np.ndarray): Draws of each pair
+            n_draws (int): Number of draws
+
+        Returns:
+            pd.DataFrame: Assignment probabilities
+        '''
+        applicants, programs = np.divmod(codes, len(self.program_keys) + 1)
+        program_keys = [(np.nan, np.nan)] + self.program_keys
+        probabilities = pd.DataFrame({
+            'applicant_id':[self.applicant_ids[i] for i in applicants],
+            'program_id':[program_keys[i][0] for i in programs],
+            'quota_id':[program_keys[i][1] for i in programs],
+            'n_assigned':counts})
+        probabilities['probability'] = probabilities['n_assigned']/n_draws
+        return probabilities
+
+
+_WORKER_SIMULATION = None
+
+
+def _init_worker(simulation: LotterySimulation) -> None:
+    '''
+    Keep the simulation of the worker process in a global, so it is received
+    once per worker and not once per chunk of draws.
+
+    Args:
+        simulation (LotterySimulation)
+    '''
+    global _WORKER_SIMULATION
+    _WORKER_SIMULATION = simulation
+
+
+def _run_worker_draws(seeds: List[np.random.SeedSequence]) -> Tuple:
+    '''
+    Run a chunk of draws in a worker process.
+
+    Args:
+        seeds (List[np.random.SeedSequence]): One seed per draw
+
+    Returns:
+        Tuple: LotterySimulation.run_draws output
+    '''
+    return _WORKER_SIMULATION.run_draws(seeds)
@@ -0,0 +1,271 @@
+'''
+File: validation.py
+Company: Tether Education Inc.
+'''
+
+from typing import Any, Dict, Iterable, List
+import os
+import warnings
+import pandas as pd
+
+from schoolchoice_da.entities.fingerprint import get_fingerprint
+
+
+# Change it when the checks change, so cached validations are not reused
+VALIDATION_VERSION = 1
+
+QUOTA_ID_CRITERIA = ['<', '<=', '>', '>=', '=', '!=', '==', 'le', 'leq',
+                    'ge', 'geq', 'eq', 'neq']
+
+
+class InputValidationError(KeyError, ValueError):
+    '''
+    Every problem found in the inputs. It is a KeyError, as missing columns
+    were reported, and a ValueError, as the rest of the problems were.
+
+    Attributes:
+        errors (pd.DataFrame): One row per problem, with the columns of
+            InputValidator.columns
+    '''
+    def __init__(self, errors: pd.DataFrame):
+        self.errors = errors
+        super().__init__('\n'.join(errors['message']))
+
+    def __str__(self) -> str:
+        return self.args[0]
+
+
+class InputValidator:
+    '''
+    Checks the inputs of PolicyMaker as described in Inputs_description.md.
+    Every check is run, even after a failed one, with vectorized isin and
+    duplicated over the id columns, and the problems are reported together
+    in a table. Checks that need a missing column or DataFrame are skipped,
+    as the missing input is already reported.
+    '''
+    columns = ['frame', 'column', 'check', 'n_rows', 'examples', 'message']
+    n_examples = 5
+
+    def __init__(self,
+                 sibling_priority_activation: bool = False,
+                 linked_postulation_activation: bool = False,
+                 secured_enrollment_activation: bool = False,
+                 cache_dir: str = None):
+        '''
+        Args:
+            sibling_priority_activation (bool)
+            linked_postulation_activation (bool)
+            secured_enrollment_activation (bool): True if secured enrollment
+                or forced secured enrollment are active
+            cache_dir (str, optional): Directory where the fingerprints of
+                the inputs that passed validation are kept, so validate_cached
+                skips them. If None, nothing is cached.
+        '''
+        self.sibling_priority_activation = sibling_priority_activation
+        self.linked_postulation_activation = linked_postulation_activation
+        self.secured_enrollment_activation = secured_enrollment_activation
+        self.cache_dir = cache_dir
+        self._errors : List[Dict[str, Any]] = []
+
+    def _add(self,
+             frame: str,
+             column: str,
+             check: str,
+             message: str,
+             values: Iterable = None) -> None:
+        '''
+        Register a problem.
+
+        Args:
+            frame (str): Input DataFrame
+            column (str): Column with the problem, if any
+            check (str): Name of the failed check
+            message (str): Description, as in the exception
+            values (Iterable, optional): Offending values
+        '''
+        values = [] if values is None else pd.unique(pd.Series(values))
+        self._errors.append({'frame':frame,
+                            'column':column,
+                            'check':check,
+                            'n_rows':len(values),
+                            'examples':list(values[:self.n_examples]),
+                            'message':message})
+
+    def _has_columns(self,
+                     df: pd.DataFrame,
+                     frame: str,
+                     columns: List[str],
+                     message: str = None) -> bool:
+        '''
+        Register each missing column.
+
+        Returns:
+            bool: True if no column is missing
+        '''
+        missing = [column for column in columns if column not in df.columns]
+        for column in missing:
+            self._add(frame, column, 'missing_column',
+                message.format(column=column) if message is not None else
+                f'Expected column "{column}" in {frame} DataFrame.')
+        return len(missing) == 0
+
+    def _check_registered(self,
+                          values: pd.Series,
+                          registered: pd.Index,
+                          frame: str,
+                          message: str) -> None:
+        '''
+        Register the values that are not in registered.
+        '''
+        unknown = values[~values.isin(registered)]
+        if len(unknown) > 0:
+            self._add(frame, values.name, 'not_registered', message, unknown)
+
+    def validate(self,
+                 vacancies: pd.DataFrame,
+                 applicants: pd.DataFrame,
+                 applications: pd.DataFrame,
+                 priority_profiles: pd.DataFrame,
+                 quota_order: pd.DataFrame,
+                 siblings: pd.DataFrame,
+                 links: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Run every check. Applicants without applications are only warned.
+
+        Returns:
+            pd.DataFrame: One row per problem with the DataFrame ("frame"),
+            "column" and "check" that failed, the number of distinct
+            offending values ("n_rows"), some of them ("examples") and the
+            "message". Empty if the inputs are valid.
+        '''
+        self._errors = []
+        has_vacancies = self._has_columns(vacancies, 'vacancies',
+            ['program_id', 'quota_id', 'institution_id', 'grade_id',
+            'regular_vacancies'])
+
+        has_applicants = self._has_columns(applicants, 'applicants',
+            ['applicant_id', 'grade_id'])
+        applicant_ids = None
+        if has_applicants:
+            applicant_ids = pd.Index(applicants['applicant_id'])
+            duplicated = applicant_ids[applicant_ids.duplicated()]
+            if len(duplicated) > 0:
+                self._add('applicants', 'applicant_id', 'duplicated',
+                    'applicant_id in the applicants database must be unique.',
+                    duplicated)
+        if self.secured_enrollment_activation:
+            for name in ['program_id', 'quota_id']:
+                self._has_columns(applicants, 'applicants',
+                    [f'secured_enrollment_{name}'],
+                    f'Expected secured_enrollment {name} in applicants DataFrame when secured_enrollment_activation is on. \nTurn it off or add "{{column}}" to applicants DataFrame.')
+
+        has_applications = self._has_columns(applications, 'applications',
+            ['applicant_id', 'program_id', 'quota_id', 'institution_id',
+            'ranking_program', 'priority_profile_program',
+            'priority_number_quota'])
+        if has_applications and has_applicants:
+            self._check_registered(applications['applicant_id'],
+                applicant_ids, 'applications',
+                'There are applications, with applicant_id not registered in applicants DataFrame.')
+            if not applicant_ids.isin(applications['applicant_id']).all():
+                warnings.warn('There are applicants, without applications.')
+        if has_applications and has_vacancies:
+            self._check_registered(applications['program_id'],
+                pd.Index(vacancies['program_id']), 'applications',
+                'There are applications to programs that do not appear on the vacancies DataFrame.')
+
+        if self.linked_postulation_activation:
+            self._check_relatives(links, 'links', 'linked_id',
+                applicant_ids,
+                'Expected links dataframe when linked_postulation_activation is on. Turn it off or provide a links DataFrame.',
+                'There are applicant_ids in links DataFrame that are not registred in the applicants DataFrame.')
+
+        self._has_columns(priority_profiles, 'priority_profiles',
+            ['priority_profile'])
+
+        if self.sibling_priority_activation:
+            self._check_relatives(siblings, 'siblings', 'sibling_id',
+                applicant_ids,
+                'Expected siblings DataFrame when sibling_priority_activation is on. Turn it off or provide a siblings DataFrame.',
+                'There are applicant_ids in siblings DataFrame that are not registred in the applicants DataFrame.')
+            self._has_columns(priority_profiles, 'priority_profiles',
+                ['priority_profile_sibling_transition'],
+                'Expected column "{column}" in priority_profiles DataFrame when sibling_priority_activation is on. Turn it off or add "{column}" to priority_profiles DataFrame.')
+
+        self._has_columns(quota_order, 'quota_order', ['priority_profile'])
+        if self.secured_enrollment_activation:
+            if self._has_columns(quota_order, 'quota_order',
+                    ['secured_enrollment_indicator',
+                    'secured_enrollment_quota_id_criteria',
+                    'secured_enrollment_quota_id_value'],
+                    'Expected column "{column}" in quota_order DataFrame when secured_enrollment_activation is on. Turn it off or add "{column}" to quota_order DataFrame.'):
+                criteria = quota_order['secured_enrollment_quota_id_criteria']
+                self._check_registered(criteria, pd.Index(QUOTA_ID_CRITERIA),
+                    'quota_order',
+                    'Unexpected value in "secured_enrollment_quota_id_criteria" column of the quota_order dataframe. Use strings such as "<", "<=", ">", ">=", "=", "!=", "==", "le", "leq", "ge", "geq", "eq" or "neq".')
+
+        return pd.DataFrame(self._errors, columns=self.columns)
+
+    def _check_relatives(self,
+                         relatives: pd.DataFrame,
+                         frame: str,
+                         relative_column: str,
+                         applicant_ids: pd.Index,
+                         missing_message: str,
+                         unknown_message: str) -> None:
+        '''
+        Check the siblings or links DataFrame: it must have exactly the
+        applicant_id and relative_column columns, with registered ids.
+        '''
+        if not isinstance(relatives, pd.DataFrame):
+            self._add(frame, None, 'missing_frame', missing_message)
+            return
+        if (list(relatives.columns) != ['applicant_id', relative_column]) and \
+                (list(relatives.columns) != [relative_column, 'applicant_id']):
+            self._add(frame, None, 'unexpected_columns',
+                f'Unexpected column in {frame} DataFrame. Expected "applicant_id" and "{relative_column}".',
+                relatives.columns)
+            return
+        if applicant_ids is None:
+            return
+        for column in ['applicant_id', relative_column]:
+            self._check_registered(relatives[column], applicant_ids, frame,
+                                    unknown_message)
+
+    def get_fingerprint(self, **frames) -> str:
+        '''
+        Fingerprint of the inputs and of the rules that change the checks.
+
+        Args:
+            **frames: Inputs of validate
+
+        Returns:
+            str
+        '''
+        return get_fingerprint(frames,
+            version=VALIDATION_VERSION,
+            sibling_priority_activation=self.sibling_priority_activation,
+            linked_postulation_activation=self.linked_postulation_activation,
+            secured_enrollment_activation=self.secured_enrollment_activation)
+
+    def validate_cached(self, **frames) -> pd.DataFrame:
+        '''
+        As validate, but inputs whose fingerprint is in cache_dir are not
+        checked again, and the fingerprint of valid inputs is added to it.
+
+        Args:
+            **frames: Inputs of validate
+
+        Returns:
+            pd.DataFrame: As in validate. Empty if the inputs were cached.
+        '''
+        if self.cache_dir is None:
+            return self.validate(**frames)
+        path = os.path.join(self.cache_dir, self.get_fingerprint(**frames))
+        if os.path.exists(path):
+            return pd.DataFrame(columns=self.columns)
+        errors = self.validate(**frames)
+        if len(errors) == 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            open(path, 'w').close()
+        return errors
@@ -0,0 +1,401 @@
+'''
+File: waitlist.py
+Company: Tether Education Inc.
+'''
+
+from typing import Any, Dict, Iterable, List, Tuple
+from array import array
+import numpy as np
+import pandas as pd
+
+
+class WaitlistStore:
+    '''
+    Columnar log of waitlist events shared by several programs. Each event
+    is a (program index, applicant index, priority) row, and a nan priority
+    removes the applicant from the program waitlist. Seeded entries are kept
+    in a separate log that survives reset, together with the length of the
+    matching log when they were written, so both logs are merged in the
+    order they were written.
+    The waitlist of a program is given by the last event of each applicant,
+    so writing during the matching is an append and the waitlists are built
+    only when they are read.
+    '''
+    def __init__(self, enabled: bool = True) -> None:
+        '''
+        Args:
+            enabled (bool): If False, events are not recorded and every
+                waitlist is empty.
+        '''
+        self.enabled = enabled
+        self.program_keys : List[Any] = []
+        self.applicant_ids : List[Any] = []
+        self._applicant_index : Dict[Any, int] = {}
+        self._reset_positions = []
+        self._seed_log = self._new_log()
+        self._seed_positions = array('q')
+        self._n_seeds_before_reset = 0
+        self._match_log = self._new_log()
+        self._state = None
+        self._seeds = None
+
+    @staticmethod
+    def _new_log() -> Tuple[array, array, array]:
+        return (array('q'), array('q'), array('d'))
+
+    @property
+    def n_events(self) -> int:
+        return len(self._match_log[0])
+
+    def add_program(self, key: Any) -> int:
+        '''
+        Register a program.
+
+        Args:
+            key (Any): Program key, usually (program_id, quota_id)
+
+        Returns:
+            int: Program index in the store
+        '''
+        self.program_keys.append(key)
+        self._reset_positions.append(0)
+        self._state = None
+        return len(self.program_keys) - 1
+
+    def add_applicants(self, applicant_ids: Iterable) -> None:
+        '''
+        Register applicant_ids in bulk, so events do not need to register
+        them one by one.
+
+        Args:
+            applicant_ids (Iterable): applicant_ids
+        '''
+        for applicant_id in applicant_ids:
+            self._get_applicant_index(applicant_id)
+
+    def _get_applicant_index(self, applicant_id: Any) -> int:
+        index = self._applicant_index.get(applicant_id)
+        if index is None:
+            index = self._applicant_index[applicant_id] = \
+                len(self.applicant_ids)
+            self.applicant_ids.append(applicant_id)
+        return index
+
+    def _append(
+            self,
+            log: Tuple[array, array, array],
+            program: int,
+            applicant_ids: Iterable,
+            priorities: Iterable) -> None:
+        programs, applicants, scores = log
+        n_events = len(applicants)
+        applicants.extend([self._get_applicant_index(applicant_id)
+            for applicant_id in applicant_ids])
+        scores.extend(priorities)
+        programs.extend([program]*(len(applicants) - n_events))
+        if log is self._seed_log:
+            self._seed_positions.extend(
+                [self.n_events]*(len(applicants) - n_events))
+            self._seeds = None
+        self._state = None
+
+    def add(
+            self,
+            program: int,
+            applicant_id: Any,
+            priority: float) -> None:
+        '''
+        Append one waitlist event.
+
+        Args:
+            program (int): Program index
+            applicant_id (Any): applicant_id
+            priority (float): Priority in the waitlist
+        '''
+        if not self.enabled:
+            return
+        programs, applicants, priorities = self._match_log
+        programs.append(program)
+        applicants.append(self._get_applicant_index(applicant_id))
+        priorities.append(priority)
+        self._state = None
+
+    def add_many(
+            self,
+            program: int,
+            applicant_ids: Iterable,
+            priorities: Iterable) -> None:
+        '''
+        Append several waitlist events of the same program, in order.
+
+        Args:
+            program (int): Program index
+            applicant_ids (Iterable): applicant_ids
+            priorities (Iterable[float]): Priorities in the waitlist
+        '''
+        if self.enabled:
+            self._append(self._match_log, program, applicant_ids, priorities)
+
+    def add_events(
+            self,
+            programs: np.ndarray,
+            applicant_ids: Iterable,
+            priorities: np.ndarray) -> None:
+        '''
+        Append waitlist events of several programs, in order.
+
+        Args:
+            programs (np.ndarray): Program index of each event
+            applicant_ids (Iterable): applicant_id of each event
+            priorities (np.ndarray): Priority of each event
+        '''
+        if not self.enabled:
+            return
+        log_programs, applicants, log_priorities = self._match_log
+        log_programs.frombytes(
+            np.ascontiguousarray(programs, dtype=np.int64).tobytes())
+        applicants.extend([self._get_applicant_index(applicant_id)
+            for applicant_id in applicant_ids])
+        log_priorities.frombytes(
+            np.ascontiguousarray(priorities, dtype=np.float64).tobytes())
+        self._state = None
+
+    def get_events(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Events of the current matching, in order, without the ones written
+        before the last reset of their program, as taken by add_events.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Program index,
+            applicant_id and priority of each event
+        '''
+        programs, applicants, priorities = self._to_numpy(self._match_log)
+        valid = np.arange(len(programs)) >= np.array(self._reset_positions,
+            dtype=np.int64)[programs] if len(programs) > 0 else \
+            np.zeros(0, dtype=bool)
+        applicant_ids = np.empty(len(self.applicant_ids), dtype=object)
+        applicant_ids[:] = self.applicant_ids
+        return (programs[valid], applicant_ids[applicants[valid]],
+                priorities[valid])
+
+    def seed(
+            self,
+            program: int,
+            applicant_ids: Iterable,
+            priorities: Iterable) -> None:
+        '''
+        Add entries that are kept by reset.
+
+        Args:
+            program (int): Program index
+            applicant_ids (Iterable): applicant_ids
+            priorities (Iterable[float]): Priorities in the waitlist
+        '''
+        if self.enabled:
+            self._append(self._seed_log, program, applicant_ids, priorities)
+
+    def remove(
+            self,
+            program: int,
+            applicant_id: Any) -> None:
+        '''
+        Remove applicant from the waitlist of program until the next reset.
+        Seeded entries come back after reset.
+
+        Args:
+            program (int): Program index
+            applicant_id (Any): applicant_id
+        '''
+        self.add(program, applicant_id, np.nan)
+
+    def drop(
+            self,
+            program: int,
+            applicant_id: Any) -> None:
+        '''
+        Remove applicant from the waitlist of program, including the seeded
+        entry.
+
+        Args:
+            program (int): Program index
+            applicant_id (Any): applicant_id
+        '''
+        if not self.enabled:
+            return
+        self._append(self._seed_log, program, [applicant_id], [np.nan])
+        self.add(program, applicant_id, np.nan)
+
+    def restore_seed(
+            self,
+            program: int,
+            applicant_id: Any) -> None:
+        '''
+        Leave only the seeded entry of applicant in program, if any, dropping
+        the ones written during the current matching.
+
+        Args:
+            program (int): Program index
+            applicant_id (Any): applicant_id
+        '''
+        if not self.enabled:
+            return
+        if self._seeds is None:
+            programs, applicants, priorities = self._to_numpy(self._seed_log)
+            self._seeds = dict(zip(zip(programs.tolist(), applicants.tolist()),
+                                    priorities.tolist()))
+        applicant = self._applicant_index.get(applicant_id)
+        self.add(program, applicant_id,
+            self._seeds.get((program, applicant), np.nan))
+
+    def remove_applicant(
+            self,
+            applicant_id: Any,
+            keep_seed: bool = False) -> None:
+        '''
+        Remove applicant from every waitlist where he/she has an entry.
+
+        Args:
+            applicant_id (Any): applicant_id
+            keep_seed (bool): Leave the seeded entries, as restore_seed does
+        '''
+        applicant = self._applicant_index.get(applicant_id)
+        if (not self.enabled) or (applicant is None):
+            return
+        programs = set()
+        for log in (self._seed_log, self._match_log):
+            log_programs, log_applicants, _ = self._to_numpy(log)
+            programs.update(log_programs[log_applicants == applicant].tolist())
+        for program in sorted(programs):
+            if keep_seed:
+                self.restore_seed(program, applicant_id)
+            else:
+                self.drop(program, applicant_id)
+
+    @staticmethod
+    def _to_numpy(log: Tuple[array, array, array]) -> Tuple:
+        # Copies, since arrays can not grow while a buffer view is alive
+        return tuple(np.array(column) for column in log)
+
+    def reset_program(self, program: int) -> None:
+        '''
+        Forget the events of the current matching of a program.
+
+        Args:
+            program (int): Program index
+        '''
+        self._reset_positions[program] = self.n_events
+        self._state = None
+
+    def reset(self) -> None:
+        '''
+        Forget the events of the current matching of every program, keeping
+        the seeded entries.
+        '''
+        self._match_log = self._new_log()
+        self._n_seeds_before_reset = len(self._seed_positions)
+        self._reset_positions = [0]*len(self.program_keys)
+        self._state = None
+
+    def merge(
+            self,
+            other: 'WaitlistStore',
+            start: int = 0) -> None:
+        '''
+        Append the events of other from position start. Both stores must
+        share program indexes, as copies of the same store do.
+
+        Args:
+            other (WaitlistStore): Store with the events to add
+            start (int): First event of other to add
+        '''
+        if not self.enabled:
+            return
+        programs, applicants, priorities = other._match_log
+        applicant_ids = other.applicant_ids
+        self._match_log[0].extend(programs[start:])
+        self._match_log[1].extend([self._get_applicant_index(
+            applicant_ids[applicant]) for applicant in applicants[start:]])
+        self._match_log[2].extend(priorities[start:])
+        self._state = None
+
+    def _get_state(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Current waitlists as columns sorted by program and priority, with
+        ties in the order the entries were written.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: program, applicant and
+            priority of every entry.
+        '''
+        if self._state is not None:
+            return self._state['columns']
+        columns = [self._to_numpy(log)
+            for log in (self._seed_log, self._match_log)]
+        n_seeds = len(columns[0][0])
+        programs, applicants, priorities = [np.concatenate(column)
+            for column in zip(*columns)]
+        # Events written before the last reset of their program are ignored
+        positions = np.arange(len(programs)) - n_seeds
+        reset_positions = np.array(self._reset_positions, dtype=np.int64)
+        valid = (positions < 0) | (positions >= reset_positions[programs]) \
+            if len(programs) > 0 else np.zeros(0, dtype=bool)
+        # A seed written when the matching log had p events goes between
+        # events p - 1 and p. Seeds written before reset go first.
+        seed_positions = np.array(self._seed_positions, dtype=np.int64)
+        seed_positions[:self._n_seeds_before_reset] = -1
+        order = np.concatenate([2*seed_positions, 2*positions[n_seeds:] + 1])
+        events = np.flatnonzero(valid)
+        events = events[np.argsort(order[events], kind='stable')]
+
+        # Last event of each (program, applicant)
+        keys = programs[events]*(len(self.applicant_ids) + 1) + \
+            applicants[events]
+        _, last = np.unique(keys[::-1], return_index=True)
+        events = events[len(events) - 1 - last]
+        events = events[~np.isnan(priorities[events])]
+        events = events[np.lexsort((order[events], priorities[events],
+                                    programs[events]))]
+        columns = (programs[events], applicants[events], priorities[events])
+        self._state = {'columns':columns,
+            'starts':np.searchsorted(columns[0],
+                np.arange(len(self.program_keys) + 1)),
+            'waitlists':{}}
+        return columns
+
+    def get_waitlist(self, program: int) -> Dict[Any, float]:
+        '''
+        Waitlist of a program as a dict, in priority order.
+
+        Args:
+            program (int): Program index
+
+        Returns:
+            Dict[Any, float]: {applicant_id: priority}
+        '''
+        _, applicants, priorities = self._get_state()
+        waitlists = self._state['waitlists']
+        if program not in waitlists:
+            start, end = self._state['starts'][program:program + 2]
+            waitlists[program] = dict(zip(
+                [self.applicant_ids[applicant]
+                    for applicant in applicants[start:end].tolist()],
+                priorities[start:end].tolist()))
+        return dict(waitlists[program])
+
+    def get_waitlists(self) -> pd.DataFrame:
+        '''
+        Every waitlist ranked in a single DataFrame.
+
+        Returns:
+            pd.DataFrame: "program", "applicant_id", "priority" and
+            "waitlist_rank", starting at 1 for each program. Ties keep the
+            order the entries were written.
+        '''
+        programs, applicants, priorities = self._get_state()
+        starts = self._state['starts']
+        applicant_ids = np.empty(len(self.applicant_ids), dtype=object)
+        applicant_ids[:] = self.applicant_ids
+        return pd.DataFrame({'program':programs,
+            'applicant_id':applicant_ids[applicants],
+            'priority':priorities,
+            'waitlist_rank':np.arange(len(programs)) - starts[programs] + 1})
@@ -0,0 +1,189 @@
+'''
+File: synthetic.py
+Company: Tether Education Inc.
+'''
+
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+
+def generate_market(
+        n_applicants: int = 1000,
+        n_programs: int = 100,
+        n_grades: int = 1,
+        list_length: float = 4,
+        max_list_length: int = 10,
+        n_quotas: int = 2,
+        n_special_assignments: int = 1,
+        special_share: float = 0.1,
+        sibling_share: float = 0.2,
+        link_share: float = 0.3,
+        se_share: float = 0.1,
+        concentration: float = 1.0,
+        capacity_ratio: float = 1.0,
+        n_priority_profiles: int = 5,
+        random_state = None) -> Dict[str, pd.DataFrame]:
+    '''
+    Synthetic market with the DataFrames expected by da(). Applicants and
+    programs are identified by ints from 1. Program k has grade
+    k % n_grades + 1 and belongs to institution k // n_grades, so an
+    institution offers one program per grade. Each applicant ranks distinct
+    programs of its grade and applies to every quota of them.
+
+    Args:
+        n_applicants (int): Number of applicants
+        n_programs (int): Number of programs, at least n_grades
+        n_grades (int): Number of grades
+        list_length (float): Mean number of ranked programs, at least 1
+        max_list_length (int): Maximum number of ranked programs
+        n_quotas (int): Quotas of each program
+        n_special_assignments (int): Special assignment types, each one with
+            its special_i_vacancies column
+        special_share (float): Share of applicants of a special assignment
+            type, and of the vacancies reserved for them
+        sibling_share (float): Share of applicants with a sibling in the
+            market. Siblings come in pairs.
+        link_share (float): Share of sibling pairs that apply as a block
+        se_share (float): Share of applicants with secured enrollment in one
+            of the programs they rank
+        concentration (float): Exponent of the Zipf law of program
+            popularity. 0 spreads the demand uniformly and larger values
+            concentrate it on the most popular programs, which may leave
+            lists shorter than drawn.
+        capacity_ratio (float): Expected vacancies per applicant of the grade
+        n_priority_profiles (int): Priority profiles. The last one is the
+            sibling profile, with the highest priority in every quota, to
+            which every profile transitions.
+        random_state: Seed or np.random.Generator. The same seed gives the
+            same market.
+
+    Returns:
+        Dict[str, pd.DataFrame]: "vacancies", "applicants", "applications",
+        "priority_profiles", "quota_order", "siblings" and "links".
+    '''
+    if n_programs < n_grades:
+        raise ValueError('Expected at least one program per grade.')
+    rng = np.random.default_rng(random_state)
+    quotas = np.arange(1, n_quotas + 1)
+    program_ids = np.arange(1, n_programs + 1)
+    program_grade = np.arange(n_programs) % n_grades + 1
+    program_institution = np.arange(n_programs) // n_grades + 1
+    applicant_ids = np.arange(1, n_applicants + 1)
+    applicant_grade = rng.integers(1, n_grades + 1, n_applicants)
+
+    # Ranked programs: popularity weighted draws, keeping the first
+    # occurrence of each program up to the drawn list length
+    n_draws = 2*max_list_length
+    lengths = np.minimum(1 + rng.poisson(list_length - 1, n_applicants),
+                        max_list_length)
+    draws = np.zeros((n_applicants, n_draws), dtype=np.int64)
+    for grade in range(1, n_grades + 1):
+        programs = np.flatnonzero(program_grade == grade)
+        applicants = np.flatnonzero(applicant_grade == grade)
+        popularity = rng.permutation(
+            np.arange(1, len(programs) + 1, dtype=float)**-concentration)
+        cumulative = np.cumsum(popularity)/popularity.sum()
+        draws[applicants] = programs[np.minimum(np.searchsorted(cumulative,
+            rng.random((len(applicants), n_draws))), len(programs) - 1)]
+    order = np.argsort(draws, axis=1, kind='stable')
+    sorted_draws = np.take_along_axis(draws, order, axis=1)
+    first = np.ones(draws.shape, dtype=bool)
+    np.put_along_axis(first, order[:, 1:],
+                    sorted_draws[:, 1:] != sorted_draws[:, :-1], axis=1)
+    ranking = np.cumsum(first, axis=1)
+    keep = first & (ranking <= lengths[:, None])
+    option_applicant = np.repeat(np.arange(n_applicants), keep.sum(axis=1))
+    option_program = draws[keep]
+    option_ranking = ranking[keep]
+    n_options = len(option_program)
+
+    # Priority profile 1..n-1 are drawn and the last one is the sibling one
+    profile_priorities = rng.integers(2, n_quotas + 3,
+                                    (n_priority_profiles, n_quotas))
+    profile_priorities[-1] = 1
+    priority_profiles = pd.DataFrame(profile_priorities,
+        columns=[f'priority_q{quota}' for quota in quotas])
+    priority_profiles.insert(0, 'priority_profile',
+                            np.arange(1, n_priority_profiles + 1))
+    priority_profiles['priority_profile_sibling_transition'] = \
+        n_priority_profiles
+    option_profile = rng.integers(1, max(n_priority_profiles - 1, 1) + 1,
+                                n_options)
+
+    applications = pd.DataFrame({
+        'applicant_id':np.repeat(applicant_ids[option_applicant], n_quotas),
+        'program_id':np.repeat(program_ids[option_program], n_quotas),
+        'quota_id':np.tile(quotas, n_options),
+        'institution_id':np.repeat(program_institution[option_program],
+                                    n_quotas),
+        'ranking_program':np.repeat(option_ranking, n_quotas),
+        'priority_profile_program':np.repeat(option_profile, n_quotas),
+        'priority_number_quota':profile_priorities[
+            np.repeat(option_profile - 1, n_quotas),
+            np.tile(quotas - 1, n_options)],
+        'lottery_number_quota':rng.random(n_options*n_quotas)})
+
+    special_assignment = np.zeros(n_applicants, dtype=np.int64)
+    special = rng.random(n_applicants) < special_share
+    if n_special_assignments > 0:
+        special_assignment[special] = rng.integers(1,
+            n_special_assignments + 1, special.sum())
+    # Secured enrollment in a random ranked program
+    n_listed = np.bincount(option_applicant, minlength=n_applicants)
+    se = (rng.random(n_applicants) < se_share) & (n_listed > 0)
+    se_option = np.cumsum(n_listed)[se] - 1 - \
+        rng.integers(0, n_listed[se])
+    se_program_id = np.zeros(n_applicants, dtype=np.int64)
+    se_program_id[se] = program_ids[option_program[se_option]]
+    se_quota_id = np.zeros(n_applicants, dtype=np.int64)
+    se_quota_id[se] = rng.integers(1, n_quotas + 1, se.sum())
+    applicants = pd.DataFrame({'applicant_id':applicant_ids,
+        'grade_id':applicant_grade,
+        'special_assignment':special_assignment,
+        'secured_enrollment_program_id':se_program_id,
+        'secured_enrollment_quota_id':se_quota_id,
+        'applicant_characteristic_1':rng.integers(0, 3, n_applicants)})
+
+    expected_vacancies = capacity_ratio*np.bincount(applicant_grade,
+        minlength=n_grades + 1)[program_grade]/np.bincount(program_grade,
+        minlength=n_grades + 1)[program_grade]/n_quotas
+    expected_vacancies = np.repeat(expected_vacancies, n_quotas)
+    vacancies = pd.DataFrame({
+        'program_id':np.repeat(program_ids, n_quotas),
+        'quota_id':np.tile(quotas, n_programs),
+        'institution_id':np.repeat(program_institution, n_quotas),
+        'grade_id':np.repeat(program_grade, n_quotas),
+        'regular_vacancies':rng.poisson(expected_vacancies*(1 - special_share))})
+    for i in range(1, n_special_assignments + 1):
+        vacancies[f'special_{i}_vacancies'] = rng.poisson(
+            expected_vacancies*special_share/n_special_assignments)
+
+    # Quota order rules apply when there are quotas to reorder
+    reversed_order = {f'order_q{quota}':[n_quotas - quota + 1]*2
+                        for quota in quotas}
+    quota_order = pd.DataFrame({
+        'priority_profile':[min(2, n_priority_profiles),
+                            min(3, n_priority_profiles)],
+        'secured_enrollment_indicator':[False, True],
+        'secured_enrollment_quota_id_criteria':['==', '>='],
+        'secured_enrollment_quota_id_value':[0, 2],
+        'applicant_characteristic_1_criteria':['>=', '>='],
+        'applicant_characteristic_1_value':[1, 0],
+        **reversed_order})
+
+    n_pairs = int(sibling_share*n_applicants)//2
+    pairs = applicant_ids[rng.permutation(n_applicants)[:2*n_pairs]].reshape(
+        n_pairs, 2)
+    siblings = pd.DataFrame(np.concatenate([pairs, pairs[:, ::-1]]),
+                            columns=['applicant_id', 'sibling_id'])
+    linked = pairs[rng.random(n_pairs) < link_share]
+    links = pd.DataFrame(np.concatenate([linked, linked[:, ::-1]]),
+                        columns=['applicant_id', 'linked_id'])
+    return {'vacancies':vacancies,
+            'applicants':applicants,
+            'applications':applications,
+            'priority_profiles':priority_profiles,
+            'quota_order':quota_order,
+            'siblings':siblings,
+            'links':links}
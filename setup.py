@@ -10,6 +10,9 @@ setuptools.setup(
         'pandas>=1.2.5',
         'numpy>=1.20.2'
     ],
+    extras_require={
+        'numba': ['numba']
+    },
     author="TetherEducation",
     author_email="benjamin@tether.education",
     description='Implementation of the Deferred Acceptance algorithm (Galey-Shapley) for school choice.',
@@ -0,0 +1,262 @@
+from unittest import TestCase, main
+from faker import Faker
+from schoolchoice_da.entities import Applicant, ApplicantStore, ApplicantMap
+import pickle
+import random
+import numpy as np
+import pandas as pd
+
+
+class ApplicantStoreTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        programs = [str(self.fake.uuid4()) for i in range(5)]
+        rows = []
+        applications = []
+        for i in range(self.fake.random_int(5,20)):
+            applicant_id = f'A{i}'
+            postulation = []
+            for ranking,program_id in enumerate(random.sample(programs,
+                    self.fake.random_int(0,4))):
+                # Applications to several quotas of a program share ranking
+                for quota_id in sorted(random.sample([1,2],
+                        self.fake.random_int(1,2))):
+                    postulation.append({'applicant_id':applicant_id,
+                        'ranking_program':ranking+1,
+                        'vpostulation':program_id,
+                        'vinstitution_id':program_id[:4],
+                        'vquota_id':quota_id,
+                        'vpostulation_scores':random.random(),
+                        'vpriorities':self.fake.random_int(1,4),
+                        'vpriority_profile':self.fake.random_int(1,4)})
+            applications.extend(postulation)
+            rows.append({'applicant_id':applicant_id,
+                        'grade_id':self.fake.random_int(1,3),
+                        'siblings':np.array([]),
+                        'links':np.array([]),
+                        'applicant_characteristic_1':self.fake.random_int(0,2),
+                        **{column:np.array([application[column] for
+                            application in postulation],dtype=object)
+                            if postulation else np.nan
+                            for column in ApplicantStore.postulation_columns}})
+        self.rows = rows
+        self.applicants = pd.DataFrame(rows)
+        self.applications = pd.DataFrame(applications,
+            columns=['applicant_id','ranking_program']+
+                    ApplicantStore.postulation_columns).sample(frac=1)
+        self.store = ApplicantStore.from_applications(
+            self.applicants['applicant_id'],self.applications)
+
+    def test_layout(self):
+        self.assertEqual(len(self.store),len(self.rows))
+        lengths = [0 if isinstance(row['vpostulation'],float)
+                    else len(row['vpostulation']) for row in self.rows]
+        self.assertEqual(np.diff(self.store.offsets).tolist(),lengths)
+        columns = self.store.columns
+        self.assertEqual(columns['vpostulation_scores'].dtype,np.float64)
+        self.assertEqual(columns['vpriorities'].dtype,np.int64)
+        self.assertEqual(columns['vpriority_profile'].dtype,np.int64)
+        # Ids are shared objects
+        postulation = columns['vpostulation']
+        for program_id in set(postulation.tolist()):
+            self.assertEqual(len({id(value) for value in
+                                postulation[postulation==program_id]}),1)
+        self.assertGreater(self.store.nbytes,0)
+
+    def test_from_applications(self):
+        # Each slice follows ranking_program and vquota_id, whatever the
+        # order of the applications
+        for i,row in enumerate(self.rows):
+            postulation = self.store.get_postulation(i)
+            for column in ApplicantStore.postulation_columns:
+                self.assertEqual(postulation[column].tolist(),
+                    [] if isinstance(row['vpostulation'],float)
+                    else row[column].tolist())
+
+        # Applications of unknown applicants are dropped
+        unknown = self.applications.iloc[:1].assign(applicant_id='unknown')
+        applications = pd.concat([self.applications,unknown]).sample(frac=1)
+        store = ApplicantStore.from_applications(
+            self.applicants['applicant_id'],applications)
+        self.assertEqual(store.offsets.tolist(),self.store.offsets.tolist())
+        for column in ApplicantStore.postulation_columns:
+            self.assertEqual(store.columns[column].tolist(),
+                            self.store.columns[column].tolist())
+
+        # Slices of a subset of applicants, in the given order
+        applicant_ids = self.applicants['applicant_id'].iloc[::-2]
+        store = ApplicantStore.from_applications(applicant_ids,
+                                                self.applications)
+        self.assertEqual(len(store),len(applicant_ids))
+        for i,position in enumerate(applicant_ids.index.tolist()):
+            self.assertEqual(store.get_postulation(i)['vpostulation'].tolist(),
+                self.store.get_postulation(position)['vpostulation'].tolist())
+
+        empty = ApplicantStore.from_applications(
+            self.applicants['applicant_id'],self.applications.iloc[:0])
+        self.assertEqual(empty.offsets.tolist(),[0]*(len(self.rows)+1))
+
+    def test_get_applicants(self):
+        applicants = self.store.get_applicants(
+            self.applicants.drop(columns=ApplicantStore.postulation_columns),
+            ['applicant_characteristic_1'])
+        for i,(row,applicant) in enumerate(zip(self.rows,applicants)):
+            self.assertIsInstance(applicant,Applicant)
+            self.assertEqual(applicant.id,row['applicant_id'])
+            self.assertEqual(applicant.applicant_characteristic_1,
+                            row['applicant_characteristic_1'])
+            self.assertFalse(hasattr(applicant,'applicant_characteristic_2'))
+            if isinstance(row['vpostulation'],float):
+                self.assertTrue(applicant.match)
+                self.assertEqual(len(applicant.vpostulation),0)
+                continue
+            self.assertEqual(applicant.vpostulation.tolist(),
+                            row['vpostulation'].tolist())
+            self.assertTrue(np.shares_memory(
+                applicant.get_original_vpostulation(),
+                self.store.columns['vpostulation']))
+            self.assertTrue(np.allclose(applicant.vscores,
+                row['vpostulation_scores'].astype(float) +
+                row['vpriorities'].astype(float)))
+            self.assertEqual(applicant.vpriorities,
+                dict(zip(zip(row['vpostulation'],row['vquota_id']),
+                        row['vpriorities'])))
+
+            # Changes during the matching do not reach the store
+            store_quotas = self.store.get_postulation(i)['vquota_id'].copy()
+            applicant.reorder_postulation_by_quota(applicant.vpostulation[0],
+                                                    [2,1])
+            key = (applicant.vpostulation[0],applicant.vquota_id[0])
+            applicant.vpriorities[key] = 10
+            self.assertEqual(applicant.vpriorities[key],10)
+            self.assertTrue((self.store.get_postulation(i)['vquota_id'] ==
+                            store_quotas).all())
+            self.assertNotEqual(applicant.get_original_vpriorities()[key],10)
+
+            copy = pickle.loads(pickle.dumps(applicant))
+            self.assertEqual(copy.id,applicant.id)
+            self.assertEqual(copy.applicant_characteristic_1,
+                            applicant.applicant_characteristic_1)
+            self.assertEqual(copy.vpriorities,applicant.vpriorities)
+
+    def test_applicant_map(self):
+        rows = self.applicants.drop(columns=ApplicantStore.postulation_columns)
+        applicant_map = ApplicantMap()
+        applicant_map.add_store(self.store,rows,['applicant_characteristic_1'])
+        ids = rows['applicant_id'].tolist()
+        self.assertEqual(list(applicant_map),ids)
+        self.assertTrue(all(applicant_map.get_created(applicant_id) is None
+                            for applicant_id in ids))
+        postulations = applicant_map.get_original_vpostulations(ids)
+        for row,postulation in zip(self.rows,postulations):
+            self.assertEqual(postulation.tolist(),[] if isinstance(
+                row['vpostulation'],float) else row['vpostulation'].tolist())
+
+        # Only the applicants read are created, once
+        some_ids = random.sample(ids,len(ids)//2)
+        applicants = applicant_map.get_many(some_ids+some_ids[:1])
+        self.assertEqual([applicant.id for applicant in applicants],
+                        some_ids+some_ids[:1])
+        self.assertIs(applicants[0],applicants[-1])
+        for applicant_id in ids:
+            created = applicant_map.get_created(applicant_id)
+            self.assertEqual(created is not None,applicant_id in some_ids)
+        self.assertIs(applicant_map[some_ids[0]],applicants[0])
+
+        # Applicants of another map replace the ones with the same id, in
+        # their place and without being created
+        reversed_applicants = self.applicants.iloc[::-1]
+        other = ApplicantMap()
+        other.add_store(ApplicantStore.from_applications(
+            reversed_applicants['applicant_id'],self.applications),
+            reversed_applicants.drop(
+            columns=ApplicantStore.postulation_columns), [])
+        applicant_map.update(other)
+        self.assertEqual(list(applicant_map),ids)
+        self.assertIsNone(applicant_map.get_created(some_ids[0]))
+        for row,applicant in zip(self.rows,applicant_map.values()):
+            self.assertEqual(applicant.id,row['applicant_id'])
+            self.assertEqual(applicant.get_original_vpostulation().tolist(),
+                [] if isinstance(row['vpostulation'],float)
+                else row['vpostulation'].tolist())
+            self.assertFalse(hasattr(applicant,'applicant_characteristic_1'))
+
+    def test_release(self):
+        rows = self.applicants.drop(columns=ApplicantStore.postulation_columns)
+        applicant_map = ApplicantMap()
+        applicant_map.add_store(self.store,rows,[])
+        ids = rows['applicant_id'].tolist()
+        applicants = applicant_map.get_many(ids)
+        for applicant in applicants:
+            applicant.option_n = 1
+            applicant.match = True
+        changed, pinned = applicants[0], applicants[1]
+        changed.reorder_postulation([],None)
+        applicant_map.pin([pinned])
+        applicant_map.release(ids)
+
+        # Only the applicants that cannot be created again stay alive
+        for applicant_id in ids:
+            self.assertEqual(applicant_map.get_created(applicant_id) is not None,
+                            applicant_id in [changed.id,pinned.id])
+        state = applicant_map.get_match_state(applicant_map.get_positions(ids))
+        self.assertTrue((state['option_n']==1).all())
+        self.assertTrue(state['match'].all())
+        self.assertTrue(pd.isna(state['assigned_vacancy']).all())
+        # Released applicants are created again with their state
+        applicant = applicant_map[ids[-1]]
+        self.assertEqual((applicant.option_n,applicant.match),(1,True))
+
+        applicant_map.reset_matching()
+        state = applicant_map.get_match_state(applicant_map.get_positions(ids))
+        self.assertTrue((state['option_n']==0).all())
+        self.assertEqual(state['match'].tolist(),
+            [isinstance(row['vpostulation'],float) for row in self.rows])
+        self.assertEqual(applicant_map[ids[-1]].option_n,0)
+        self.assertFalse(changed.linked_postulation_bool)
+
+    def test_take(self):
+        rows = self.applicants.drop(columns=ApplicantStore.postulation_columns)
+        applicant_map = ApplicantMap()
+        applicant_map.add_store(self.store,rows,['applicant_characteristic_1'])
+        ids = rows['applicant_id'].tolist()
+        taken_ids = random.sample(ids,len(ids)//2)
+        # Slices of the store, pickled with the ids as integer codes
+        positions = applicant_map.get_positions(taken_ids)
+        store = pickle.loads(pickle.dumps(self.store.take(positions)))
+        state = self.store.take(positions).__getstate__()
+        self.assertEqual(state['columns']['vpostulation'].dtype,np.int64)
+        for i,position in enumerate(positions.tolist()):
+            for column,array in self.store.get_postulation(position).items():
+                self.assertEqual(store.get_postulation(i)[column].tolist(),
+                                array.tolist())
+
+        postulations = applicant_map.get_postulations(taken_ids)
+        copy = pickle.loads(pickle.dumps(postulations))
+        for name in ('columns', 'key_columns'):
+            for column, array in getattr(postulations, name).items():
+                self.assertEqual(getattr(copy, name)[column].tolist(),
+                                array.tolist())
+
+        # The map of taken_ids keeps their state, without creating them
+        applicant_map.set_match_state(taken_ids[:1],positions[:1],[1],[True],
+                                    [None],[np.nan],[None])
+        taken = pickle.loads(pickle.dumps(applicant_map.take(taken_ids)))
+        self.assertEqual(sorted(taken),sorted(taken_ids))
+        self.assertTrue(all(taken.get_created(applicant_id) is None
+                            for applicant_id in taken_ids))
+        self.assertEqual(taken[taken_ids[0]].option_n,1)
+        for applicant_id in taken_ids:
+            applicant = applicant_map[applicant_id]
+            copy = taken[applicant_id]
+            self.assertEqual(copy.vpostulation.tolist(),
+                            applicant.vpostulation.tolist())
+            self.assertEqual(copy.applicant_characteristic_1,
+                            applicant.applicant_characteristic_1)
+
+
+if __name__ == '__main__':
+    main()
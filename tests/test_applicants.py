@@ -1,4 +1,5 @@
 from unittest import TestCase, main
+from collections.abc import Mapping
 from faker import Faker
 from schoolchoice_da.entities import Applicant
 import random
@@ -42,9 +43,9 @@ class ApplicantTests(TestCase):
                                     se_quota_id = self.se_quota_id)
 
     def test_init_(self):
-        self.assertIsInstance(self.applicant.vpostulation_scores,dict)
-        self.assertIsInstance(self.applicant.vpriorities,dict)
-        self.assertIsInstance(self.applicant.vpriority_profile,dict)
+        self.assertIsInstance(self.applicant.vpostulation_scores,Mapping)
+        self.assertIsInstance(self.applicant.vpriorities,Mapping)
+        self.assertIsInstance(self.applicant.vpriority_profile,Mapping)
 
         applicant = Applicant(applicant_id = self.applicant_id,
                                 special_assignment = self.special_assignment,
@@ -58,9 +59,9 @@ class ApplicantTests(TestCase):
                                 vquota_id = float('nan'),
                                 vpriority_profile = float('nan'))
 
-        self.assertIsInstance(applicant.vpostulation_scores,dict)
-        self.assertIsInstance(applicant.vpriorities,dict)
-        self.assertIsInstance(applicant.vpriority_profile,dict)
+        self.assertIsInstance(applicant.vpostulation_scores,Mapping)
+        self.assertIsInstance(applicant.vpriorities,Mapping)
+        self.assertIsInstance(applicant.vpriority_profile,Mapping)
 
         self.assertTrue(applicant.match)
 
@@ -106,8 +107,10 @@ class ApplicantTests(TestCase):
         self.applicant.reasign_priority_profile(index,transition)
 
         self.applicant.reorder_postulation([1,2,3], random.sample(list(range(0,self.postulation_length)),self.postulation_length))
+        self.assertFalse(self.applicant.has_original_postulation())
 
         self.applicant._reset_matching_attributes()
+        self.assertTrue(self.applicant.has_original_postulation())
 
         self.assertEqual(self.applicant.option_n,0)
         self.assertIsNone(self.applicant.assigned_vacancy)
@@ -119,6 +122,78 @@ class ApplicantTests(TestCase):
         self.assertEqual(self.applicant.vpriority_profile,temp_vpriority_profile)
         self.assertEqual(self.applicant.vpriorities,temp_vpriorities)
 
+    def test_vscores(self):
+        def assert_aligned():
+            expected = [self.applicant.vpostulation_scores[key] +
+                        self.applicant.vpriorities[key] for key in
+                        zip(self.applicant.vpostulation,self.applicant.vquota_id)]
+            self.assertTrue(np.allclose(self.applicant.vscores,expected))
+        assert_aligned()
+
+        index = self.fake.random_int(0,self.postulation_length-1)
+        rand_profile = self.fake.random_digit()
+        transition = {'priority_profile_sibling_transition':{self.vpriority_profile[index]:rand_profile},\
+                    'priority_q{}'.format(self.vquota_id[index]): {rand_profile:self.fake.random_digit()} }
+        self.applicant.reasign_priority_profile(index,transition)
+        assert_aligned()
+
+        self.applicant.reorder_postulation([1,2,3], random.sample(list(range(0,self.postulation_length)),self.postulation_length))
+        assert_aligned()
+
+        if self.applicant._has_SE():
+            self.applicant.set_secured_place_as_last_postulation()
+            assert_aligned()
+
+        self.applicant.set_original_vpostulation_scores(
+            np.array([random.random() for i in range(self.postulation_length)]))
+        self.applicant._reset_matching_attributes()
+        assert_aligned()
+
+    def test_remove_original_postulation(self):
+        index = self.fake.random_int(0,self.postulation_length-1)
+        key = (self.vpostulation[index],self.vquota_id[index])
+        self.applicant.remove_original_postulation(*key)
+        # The current postulation is kept until reset
+        self.assertEqual(len(self.applicant.vpostulation),self.postulation_length)
+
+        self.applicant._reset_matching_attributes()
+        keep = [i for i in range(self.postulation_length) if i!=index]
+        self.assertTrue((self.applicant.vpostulation==self.vpostulation[keep]).all())
+        self.assertTrue((self.applicant.vquota_id==self.vquota_id[keep]).all())
+        self.assertNotIn(key,self.applicant.vpriorities)
+        self.assertEqual(len(self.applicant.vscores),len(keep))
+
+        for i in keep:
+            self.applicant.remove_original_postulation(self.vpostulation[i],
+                                                        self.vquota_id[i])
+        self.applicant._reset_matching_attributes()
+        self.assertTrue(self.applicant.match)
+        self.assertEqual(len(self.applicant.vpostulation),0)
+
+    def test_copy_on_write(self):
+        vquota_id = self.applicant.vquota_id
+        vscores = self.applicant.vscores
+        index = self.fake.random_int(0,self.postulation_length-1)
+        program_id = self.vpostulation[index]
+        ordered_quotas = [self.fake.random_int(10,20)
+            for i in range((self.vpostulation==program_id).sum())]
+        self.applicant.reorder_postulation_by_quota(program_id,ordered_quotas)
+
+        # Changes go to copies, the original arrays are kept
+        self.assertIsNot(self.applicant.vquota_id,vquota_id)
+        self.assertTrue((vquota_id==self.vquota_id).all())
+        self.assertTrue((self.applicant.vquota_id[
+            self.vpostulation==program_id]==ordered_quotas).all())
+        self.assertTrue(np.isnan(self.applicant.vscores[index]))
+        self.assertFalse(np.isnan(vscores).any())
+
+        # A reset does not copy
+        self.applicant._reset_matching_attributes()
+        self.assertIs(self.applicant.vquota_id,vquota_id)
+        self.assertIs(self.applicant.vscores,vscores)
+        self.applicant._reset_matching_attributes()
+        self.assertIs(self.applicant.vscores,vscores)
+
 
 
 
@@ -1,6 +1,7 @@
 from unittest import TestCase, main
 from faker import Faker
-from schoolchoice_da.entities import Applicant_Queue
+import random
+from schoolchoice_da.entities import Applicant_Queue, Heap_Applicant_Queue
 
 
 class ApplicantQueueTests(TestCase):
@@ -120,6 +121,73 @@ class ApplicantQueueTests(TestCase):
         self.assertFalse((score in self.queue_obj.vassigned_scores))
 
 
+    def test_last_admitted_score(self):
+        self.queue_obj.reset_assignment()
+        self.assertNotEqual(self.queue_obj.last_admitted_score,
+                            self.queue_obj.last_admitted_score)
+
+        for i in range(100):
+            applicants = self.queue_obj.vassigned_applicants
+            operation = random.choice(['add','reassign','remove'])
+            if (operation=='add') or (len(applicants)==0):
+                self.queue_obj.add_applicant_to_program(str(self.fake.uuid4()))
+                self.queue_obj.add_score_to_program(random.randint(0,20))
+            elif operation=='reassign':
+                self.queue_obj.reassign_applicants_and_scores(
+                    str(self.fake.uuid4()),random.randint(0,20),
+                    random.choice(applicants))
+            else:
+                self.queue_obj.remove_applicant_from_program(
+                    random.choice(applicants))
+            if len(self.queue_obj.vassigned_scores)>0:
+                self.assertEqual(self.queue_obj.last_admitted_score,
+                                max(self.queue_obj.vassigned_scores))
+
+
+class HeapApplicantQueueTests(ApplicantQueueTests):
+    """Same suite over the heap-backed queue"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.capacity = self.fake.random_int(0,100)
+
+        self.queue_obj = Heap_Applicant_Queue(self.capacity)
+        self.queue_obj.reset_assignment()
+
+
+    def test_same_evictions_as_list_queue(self):
+        capacity = self.fake.random_int(1,20)
+        list_queue = Applicant_Queue(capacity)
+        heap_queue = Heap_Applicant_Queue(capacity)
+        list_queue.reset_assignment()
+        heap_queue.reset_assignment()
+
+        # Few distinct scores so that ties are frequent
+        for i in range(200):
+            applicant_id = str(self.fake.uuid4())
+            score = random.randint(0,5)
+            cut_off_scores = [queue.get_cut_off_score()
+                for queue in (list_queue,heap_queue)]
+            self.assertEqual(cut_off_scores[0],cut_off_scores[1])
+            cut_off_score = cut_off_scores[0]
+            if cut_off_score==0:
+                for queue in (list_queue,heap_queue):
+                    queue.add_applicant_to_program(applicant_id)
+                    queue.add_score_to_program(score)
+            elif score < cut_off_score:
+                cut_off_applicants = [queue.get_cut_off_applicant(cut_off_score)
+                    for queue in (list_queue,heap_queue)]
+                self.assertEqual(cut_off_applicants[0],cut_off_applicants[1])
+                for queue in (list_queue,heap_queue):
+                    queue.reassign_applicants_and_scores(applicant_id,score,
+                        cut_off_applicants[0])
+
+        self.assertEqual(list_queue.vassigned_applicants,
+                            heap_queue.vassigned_applicants)
+        self.assertEqual(list_queue.vassigned_scores,
+                            heap_queue.vassigned_scores)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,184 @@
+from unittest import TestCase, main
+from faker import Faker
+from schoolchoice_da.entities import Applicant, Program, DeferredAcceptanceAlgorithm, ArrayDeferredAcceptanceAlgorithm, BatchDeferredAcceptanceAlgorithm
+from schoolchoice_da.entities.array_match import njit
+import random
+import numpy as np
+
+
+class ArrayDeferredAcceptanceAlgorithmTest(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.grade_id = self.fake.random_int(0,20)
+        self.n_programs = self.fake.random_int(1,8)
+        self.program_ids = [str(self.fake.uuid4()) for i in range(self.n_programs)]
+        self.institution_ids = [str(self.fake.uuid4()) for i in range(self.n_programs)]
+        self.capacities = [self.fake.random_int(0,6) for i in range(self.n_programs)]
+        self.applicants_specs = []
+        for i in range(self.fake.random_int(1,60)):
+            postulation = random.sample(range(self.n_programs),
+                                        self.fake.random_int(1,self.n_programs))
+            # Few distinct scores so that ties are frequent
+            self.applicants_specs.append((str(self.fake.uuid4()), postulation,
+                [random.randint(0,3)/2 for j in postulation]))
+
+    def get_market(self):
+        programs = {}
+        for program_id, institution_id, capacity in zip(self.program_ids,
+                self.institution_ids, self.capacities):
+            programs[(program_id,0)] = Program(program_id = program_id,
+                                            grade_id = self.grade_id,
+                                            quota_id = 0,
+                                            institution_id = institution_id,
+                                            regular_capacity = capacity,
+                                            special_vacancies = {})
+        applicants = {}
+        for applicant_id, postulation, scores in self.applicants_specs:
+            applicants[applicant_id] = Applicant(applicant_id = applicant_id,
+                                special_assignment = 0,
+                                grade_id = self.grade_id,
+                                links = [],
+                                siblings = [],
+                                vpostulation = np.array([self.program_ids[j] for j in postulation]),
+                                vpostulation_scores = np.array(scores),
+                                vinstitution_id = np.array([self.institution_ids[j] for j in postulation]),
+                                vpriorities = np.array([1]*len(postulation)),
+                                vquota_id = np.array([0]*len(postulation)),
+                                vpriority_profile = np.array([1]*len(postulation)))
+        return applicants, programs
+
+    def assert_same_matching(self, algorithm):
+        applicants, programs = self.get_market()
+        object_algorithm = DeferredAcceptanceAlgorithm()
+        object_algorithm.run(applicants, programs)
+
+        array_applicants, array_programs = self.get_market()
+        algorithm.run(array_applicants, array_programs)
+        self.assertEqual(object_algorithm.stats, algorithm.stats)
+
+        for key, applicant in applicants.items():
+            array_applicant = array_applicants[key]
+            self.assertEqual(applicant.match, array_applicant.match)
+            self.assertEqual(applicant.option_n, array_applicant.option_n)
+            if applicant.assigned_vacancy is None:
+                self.assertIsNone(array_applicant.assigned_vacancy)
+            else:
+                self.assertEqual(applicant.assigned_vacancy.program_id,
+                    array_applicant.assigned_vacancy.program_id)
+        for key, program in programs.items():
+            array_program = array_programs[key]
+            self.assertEqual([applicant.id for applicant in
+                program.regular_assignment.vassigned_applicants],
+                [applicant.id for applicant in
+                array_program.regular_assignment.vassigned_applicants])
+            self.assertEqual(program.regular_assignment.vassigned_scores,
+                array_program.regular_assignment.vassigned_scores)
+            self.assertEqual(program.waitlist_dict, array_program.waitlist_dict)
+
+    def test_same_matching_as_object_engine(self):
+        self.assert_same_matching(ArrayDeferredAcceptanceAlgorithm(compiled=False))
+
+    def test_same_matching_as_object_engine_compiled(self):
+        if njit is None:
+            self.skipTest('numba is not installed')
+        self.assert_same_matching(ArrayDeferredAcceptanceAlgorithm(compiled=True))
+
+    def test_batch_same_matching_with_distinct_scores(self):
+        self.applicants_specs = [(applicant_id, postulation,
+            [random.random() for j in postulation])
+            for applicant_id, postulation, scores in self.applicants_specs]
+        applicants, programs = self.get_market()
+        object_algorithm = DeferredAcceptanceAlgorithm()
+        object_algorithm.run(applicants, programs)
+
+        batch_applicants, batch_programs = self.get_market()
+        batch_algorithm = BatchDeferredAcceptanceAlgorithm()
+        batch_algorithm.run(batch_applicants, batch_programs)
+        # Proposals only depend on the final matching
+        stats, batch_stats = object_algorithm.stats, batch_algorithm.stats
+        self.assertEqual(stats['proposals'], batch_stats['proposals'])
+        self.assertEqual(stats['rejections'] + stats['evictions'],
+            batch_stats['rejections'] + batch_stats['evictions'])
+        self.assertLessEqual(batch_stats['longest_chain'],
+                            batch_stats['proposals'])
+
+        for key, applicant in applicants.items():
+            batch_applicant = batch_applicants[key]
+            self.assertEqual(applicant.match, batch_applicant.match)
+            self.assertEqual(applicant.option_n, batch_applicant.option_n)
+            if applicant.assigned_vacancy is None:
+                self.assertIsNone(batch_applicant.assigned_vacancy)
+            else:
+                self.assertEqual(applicant.assigned_vacancy.program_id,
+                    batch_applicant.assigned_vacancy.program_id)
+        for key, program in programs.items():
+            batch_program = batch_programs[key]
+            self.assertEqual(sorted(program.regular_assignment.vassigned_scores),
+                batch_program.regular_assignment.vassigned_scores)
+            self.assertEqual(program.waitlist_dict, batch_program.waitlist_dict)
+
+    def test_batch_tied_scores_error(self):
+        program = self.fake.random_int(0, self.n_programs-1)
+        self.applicants_specs = [(str(self.fake.uuid4()), [program], [0.5])
+                                for i in range(2)]
+        applicants, programs = self.get_market()
+        self.assertRaises(ValueError, BatchDeferredAcceptanceAlgorithm().run,
+                        applicants, programs)
+
+        # Ties with the applicants held by a queue also raise
+        self.capacities[program] = 1
+        applicants, programs = self.get_market()
+        first_id, second_id = list(applicants)
+        algorithm = BatchDeferredAcceptanceAlgorithm()
+        algorithm.run({first_id:applicants[first_id]}, programs)
+        self.assertTrue(applicants[first_id].match)
+        self.assertRaises(ValueError, algorithm.run,
+                        {second_id:applicants[second_id]}, programs)
+
+    def test_compiled_loop_stats(self):
+        # Without numba the compiled loop runs in Python
+        applicants, programs = self.get_market()
+        algorithm = ArrayDeferredAcceptanceAlgorithm(compiled=False)
+        market = algorithm.encode_market(applicants, programs)
+        result = algorithm.run_arrays(market)
+        compiled_result = algorithm.run_compiled(market)
+        self.assertEqual(result[4], compiled_result[4])
+        self.assertEqual(result[5], compiled_result[5])
+        self.assertEqual(result[5]['rejections'] + result[5]['evictions'],
+                        len(result[4]))
+
+    def test_held_applicants_can_be_rejected(self):
+        applicants, programs = self.get_market()
+        first_applicants = dict(list(applicants.items())[:len(applicants)//2])
+        second_applicants = dict(list(applicants.items())[len(applicants)//2:])
+        DeferredAcceptanceAlgorithm().run(first_applicants, programs)
+        DeferredAcceptanceAlgorithm().run(second_applicants, programs)
+
+        array_applicants, array_programs = self.get_market()
+        first_applicants = dict(list(array_applicants.items())[:len(array_applicants)//2])
+        second_applicants = dict(list(array_applicants.items())[len(array_applicants)//2:])
+        algorithm = ArrayDeferredAcceptanceAlgorithm()
+        algorithm.run(first_applicants, array_programs)
+        algorithm.run(second_applicants, array_programs)
+
+        for key, applicant in applicants.items():
+            self.assertEqual(applicant.match, array_applicants[key].match)
+            self.assertEqual(applicant.option_n, array_applicants[key].option_n)
+
+    def test_missing_program_error(self):
+        applicants, programs = self.get_market()
+        applicant_id = list(applicants.keys())[-1]
+        program_id = applicants[applicant_id].vpostulation[0]
+        programs.pop((program_id,0))
+        algorithm = ArrayDeferredAcceptanceAlgorithm()
+
+        self.assertRaises(ValueError,algorithm.run,applicants,programs)
+        self.assertEqual(algorithm.errors['applicant_id'],applicant_id)
+        self.assertEqual(algorithm.errors['program_id'],program_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+from unittest import TestCase, main
+from faker import Faker
+from benchmarks.hot_paths import BENCHMARKS, compare_benchmarks, run_benchmarks
+
+
+class BenchmarksTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+
+    def test_run_benchmarks(self):
+        report = run_benchmarks(repeat=1, max_size=1000,
+                                seed=self.fake.random_int(0,1000))
+        self.assertEqual({result['name'] for result in report['results']},
+                        set(BENCHMARKS))
+        for result in report['results']:
+            self.assertLessEqual(result['size'],1000)
+            self.assertGreaterEqual(result['min'],0)
+            self.assertLessEqual(result['min'],result['mean'])
+        self.assertIn('numpy',report['meta'])
+
+    def test_compare_benchmarks(self):
+        names = [self.fake.unique.word() for i in range(3)]
+        baseline = {'results':[{'name':name,'size':10,'min':1.0}
+                                for name in names]}
+        current = {'results':[{'name':names[0],'size':10,'min':2.0},
+                            {'name':names[1],'size':10,'min':0.5},
+                            {'name':names[2],'size':10,'min':1.1},
+                            {'name':names[2],'size':100,'min':1.0}]}
+        comparison = compare_benchmarks(baseline,current,threshold=0.25)
+        self.assertEqual(list(comparison['status']),
+                        ['regression','improvement','ok'])
+        self.assertEqual(list(comparison['ratio']),[2.0,0.5,1.1])
+
+
+if __name__ == '__main__':
+    main()
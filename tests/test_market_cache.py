@@ -0,0 +1,122 @@
+from unittest import TestCase, main
+from unittest import mock
+from faker import Faker
+from schoolchoice_da.entities import ApplicantStore, MarketCache, PolicyMaker
+from schoolchoice_da.entities.array_match import ENGINES
+from schoolchoice_da.entities.market_cache import _factorize_with_na
+from tests.test_policymaker import get_market, get_policy_maker
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+class MarketCacheTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.market = get_market(self.fake)
+        self.rules = {'sibling_priority_activation':True,
+                    'linked_postulation_activation':True,
+                    'secured_enrollment_assignment':True,
+                    'forced_secured_enrollment_assignment':True,
+                    'transfer_capacity_activation':True}
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = MarketCache(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_save_and_load(self):
+        applications = self.market['applications'].rename(columns={
+            'program_id':'vpostulation',
+            'lottery_number_quota':'vpostulation_scores',
+            'priority_number_quota':'vpriorities',
+            'institution_id':'vinstitution_id',
+            'quota_id':'vquota_id',
+            'priority_profile_program':'vpriority_profile'})
+        store = ApplicantStore.from_applications(
+            self.market['applicants']['applicant_id'], applications)
+        self.assertIsNone(self.cache.load('market'))
+        self.cache.save('market', {'store':store, 'same_store':store,
+                                    'ids':[1, 'A']})
+        self.assertEqual(os.listdir(self.directory.name), ['market'])
+
+        state = self.cache.load('market')
+        self.assertEqual(state['ids'], [1, 'A'])
+        self.assertIs(state['store'], state['same_store'])
+        loaded = state['store']
+        np.testing.assert_array_equal(loaded.offsets, store.offsets)
+        for column, array in store.columns.items():
+            self.assertEqual(loaded.columns[column].dtype, array.dtype)
+            self.assertEqual(loaded.columns[column].tolist(), array.tolist())
+            self.assertFalse(loaded.columns[column].flags.writeable)
+        # Typed arrays are read from the file
+        self.assertIsInstance(loaded.columns['vpostulation_scores'].base,
+                            np.memmap)
+
+        # A saved market is not written again
+        self.cache.save('market', {'store':None})
+        self.assertIs(self.cache.load('market')['store'].__class__,
+                    ApplicantStore)
+
+    def test_factorize_before_pandas_1_5(self):
+        factorize = pd.factorize
+        def old_factorize(values, na_sentinel=-1):
+            # Signature of pd.factorize before use_na_sentinel
+            return factorize(values, use_na_sentinel=na_sentinel is not None)
+        values = np.array(['a', np.nan, 'b', 'a'], dtype=object)
+        with mock.patch.object(pd, 'factorize', old_factorize):
+            codes, uniques = _factorize_with_na(values)
+        self.assertEqual(codes.tolist(), [0, 1, 2, 0])
+        self.assertEqual(uniques[[0, 2]].tolist(), ['a', 'b'])
+        self.assertTrue(pd.isna(uniques[1]))
+
+    def test_policy_maker_cache(self):
+        expected = get_policy_maker(self.market, **self.rules)
+        expected.match_applicants_and_programs()
+        with mock.patch.object(PolicyMaker, '_prepare_market', autospec=True,
+                side_effect=PolicyMaker._prepare_market) as prepare_market:
+            for engine in ['object', 'array']:
+                policy_maker = get_policy_maker(self.market,
+                    market_cache=self.directory.name, engine=engine,
+                    **self.rules)
+                policy_maker.match_applicants_and_programs()
+                pd.testing.assert_frame_equal(policy_maker.get_results(),
+                                            expected.get_results())
+                pd.testing.assert_frame_equal(policy_maker.get_waitlists(),
+                                            expected.get_waitlists())
+            # The engine does not change the prepared market
+            self.assertEqual(prepare_market.call_count, 1)
+            self.assertIs(type(policy_maker.algorithm), ENGINES['array'])
+
+            # Other rules or inputs are prepared again
+            get_policy_maker(self.market, market_cache=self.directory.name)
+            self.assertEqual(prepare_market.call_count, 2)
+            market = dict(self.market)
+            market['vacancies'] = market['vacancies'].assign(
+                regular_vacancies=market['vacancies'].regular_vacancies+1)
+            get_policy_maker(market, market_cache=self.directory.name,
+                            **self.rules)
+            self.assertEqual(prepare_market.call_count, 3)
+        self.assertEqual(len(os.listdir(self.directory.name)), 3)
+
+    def test_drawn_lottery_not_cached(self):
+        market = dict(self.market)
+        market['applications'] = market['applications'].drop(
+            columns='lottery_number_quota')
+        def draw_lottery(self, applications, **kwargs):
+            return applications.assign(
+                lottery_number_quota=np.random.random(len(applications)))
+        with mock.patch.object(PolicyMaker, '_check_lottery', draw_lottery):
+            for i in range(2):
+                with self.assertWarns(UserWarning):
+                    get_policy_maker(market, market_cache=self.directory.name,
+                                    **self.rules)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,691 @@
+from unittest import TestCase, main
+from faker import Faker
+from schoolchoice_da.entities import PolicyMaker, MatchObserver
+import contextlib
+import io
+import random
+import numpy as np
+import pandas as pd
+
+
+def get_market(fake, n_applicants=120, n_institutions=6, grades=(1,2), quotas=(1,2)):
+    vacancies = pd.DataFrame([{'program_id':f'P{grade}_{institution}',
+                                'quota_id':quota,
+                                'institution_id':f'I{institution}',
+                                'grade_id':grade,
+                                'regular_vacancies':fake.random_int(0,5),
+                                'special_1_vacancies':fake.random_int(0,2)}
+        for grade in grades for institution in range(n_institutions)
+        for quota in quotas])
+    applicants = []
+    applications = []
+    for i in range(n_applicants):
+        applicant_id = f'A{i}'
+        grade = random.choice(grades)
+        institutions = random.sample(range(n_institutions),
+                                    fake.random_int(0,n_institutions))
+        se_program_id = 0
+        se_quota_id = 0
+        if institutions and fake.boolean(20):
+            se_program_id = f'P{grade}_{random.choice(institutions)}'
+            se_quota_id = random.choice(quotas)
+        applicants.append({'applicant_id':applicant_id,
+                            'grade_id':grade,
+                            'special_assignment':int(fake.boolean(15)),
+                            'secured_enrollment_program_id':se_program_id,
+                            'secured_enrollment_quota_id':se_quota_id,
+                            'applicant_characteristic_1':fake.random_int(0,2)})
+        for ranking, institution in enumerate(institutions):
+            priority_profile = fake.random_int(1,4)
+            for quota in quotas:
+                applications.append({'applicant_id':applicant_id,
+                                    'program_id':f'P{grade}_{institution}',
+                                    'quota_id':quota,
+                                    'institution_id':f'I{institution}',
+                                    'ranking_program':ranking+1,
+                                    'priority_profile_program':priority_profile,
+                                    'priority_number_quota':fake.random_int(1,3),
+                                    'lottery_number_quota':random.random()})
+    priority_profiles = pd.DataFrame({'priority_profile':[1,2,3,4,5],
+                                    'priority_q1':[3,2,1,2,1],
+                                    'priority_q2':[3,1,2,2,1],
+                                    'priority_profile_sibling_transition':[5,3,3,5,5]})
+    quota_order = pd.DataFrame({'priority_profile':[2,3],
+                                'secured_enrollment_indicator':[False,True],
+                                'secured_enrollment_quota_id_criteria':['==','>='],
+                                'secured_enrollment_quota_id_value':[0,2],
+                                'applicant_characteristic_1_criteria':['>=','>='],
+                                'applicant_characteristic_1_value':[1,0],
+                                'order_q1':[2,2],
+                                'order_q2':[1,1]})
+    pairs = set()
+    for i in range(n_applicants//4):
+        a, b = random.sample(range(n_applicants), 2)
+        pairs.update({(f'A{a}',f'A{b}'), (f'A{b}',f'A{a}')})
+    siblings = pd.DataFrame(sorted(pairs), columns=['applicant_id','sibling_id'])
+    links = siblings.rename(columns={'sibling_id':'linked_id'}).iloc[::3]
+    links = pd.concat([links, links.rename(columns={'applicant_id':'linked_id',
+                        'linked_id':'applicant_id'})]).drop_duplicates()
+    return {'vacancies':vacancies,
+            'applicants':pd.DataFrame(applicants),
+            'applications':pd.DataFrame(applications),
+            'priority_profiles':priority_profiles,
+            'quota_order':quota_order,
+            'siblings':siblings,
+            'links':links}
+
+
+def get_policy_maker(market, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return PolicyMaker(**{key:df.copy() for key,df in market.items()},
+                            **kwargs)
+
+
+class PolicyMakerTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.market = get_market(self.fake)
+        self.rules = {'sibling_priority_activation':True,
+                    'linked_postulation_activation':True,
+                    'secured_enrollment_assignment':True,
+                    'forced_secured_enrollment_assignment':True,
+                    'transfer_capacity_activation':True}
+
+    def test_market_components(self):
+        policy_maker = get_policy_maker(self.market)
+        applicant_labels, program_labels = policy_maker.get_market_components()
+
+        grades = policy_maker.applicants_df['grade_id'].to_numpy()
+        for label in np.unique(applicant_labels):
+            self.assertEqual(len(set(grades[applicant_labels==label])), 1)
+        for (program_id, quota_id), label in zip(policy_maker.programs.keys(),
+                program_labels):
+            applying = np.array([program_id in postulation for postulation
+                in policy_maker.applicants.get_original_vpostulations(
+                    policy_maker.applicants_df['applicant_id'])])
+            self.assertTrue((applicant_labels[applying]==label).all())
+
+    def test_parallel_matching(self):
+        serial = get_policy_maker(self.market, **self.rules)
+        serial.match_applicants_and_programs()
+
+        parallel = get_policy_maker(self.market, n_jobs=2, **self.rules)
+        parallel.match_applicants_and_programs()
+
+        pd.testing.assert_frame_equal(serial.get_results(),
+                                        parallel.get_results())
+        pd.testing.assert_frame_equal(serial.get_waitlists(),
+                                        parallel.get_waitlists())
+        for key, program in serial.programs.items():
+            self.assertEqual(program.waitlist_dict,
+                            parallel.programs[key].waitlist_dict)
+            for assignment_type in serial.assignment_types:
+                queue = program.get_assignment_type_queue(assignment_type)
+                parallel_queue = parallel.programs[key] \
+                    .get_assignment_type_queue(assignment_type)
+                self.assertEqual(queue.capacity, parallel_queue.capacity)
+                self.assertEqual(queue.over_capacity,
+                                parallel_queue.over_capacity)
+                self.assertEqual(queue.vassigned_scores,
+                                parallel_queue.vassigned_scores)
+                self.assertEqual([applicant.id for applicant
+                    in queue.vassigned_applicants], [applicant.id for applicant
+                    in parallel_queue.vassigned_applicants])
+
+    def test_reset_matching(self):
+        for n_jobs in [1, 2]:
+            policy_maker = get_policy_maker(self.market, n_jobs=n_jobs,
+                                            **self.rules)
+            policy_maker.match_applicants_and_programs()
+            results = policy_maker.get_results()
+            if n_jobs == 1:
+                # Released rounds only keep the applicants held by a queue or
+                # changed by the rules
+                for applicant_id in policy_maker.applicants:
+                    applicant = policy_maker.applicants.get_created(
+                        applicant_id)
+                    if applicant is not None:
+                        self.assertTrue(
+                            (applicant.assigned_vacancy is not None) or
+                            not applicant.has_original_postulation())
+            else:
+                # Sub-markets are sent back as arrays, so no applicant is
+                # created in the parent
+                self.assertTrue(all(
+                    policy_maker.applicants.get_created(applicant_id) is None
+                    for applicant_id in policy_maker.applicants))
+
+            policy_maker.reset_matching()
+            self.assertTrue(policy_maker.get_results()['program_id']
+                            .isna().all())
+            for applicant in policy_maker.applicants.values():
+                self.assertEqual(applicant.option_n, 0)
+                self.assertIsNone(applicant.assigned_vacancy)
+                self.assertEqual(applicant.match,
+                                len(applicant.vpostulation)==0)
+
+            policy_maker.match_applicants_and_programs()
+            pd.testing.assert_frame_equal(results, policy_maker.get_results())
+
+    def test_sibling_priority(self):
+        # Transitions that change the profile every time they are applied
+        self.market['priority_profiles']['priority_profile_sibling_transition'] = \
+            [2,3,4,5,1]
+        policy_maker = get_policy_maker(self.market,
+                                        sibling_priority_activation=True)
+        policy_maker.match_applicants_and_programs()
+        applicants_df = policy_maker.applicants_df.loc[
+            policy_maker.applicants_df['grade_id']==policy_maker.last_round]
+        applicants = policy_maker._get_applicant_objects(applicants_df).tolist()
+        policy_maker.applicants.reset_matching(applicants_df['applicant_id'])
+        policy_maker._apply_sib_priority(applicants_df)
+        results = [(applicant._vpriority_profile.copy(),
+                    applicant._vpriorities.copy(), applicant.vscores.copy(),
+                    applicant.dynamic_priority) for applicant in applicants]
+
+        # Same as giving sibling priority one application at a time
+        for applicant, result in zip(applicants, results):
+            applicant._reset_matching_attributes()
+            institutions = {policy_maker.applicants[sibling_id].assigned_vacancy.institution_id
+                for sibling_id in applicant.vsiblings
+                if policy_maker.applicants[sibling_id].assigned_vacancy is not None}
+            for index, institution_id in enumerate(applicant.vinstitution_id):
+                if institution_id in institutions:
+                    applicant.reasign_priority_profile(index,
+                        policy_maker.priority_profile_transition)
+            self.assertEqual(applicant._vpriority_profile.tolist(),
+                            result[0].tolist())
+            self.assertEqual(applicant._vpriorities.tolist(),
+                            result[1].tolist())
+            self.assertTrue(np.allclose(applicant.vscores, result[2]))
+            if applicant.dynamic_priority is None:
+                self.assertIsNone(result[3])
+            else:
+                self.assertEqual(applicant.dynamic_priority.tolist(),
+                                result[3].tolist())
+
+    def test_linked_reorder(self):
+        policy_maker = get_policy_maker(self.market,
+                                        linked_postulation_activation=True)
+        policy_maker.match_applicants_and_programs()
+        applicants_df = policy_maker.applicants_df.loc[
+            policy_maker.applicants_df['grade_id']==policy_maker.last_round]
+        applicants = policy_maker._get_applicant_objects(applicants_df).tolist()
+        policy_maker.applicants.reset_matching(applicants_df['applicant_id'])
+        policy_maker._apply_linked_reorder(applicants_df)
+
+        for applicant in applicants:
+            linked = [policy_maker.applicants[linked_id].assigned_vacancy
+                for linked_id in applicant.vlinks]
+            linked = [program for program in linked if program is not None]
+            institutions = {program.institution_id for program in linked}
+            original = applicant.get_original_vpostulation()
+            first = [i for i, program_id in enumerate(original)
+                if policy_maker.programs[(program_id,1)].institution_id
+                in institutions]
+            order = first + [i for i in range(len(original))
+                if i not in first]
+            self.assertEqual(applicant.vpostulation.tolist(),
+                            original[order].tolist())
+            # Applicants without applications are already matched
+            reordered = (len(applicant.vlinks) > 0) and not applicant.match
+            self.assertEqual(applicant.linked_postulation_bool, reordered)
+            if reordered:
+                self.assertEqual(set(applicant.linked_grades),
+                                {program.grade_id for program in linked})
+
+    def test_quota_postulation_order(self):
+        # Rules that undo the reorder of other rules for some applicants
+        quota_order = self.market['quota_order']
+        self.market['quota_order'] = pd.concat([quota_order,
+            quota_order.assign(applicant_characteristic_1_criteria='<',
+                                applicant_characteristic_1_value=2,
+                                order_q1=1, order_q2=2)], ignore_index=True)
+        policy_maker = get_policy_maker(self.market, **self.rules)
+        applicants_df = policy_maker.applicants_df
+        applicants = policy_maker._get_applicant_objects(applicants_df).tolist()
+        policy_maker._check_quota_postulation_order(applicants_df)
+        results = [(applicant.vquota_id.tolist(), applicant.vscores.copy())
+            for applicant in applicants]
+
+        # Same as checking the rules one applicant and program at a time
+        for applicant, result in zip(applicants, results):
+            applicant._reset_matching_attributes()
+            for program_id, priority_profile in \
+                    applicant.vpriority_profile.copy().items():
+                for rule in policy_maker.quota_order_dict.get(
+                        priority_profile, []):
+                    indicator = applicant.se_program_id == program_id
+                    if rule['secured_enrollment_indicator'] != indicator:
+                        continue
+                    if indicator and not applicant.check_attribute_criteria(
+                            'se_quota_id',
+                            rule['secured_enrollment_quota_id_criteria'],
+                            rule['secured_enrollment_quota_id_value']):
+                        continue
+                    if applicant.check_attribute_criteria(
+                            'applicant_characteristic_1',
+                            rule['applicant_characteristic_1_criteria'],
+                            rule['applicant_characteristic_1_value']):
+                        applicant.reorder_postulation_by_quota(program_id,
+                            rule['ordered_quotas'])
+            self.assertEqual(applicant.vquota_id.tolist(), result[0])
+            self.assertTrue(np.allclose(applicant.vscores, result[1],
+                                        equal_nan=True))
+
+    def test_quota_postulation_order_several_rules(self):
+        # Every rule met reorders the quotas, so the last one met wins
+        market = get_market(self.fake, quotas=(1,2,3))
+        market['priority_profiles'] = market['priority_profiles'].assign(
+            priority_q3=[3,2,1,1,2])
+        orders = [[3,1,2], [2,3,1], [1,2,3]]
+        market['quota_order'] = pd.DataFrame([{'priority_profile':2,
+                                'secured_enrollment_indicator':False,
+                                'secured_enrollment_quota_id_criteria':'==',
+                                'secured_enrollment_quota_id_value':0,
+                                'applicant_characteristic_1_criteria':'>=',
+                                'applicant_characteristic_1_value':value,
+                                **{f'order_q{quota}':order.index(quota)+1
+                                    for quota in (1,2,3)}}
+            for value, order in enumerate(orders)])
+        applications = market['applications'].assign(
+            priority_profile_program=2)
+        # Some applicants do not apply to quota 2
+        partial = applications['applicant_id'].str[1:].astype(int) % 2 == 0
+        market['applications'] = applications.loc[
+            ~(partial & (applications['quota_id'] == 2))]
+        policy_maker = get_policy_maker(market)
+        applicants_df = policy_maker.applicants_df
+        policy_maker._check_quota_postulation_order(applicants_df)
+
+        for applicant_id, characteristic in zip(applicants_df['applicant_id'],
+                applicants_df['applicant_characteristic_1']):
+            applicant = policy_maker.applicants[applicant_id]
+            for program_id in set(applicant.vpostulation.tolist()):
+                indexes = np.flatnonzero(applicant.vpostulation == program_id)
+                quotas = [quota for quota in orders[characteristic]
+                    if quota in applicant.vquota_id[indexes].tolist()]
+                self.assertEqual(applicant.vquota_id[indexes].tolist(), quotas)
+                for index, quota in zip(indexes, quotas):
+                    key = (program_id, quota)
+                    self.assertAlmostEqual(applicant.vscores[index],
+                        applicant.vpostulation_scores[key] +
+                        applicant.vpriorities[key])
+
+    def test_secured_places(self):
+        policy_maker = get_policy_maker(self.market, **self.rules)
+        applicants_df = policy_maker.applicants_df
+        applicants = policy_maker._get_applicant_objects(applicants_df).tolist()
+        policy_maker._set_secured_places(applicants_df)
+        results = [(applicant.cut_postulation, applicant.vpostulation.tolist(),
+                    applicant.vquota_id.tolist(), applicant.vscores.copy(),
+                    applicant._vpriorities.tolist())
+            for applicant in applicants]
+
+        # Same as cutting the postulation one applicant at a time
+        for applicant, result in zip(applicants, results):
+            applicant._reset_matching_attributes()
+            if applicant._has_SE():
+                applicant.set_secured_place_as_last_postulation()
+            self.assertEqual(applicant.cut_postulation, result[0])
+            self.assertEqual(applicant.vpostulation.tolist(), result[1])
+            self.assertEqual(applicant.vquota_id.tolist(), result[2])
+            self.assertTrue(np.allclose(applicant.vscores, result[3],
+                                        equal_nan=True))
+            self.assertEqual(applicant._vpriorities.tolist(), result[4])
+
+    def test_partition_index(self):
+        policy_maker = get_policy_maker(self.market, **self.rules)
+        applicants_df = policy_maker.applicants_df
+        for grade in policy_maker.ordered_grades:
+            for assignment_type in policy_maker.assignment_types:
+                # Same rows, in the same order, as scanning the market
+                expected = applicants_df.loc[
+                    (applicants_df['grade_id'] == grade) &
+                    (applicants_df['special_assignment'] == assignment_type)]
+                pd.testing.assert_frame_equal(
+                    policy_maker._get_round_applicants_df(grade,
+                                                        assignment_type),
+                    expected)
+            self.assertEqual(policy_maker._prep_programs_for_matching(grade),
+                {key: program for key, program in policy_maker.programs.items()
+                    if program.grade_id == grade})
+
+    def test_lazy_applicants(self):
+        policy_maker = get_policy_maker(self.market, engine='array',
+                                        **self.rules)
+        applicant_ids = policy_maker.applicants_df['applicant_id'].tolist()
+        self.assertEqual(list(policy_maker.applicants), applicant_ids)
+        self.assertTrue(all(policy_maker.applicants.get_created(applicant_id)
+            is None for applicant_id in applicant_ids))
+
+        # Preparing and matching a round with the array engine create no
+        # applicants, and the rules of the round are read back from the map
+        grade = policy_maker.first_round
+        assignment_type = policy_maker.assignment_types[0]
+        round_ids = policy_maker._prep_applicants_for_matching(
+            grade, assignment_type)
+        self.assertEqual(round_ids, policy_maker._get_round_applicants_df(
+            grade, assignment_type)['applicant_id'].tolist())
+        policy_maker._run_round(grade=grade, assignment_type=assignment_type,
+            applicant_ids=round_ids,
+            programs_to_be_assigned=policy_maker._prep_programs_for_matching(
+                grade))
+        self.assertTrue(all(policy_maker.applicants.get_created(applicant_id)
+            is None for applicant_id in applicant_ids))
+
+        # Every round and the results, as with the objects of the applicants
+        policy_maker = get_policy_maker(self.market, engine='array',
+                                        **self.rules)
+        policy_maker.match_applicants_and_programs()
+        # Only the applicants forced into their secured enrollment are created
+        se_program_id, _ = policy_maker._get_secured_enrollments(
+            policy_maker.applicants_df)
+        secured = set(policy_maker.applicants_df['applicant_id'].to_numpy()[
+            np.not_equal(se_program_id, None)].tolist())
+        self.assertTrue({applicant_id for applicant_id in applicant_ids
+            if policy_maker.applicants.get_created(applicant_id) is not None}
+            <= secured)
+        expected = get_policy_maker(self.market, engine='object', **self.rules)
+        expected.match_applicants_and_programs()
+        pd.testing.assert_frame_equal(policy_maker.get_results(),
+                                    expected.get_results())
+        pd.testing.assert_frame_equal(policy_maker.get_waitlists(),
+                                    expected.get_waitlists())
+
+    def test_unrelevant_applications_waitlist(self):
+        vacancies = self.market['vacancies'].copy()
+        closed = vacancies.iloc[::3]
+        vacancies.loc[closed.index,
+                        ['regular_vacancies','special_1_vacancies']] = 0
+        policy_maker = get_policy_maker(dict(self.market, vacancies=vacancies))
+        applications = self.market['applications']
+        for program_id, quota_id in zip(closed['program_id'],
+                                        closed['quota_id']):
+            # Every application, by priority and then in the input order
+            expected = applications.loc[
+                (applications['program_id'] == program_id) &
+                (applications['quota_id'] == quota_id)].sort_values(
+                'priority_number_quota', kind='stable')
+            self.assertEqual(
+                list(policy_maker.programs[(program_id, quota_id)]
+                    .waitlist_dict.items()),
+                list(zip(expected['applicant_id'],
+                        expected['priority_number_quota'].astype(float))))
+
+    def test_get_cutoffs(self):
+        for engine, queue_type in [('object','list'), ('object','heap'),
+                                    ('array','list')]:
+            policy_maker = get_policy_maker(self.market, engine=engine,
+                                            queue_type=queue_type, **self.rules)
+            policy_maker.match_applicants_and_programs()
+            cutoffs = policy_maker.get_cutoffs()
+            self.assertEqual(len(cutoffs),
+                len(policy_maker.programs)*len(policy_maker.assignment_types))
+
+            results = policy_maker.get_results().merge(
+                policy_maker.applicants_df[['applicant_id',
+                                            'special_assignment']],
+                on='applicant_id').rename(
+                columns={'special_assignment':'assignment_type'})
+            expected = results.dropna(subset=['program_id']).groupby(
+                ['program_id','quota_id','assignment_type']).agg(
+                n_assigned=('applicant_id','count'),
+                cutoff_score=('assigned_score','max'))
+            cutoffs = cutoffs.set_index(['program_id','quota_id',
+                                        'assignment_type'])
+            assigned = cutoffs.loc[cutoffs['n_assigned']>0]
+            self.assertEqual(len(assigned), len(expected))
+            expected = expected.loc[assigned.index]
+            self.assertTrue((assigned['n_assigned']==
+                            expected['n_assigned']).all())
+            self.assertTrue(np.allclose(assigned['cutoff_score'],
+                                        expected['cutoff_score']))
+            self.assertTrue(cutoffs.loc[cutoffs['n_assigned']==0,
+                                        'cutoff_score'].isna().all())
+            self.assertTrue((cutoffs['filled']==
+                            (cutoffs['n_assigned']>=cutoffs['capacity'])).all())
+
+    def test_round_summary(self):
+        class Observer(MatchObserver):
+            def __init__(self):
+                self.started = []
+                self.summaries = []
+            def on_round_start(self, grade, assignment_type, n_applicants):
+                self.started.append((grade, assignment_type, n_applicants))
+            def on_round_end(self, summary):
+                self.summaries.append(summary)
+
+        summaries = {}
+        for engine, n_jobs in [('object',1), ('array',1), ('object',2)]:
+            policy_maker = get_policy_maker(self.market, engine=engine,
+                                            n_jobs=n_jobs, **self.rules)
+            observer = Observer()
+            policy_maker.algorithm.add_observer(observer)
+            summary = policy_maker.match_applicants_and_programs()
+            self.assertEqual(len(summary), len(policy_maker.ordered_grades)*
+                                            len(policy_maker.assignment_types))
+            self.assertEqual(list(summary['grade'].unique()),
+                            list(policy_maker.ordered_grades))
+            self.assertEqual(summary['n_applicants'].sum(),
+                            len(policy_maker.applicants))
+            self.assertTrue((summary['proposals'] >= summary['rejections'] +
+                            summary['evictions']).all())
+            self.assertTrue((summary['wall_time'] >= 0).all())
+            pd.testing.assert_frame_equal(summary,
+                pd.DataFrame(observer.summaries), check_dtype=False)
+            if n_jobs == 1:
+                self.assertEqual(observer.started, list(zip(summary['grade'],
+                    summary['assignment_type'], summary['n_applicants'])))
+            summaries[(engine, n_jobs)] = summary.drop(columns=['wall_time'])
+
+        pd.testing.assert_frame_equal(summaries[('object',1)],
+                                        summaries[('array',1)])
+        # Proposals only depend on the final matching
+        serial, parallel = summaries[('object',1)], summaries[('object',2)]
+        self.assertTrue((serial['proposals'].to_numpy() ==
+                        parallel['proposals'].to_numpy()).all())
+
+    def test_get_profile(self):
+        policy_maker = get_policy_maker(self.market, profile=True, **self.rules)
+        policy_maker.match_applicants_and_programs()
+        policy_maker.get_results()
+        profile = policy_maker.get_profile()
+        phases = list(profile['phase'])
+        for phase in ['check_inputs', 'add_sibling_and_linked_data',
+                        'filter_relevant_applications', 'add_postulation_data',
+                        'init_applicants', 'init_programs', 'get_results']:
+            self.assertEqual(phases.count(phase), 1)
+        rounds = profile.loc[profile['phase']=='match_round']
+        self.assertEqual(list(zip(rounds['grade'], rounds['assignment_type'])),
+            [(grade, assignment_type) for grade in policy_maker.ordered_grades
+            for assignment_type in policy_maker.assignment_types])
+        self.assertTrue((profile['peak_memory'] > 0).all())
+
+        untracked = get_policy_maker(self.market, **self.rules)
+        untracked.match_applicants_and_programs()
+        self.assertEqual(len(untracked.get_profile()), 0)
+
+    def test_get_waitlists(self):
+        policy_maker = get_policy_maker(self.market, **self.rules)
+        policy_maker.match_applicants_and_programs()
+        waitlists = policy_maker.get_waitlists()
+        self.assertEqual(len(waitlists), sum(len(program.waitlist_dict)
+            for program in policy_maker.programs.values()))
+        for (program_id, quota_id), waitlist in waitlists.groupby(
+                ['program_id','quota_id']):
+            waitlist_dict = policy_maker.programs[
+                (program_id, quota_id)].waitlist_dict
+            self.assertEqual(dict(zip(waitlist['applicant_id'],
+                                        waitlist['priority'])), waitlist_dict)
+            self.assertEqual(list(waitlist['applicant_id']), list(waitlist_dict))
+            self.assertEqual(list(waitlist['waitlist_rank']),
+                            list(range(1, len(waitlist) + 1)))
+            self.assertTrue(waitlist['priority'].is_monotonic_increasing)
+
+        untracked = get_policy_maker(self.market, track_waitlists=False,
+                                    **self.rules)
+        untracked.match_applicants_and_programs()
+        pd.testing.assert_frame_equal(policy_maker.get_results(),
+                                        untracked.get_results())
+        self.assertEqual(len(untracked.get_waitlists()), 0)
+
+    def assert_same_matching(self, policy_maker, expected):
+        results = policy_maker.get_results()
+        expected_results = expected.get_results()
+        pd.testing.assert_frame_equal(
+            results.sort_values('applicant_id').reset_index(drop=True),
+            expected_results.sort_values('applicant_id').reset_index(drop=True))
+        for key, program in expected.programs.items():
+            self.assertEqual(program.waitlist_dict,
+                            policy_maker.programs[key].waitlist_dict)
+
+    def get_changes(self):
+        market = self.market
+        applicants = market['applicants']
+        applications = market['applications']
+        removed = random.sample(list(applicants['applicant_id']), 5)
+        modified = applicants.loc[~applicants['applicant_id'].isin(removed)
+                                    ].sample(5)
+        new_applicants = applicants.sample(5).assign(
+            applicant_id=[f'N{i}' for i in range(5)])
+        new_applications = pd.concat([
+            applications.loc[applications['applicant_id'].isin(
+                modified['applicant_id'])].assign(
+                lottery_number_quota=lambda df: np.random.random(len(df))),
+            applications.merge(new_applicants[['applicant_id']].assign(
+                old_id=applicants.loc[new_applicants.index,'applicant_id'].values),
+                left_on='applicant_id', right_on='old_id',
+                suffixes=('_old','')).drop(columns=['applicant_id_old','old_id'])
+                .assign(lottery_number_quota=lambda df: np.random.random(len(df)))])
+        vacancies = market['vacancies'].loc[
+            market['vacancies'][['regular_vacancies','special_1_vacancies']]
+            .sum(axis=1) > 0].sample(4)
+        vacancies = vacancies[['program_id','quota_id']].assign(
+            regular_vacancies=[0, 1, 4, 7])
+        return {'applicants':pd.concat([modified, new_applicants]),
+                'applications':new_applications,
+                'removed_applicants':removed,
+                'vacancies':vacancies}
+
+    def get_changed_market(self, changes):
+        market = {key:df.copy() for key,df in self.market.items()}
+        changed_ids = set(changes['applicants']['applicant_id'])
+        removed = set(changes['removed_applicants'])
+        applicants = market['applicants'].set_index('applicant_id')
+        modified = changes['applicants'].set_index('applicant_id')
+        applicants = applicants.drop(index=list(removed))
+        applicants = pd.concat([applicants.drop(index=[i for i in modified.index
+                                                        if i in applicants.index]),
+                                modified]).reindex(
+            [i for i in applicants.index] +
+            [i for i in modified.index if i not in applicants.index])
+        market['applicants'] = applicants.reset_index()
+        market['applications'] = pd.concat([market['applications'].loc[
+            ~market['applications']['applicant_id'].isin(changed_ids | removed)],
+            changes['applications']])
+        vacancies = market['vacancies'].set_index(['program_id','quota_id'])
+        vacancies.update(changes['vacancies'].set_index(['program_id','quota_id']))
+        market['vacancies'] = vacancies.reset_index().astype(
+            {'regular_vacancies':int})
+        for relation, column in [('siblings','sibling_id'), ('links','linked_id')]:
+            market[relation] = market[relation].loc[
+                ~market[relation]['applicant_id'].isin(removed) &
+                ~market[relation][column].isin(removed)]
+        return market
+
+    def test_rematch(self):
+        rules = {'secured_enrollment_assignment':True}
+        changes = self.get_changes()
+        # With n_jobs the whole market is matched again
+        for engine, n_jobs in [('object',1), ('array',1), ('array',2)]:
+            policy_maker = get_policy_maker(self.market, engine=engine,
+                                            n_jobs=n_jobs, **rules)
+            policy_maker.match_applicants_and_programs()
+            with contextlib.redirect_stdout(io.StringIO()):
+                policy_maker.rematch(**changes)
+
+            expected = get_policy_maker(self.get_changed_market(changes),
+                                        **rules)
+            expected.match_applicants_and_programs()
+            self.assert_same_matching(policy_maker, expected)
+
+    def test_rematch_removed_applicant_rejections(self):
+        # s pushes a out of X during the matching and is rejected later, so
+        # removing s must release X and Y even if s ends unassigned
+        market = get_market(self.fake, n_applicants=3, n_institutions=2,
+                            grades=(1,))
+        market['vacancies'] = pd.DataFrame([{'program_id':program_id,
+                                            'quota_id':quota,
+                                            'institution_id':f'I{i}',
+                                            'grade_id':1,
+                                            'regular_vacancies':int(quota==1),
+                                            'special_1_vacancies':0}
+            for i, program_id in enumerate(['X','Y']) for quota in (1,2)])
+        market['applicants'] = pd.DataFrame([{'applicant_id':applicant_id,
+                                            'grade_id':1,
+                                            'special_assignment':0,
+                                            'secured_enrollment_program_id':0,
+                                            'secured_enrollment_quota_id':0,
+                                            'applicant_characteristic_1':0}
+            for applicant_id in ['a','b','s']])
+        # Lower lottery numbers go first
+        lotteries = {'X':{'b':0.1,'s':0.2,'a':0.3}, 'Y':{'a':0.1,'b':0.2}}
+        preferences = {'a':['X','Y'], 'b':['Y','X'], 's':['X']}
+        market['applications'] = pd.DataFrame([{'applicant_id':applicant_id,
+                                    'program_id':program_id,
+                                    'quota_id':quota,
+                                    'institution_id':f'I{"XY".index(program_id)}',
+                                    'ranking_program':ranking+1,
+                                    'priority_profile_program':1,
+                                    'priority_number_quota':1,
+                                    'lottery_number_quota':
+                                        lotteries[program_id][applicant_id]}
+            for applicant_id, programs in preferences.items()
+            for ranking, program_id in enumerate(programs) for quota in (1,2)])
+        market['siblings'] = market['siblings'].iloc[:0]
+        market['links'] = market['links'].iloc[:0]
+
+        policy_maker = get_policy_maker(market)
+        policy_maker.match_applicants_and_programs()
+        results = policy_maker.get_results().set_index('applicant_id')
+        self.assertEqual(results['program_id'].loc[['a','b']].tolist(),
+                        ['Y','X'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            policy_maker.rematch(removed_applicants=['s'])
+
+        changes = {'applicants':market['applicants'].iloc[:0],
+                    'applications':market['applications'].iloc[:0],
+                    'removed_applicants':['s'],
+                    'vacancies':market['vacancies'].iloc[:0]}
+        self.market = market
+        expected = get_policy_maker(self.get_changed_market(changes))
+        expected.match_applicants_and_programs()
+        self.assert_same_matching(policy_maker, expected)
+        results = policy_maker.get_results().set_index('applicant_id')
+        self.assertEqual(results['program_id'].loc[['a','b']].tolist(),
+                        ['X','Y'])
+
+    def test_rematch_with_dependent_rounds(self):
+        changes = self.get_changes()
+        changes['siblings'] = self.market['siblings'].iloc[:0]
+        changes['links'] = self.market['links'].iloc[:0]
+        policy_maker = get_policy_maker(self.market, **self.rules)
+        policy_maker.match_applicants_and_programs()
+        policy_maker.rematch(**changes)
+
+        changed_market = self.get_changed_market(changes)
+        changed_ids = changes['applicants']['applicant_id']
+        for relation in ['siblings', 'links']:
+            changed_market[relation] = changed_market[relation].loc[
+                ~changed_market[relation]['applicant_id'].isin(changed_ids)]
+        expected = get_policy_maker(changed_market, **self.rules)
+        expected.match_applicants_and_programs()
+        self.assert_same_matching(policy_maker, expected)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+from unittest import TestCase, main
+from faker import Faker
+from schoolchoice_da.entities import PhaseProfiler
+import json
+import tracemalloc
+
+
+class PhaseProfilerTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.profiler = PhaseProfiler()
+
+    def test_nested_phases(self):
+        size = self.fake.random_int(10**5,10**6)
+        with self.profiler.phase('outer'):
+            with self.profiler.phase('inner', grade=1, assignment_type=0):
+                data = bytearray(size)
+            del data
+            with self.profiler.phase('empty'):
+                pass
+        self.assertFalse(tracemalloc.is_tracing())
+
+        report = self.profiler.get_report()
+        self.assertEqual(list(report.columns), PhaseProfiler.columns)
+        self.assertEqual(list(report['phase']), ['inner', 'empty', 'outer'])
+        peaks = report.set_index('phase')['peak_memory']
+        self.assertGreaterEqual(peaks['inner'], size)
+        self.assertLess(peaks['empty'], size)
+        self.assertGreaterEqual(peaks['outer'], peaks['inner'])
+        self.assertTrue((report['wall_time'] >= 0).all())
+        self.assertEqual(report.loc[report['phase']=='inner','grade'].item(), 1)
+
+        records = json.loads(self.profiler.to_json())
+        self.assertEqual([record['phase'] for record in records],
+                        ['inner', 'empty', 'outer'])
+
+    def test_phase_with_error(self):
+        with self.assertRaises(ValueError):
+            with self.profiler.phase('error'):
+                raise ValueError
+        self.assertEqual(list(self.profiler.get_report()['phase']), ['error'])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_disabled(self):
+        profiler = PhaseProfiler(enabled=False)
+        with profiler.phase('phase'):
+            pass
+        self.assertEqual(len(profiler.get_report()), 0)
+        self.assertEqual(json.loads(profiler.to_json()), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -135,6 +135,43 @@ class ProgramTests(TestCase):
         self.assertTrue((self.applicant in queue.vassigned_applicants))
         self.assertTrue((self.app_priority+self.app_score in queue.vassigned_scores))
 
+    def test_force_secured_enrollment_matches(self):
+        applicants = [self.applicant]
+        for i in range(self.fake.random_int(1,5)):
+            applicants.append(Applicant(applicant_id = str(self.fake.uuid4()),
+                                special_assignment = self.fake.random_int(0,1),
+                                grade_id = self.grade_id,
+                                links = [],
+                                siblings = [],
+                                vpostulation = np.array([self.program_id]),
+                                vpostulation_scores = np.array([random.random()]),
+                                vinstitution_id = np.array([self.institution_id]),
+                                vpriorities = np.array([self.fake.random_digit()]),
+                                vquota_id = np.array([self.quota_id]),
+                                vpriority_profile = np.array([self.app_profile])))
+        program = Program(program_id = self.program_id,
+                            grade_id = self.grade_id,
+                            quota_id = self.quota_id,
+                            institution_id = self.institution_id,
+                            regular_capacity = self.regular_capacity,
+                            special_vacancies = self.special_vacancies)
+        for applicant in applicants:
+            self.program.waitlist_store.add(self.program._waitlist_index,
+                                            applicant.id, 1)
+            program._force_secured_enrollment_match(applicant)
+        self.program._force_secured_enrollment_matches(applicants)
+
+        # Same as forcing the applicants one at a time
+        self.assertTrue(self.program.over_capacity)
+        self.assertEqual(self.program.waitlist_dict, {})
+        for assignment_type in [0,1,2]:
+            queue = self.program.get_assignment_type_queue(assignment_type)
+            expected = program.get_assignment_type_queue(assignment_type)
+            self.assertEqual(queue.over_capacity, expected.over_capacity)
+            self.assertEqual(queue.vassigned_applicants,
+                            expected.vassigned_applicants)
+            self.assertEqual(queue.vassigned_scores, expected.vassigned_scores)
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+from unittest import TestCase, main
+from faker import Faker
+from schoolchoice_da.entities import LotterySimulation
+from tests.test_policymaker import get_market, get_policy_maker
+import numpy as np
+import pandas as pd
+
+
+class LotterySimulationTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.market = get_market(self.fake)
+        self.rules = {'sibling_priority_activation':True,
+                    'linked_postulation_activation':True,
+                    'secured_enrollment_assignment':True,
+                    'forced_secured_enrollment_assignment':True,
+                    'transfer_capacity_activation':True}
+
+    def test_run(self):
+        policy_maker = get_policy_maker(self.market, **self.rules)
+        simulation = LotterySimulation(policy_maker)
+        n_draws = 6
+        probabilities, cutoffs = simulation.run(n_draws, random_state=1)
+
+        by_applicant = probabilities.groupby('applicant_id')
+        self.assertTrue((by_applicant['n_assigned'].sum()==n_draws).all())
+        self.assertTrue(np.allclose(by_applicant['probability'].sum(), 1))
+        self.assertEqual(set(probabilities['applicant_id']),
+                        set(policy_maker.applicants.keys()))
+        self.assertEqual(simulation.cutoff_draws.shape,
+                        (n_draws, len(simulation.queues)))
+        self.assertEqual(len(cutoffs), len(simulation.queues))
+        self.assertTrue(((cutoffs['min'] <= cutoffs['q0.5']) |
+                        cutoffs['min'].isna()).all())
+
+    def test_run_restores_lottery(self):
+        expected = get_policy_maker(self.market, **self.rules)
+        expected.match_applicants_and_programs()
+
+        policy_maker = get_policy_maker(self.market, **self.rules)
+        LotterySimulation(policy_maker).run(3, random_state=1)
+        policy_maker.match_applicants_and_programs()
+        pd.testing.assert_frame_equal(policy_maker.get_results(),
+                                        expected.get_results())
+
+    def test_parallel_run(self):
+        for tie_breaking in ['multiple', 'single']:
+            serial = LotterySimulation(get_policy_maker(self.market,
+                **self.rules), tie_breaking=tie_breaking)
+            parallel = LotterySimulation(get_policy_maker(self.market,
+                **self.rules), tie_breaking=tie_breaking)
+            serial_probabilities, serial_cutoffs = serial.run(5,
+                random_state=7)
+            parallel_probabilities, parallel_cutoffs = parallel.run(5,
+                random_state=7, n_jobs=2)
+            pd.testing.assert_frame_equal(serial_probabilities,
+                                            parallel_probabilities)
+            pd.testing.assert_frame_equal(serial_cutoffs, parallel_cutoffs)
+
+    def test_single_tie_breaking(self):
+        simulation = LotterySimulation(get_policy_maker(self.market),
+                                        tie_breaking='single')
+        scores = simulation._draw_scores(np.random.default_rng(0))
+        self.assertEqual(len(scores), len(simulation.applicant_ids))
+        for applicant_scores in scores:
+            self.assertTrue((applicant_scores==applicant_scores[:1]).all())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+from unittest import TestCase, main
+from faker import Faker
+from schoolchoice_da import generate_market
+from schoolchoice_da.entities import PolicyMaker
+import contextlib
+import io
+
+
+class GenerateMarketTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.kwargs = {'n_applicants':self.fake.random_int(200,500),
+                        'n_programs':self.fake.random_int(10,30),
+                        'n_grades':self.fake.random_int(1,3),
+                        'n_quotas':self.fake.random_int(1,3),
+                        'n_special_assignments':self.fake.random_int(0,2),
+                        'concentration':self.fake.random_int(0,20)/10,
+                        'random_state':self.fake.random_int(0,1000)}
+        self.market = generate_market(**self.kwargs)
+
+    def test_same_seed_same_market(self):
+        market = generate_market(**self.kwargs)
+        for key, df in self.market.items():
+            self.assertTrue(df.equals(market[key]), key)
+        market = generate_market(**{**self.kwargs,
+            'random_state':self.kwargs['random_state'] + 1})
+        self.assertFalse(market['applications'].equals(
+            self.market['applications']))
+
+    def test_consistency(self):
+        vacancies = self.market['vacancies']
+        applicants = self.market['applicants'].set_index('applicant_id')
+        applications = self.market['applications']
+        self.assertEqual(len(applicants),self.kwargs['n_applicants'])
+        self.assertEqual(len(vacancies),
+                        self.kwargs['n_programs']*self.kwargs['n_quotas'])
+        self.assertEqual(
+            sum('special' in column for column in vacancies.columns),
+            self.kwargs['n_special_assignments'])
+        self.assertFalse(applications.duplicated(
+            ['applicant_id','program_id','quota_id']).any())
+        # Programs are ranked once, in the grade of the applicant
+        programs = applications.merge(vacancies[['program_id','quota_id',
+            'grade_id','institution_id']],on=['program_id','quota_id'],
+            suffixes=('','_program'))
+        self.assertEqual(len(programs),len(applications))
+        self.assertTrue((programs['grade_id'] ==
+            applicants.loc[programs['applicant_id'],'grade_id'].values).all())
+        self.assertTrue((programs['institution_id'] ==
+                        programs['institution_id_program']).all())
+        rankings = applications.drop_duplicates(['applicant_id','program_id'])
+        self.assertFalse(rankings.duplicated(
+            ['applicant_id','ranking_program']).any())
+        self.assertTrue(rankings.groupby('applicant_id')['ranking_program']
+            .agg(lambda ranking: sorted(ranking) ==
+                list(range(1,len(ranking)+1))).all())
+        # Secured enrollment is in a ranked program
+        se = applicants.loc[applicants['secured_enrollment_program_id']!=0]
+        ranked = set(zip(applications['applicant_id'],
+                        applications['program_id']))
+        for applicant_id, program_id in zip(se.index,
+                se['secured_enrollment_program_id']):
+            self.assertIn((applicant_id,program_id),ranked)
+        # Relations are symmetric and links are siblings
+        for df, column in [(self.market['siblings'],'sibling_id'),
+                            (self.market['links'],'linked_id')]:
+            pairs = set(zip(df['applicant_id'],df[column]))
+            self.assertEqual(pairs,{(b,a) for a,b in pairs})
+        self.assertTrue(set(zip(self.market['links']['applicant_id'],
+            self.market['links']['linked_id'])) <=
+            set(zip(self.market['siblings']['applicant_id'],
+                    self.market['siblings']['sibling_id'])))
+
+    def test_match(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            policy_maker = PolicyMaker(**self.market,
+                                        sibling_priority_activation=True,
+                                        linked_postulation_activation=True,
+                                        secured_enrollment_assignment=True,
+                                        forced_secured_enrollment_assignment=True,
+                                        transfer_capacity_activation=True)
+            policy_maker.match_applicants_and_programs()
+        results = policy_maker.get_results()
+        self.assertEqual(len(results),self.kwargs['n_applicants'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+from unittest import TestCase, main
+from unittest import mock
+from faker import Faker
+from schoolchoice_da.entities import InputValidator, InputValidationError
+from tests.test_policymaker import get_market, get_policy_maker
+import tempfile
+import warnings
+import pandas as pd
+
+
+class InputValidatorTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.market = get_market(self.fake)
+        self.rules = {'sibling_priority_activation':True,
+                    'linked_postulation_activation':True,
+                    'secured_enrollment_assignment':True}
+        self.validator = InputValidator(sibling_priority_activation=True,
+                                        linked_postulation_activation=True,
+                                        secured_enrollment_activation=True)
+
+    def validate(self, market):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return self.validator.validate(**market)
+
+    def test_valid_inputs(self):
+        errors = self.validate(self.market)
+        self.assertEqual(list(errors.columns), InputValidator.columns)
+        self.assertEqual(len(errors), 0)
+
+    def test_every_error_reported(self):
+        market = {key:df.copy() for key,df in self.market.items()}
+        market['vacancies'] = market['vacancies'].drop(columns='grade_id')
+        market['applicants'] = pd.concat([market['applicants'],
+                                        market['applicants'].iloc[:2]])
+        market['applications'].loc[0, 'applicant_id'] = 'unknown'
+        market['siblings'].loc[0, 'sibling_id'] = 'unknown_sibling'
+        market['links'] = None
+        market['quota_order'].loc[0,
+            'secured_enrollment_quota_id_criteria'] = '~'
+
+        errors = self.validate(market).set_index('check')
+        self.assertEqual(sorted(errors.index),
+            sorted(['missing_column', 'duplicated', 'not_registered',
+                    'not_registered', 'missing_frame', 'not_registered']))
+        self.assertEqual(errors.loc['missing_column', 'column'], 'grade_id')
+        self.assertEqual(errors.loc['duplicated', 'n_rows'], 2)
+        self.assertEqual(errors.loc['missing_frame', 'frame'], 'links')
+        not_registered = errors.loc['not_registered'].set_index('frame')
+        self.assertEqual(not_registered.loc['applications', 'examples'],
+                        ['unknown'])
+        self.assertEqual(not_registered.loc['siblings', 'examples'],
+                        ['unknown_sibling'])
+        self.assertEqual(not_registered.loc['quota_order', 'examples'], ['~'])
+
+    def test_policy_maker_error(self):
+        market = dict(self.market)
+        market['applications'] = market['applications'].drop(
+            columns=['ranking_program', 'priority_number_quota'])
+        market['applicants'] = market['applicants'].drop(
+            columns='secured_enrollment_quota_id')
+        with self.assertRaises(InputValidationError) as context:
+            get_policy_maker(market, **self.rules)
+        self.assertEqual(len(context.exception.errors), 3)
+        self.assertIn('"ranking_program"', str(context.exception))
+        self.assertIn('"priority_number_quota"', str(context.exception))
+        # Missing columns were raised as KeyError and the rest as ValueError
+        self.assertIsInstance(context.exception, KeyError)
+        self.assertIsInstance(context.exception, ValueError)
+
+    def test_validation_cache(self):
+        with tempfile.TemporaryDirectory() as cache:
+            with mock.patch.object(InputValidator, 'validate',
+                    autospec=True, side_effect=InputValidator.validate) \
+                    as validate:
+                for i in range(2):
+                    get_policy_maker(self.market, validation_cache=cache,
+                                    **self.rules)
+                self.assertEqual(validate.call_count, 1)
+                # Other rules, or other inputs, are validated again
+                get_policy_maker(self.market, validation_cache=cache)
+                self.assertEqual(validate.call_count, 2)
+                market = dict(self.market)
+                market['vacancies'] = market['vacancies'].assign(
+                    regular_vacancies=market['vacancies'].regular_vacancies+1)
+                get_policy_maker(market, validation_cache=cache)
+                self.assertEqual(validate.call_count, 3)
+
+            # Invalid inputs are not cached
+            market['applications'] = market['applications'].drop(
+                columns='ranking_program')
+            for i in range(2):
+                with self.assertRaises(InputValidationError):
+                    get_policy_maker(market, validation_cache=cache)
+
+
+if __name__ == '__main__':
+    main()
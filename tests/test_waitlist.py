@@ -0,0 +1,91 @@
+from unittest import TestCase, main
+from faker import Faker
+from schoolchoice_da.entities import WaitlistStore
+import random
+import numpy as np
+
+
+class WaitlistStoreTests(TestCase):
+    """API logic test suite"""
+
+    def setUp(self) -> None:
+        self.fake = Faker()
+        Faker.seed()
+        self.store = WaitlistStore()
+        self.programs = [self.store.add_program((str(self.fake.uuid4()),
+                                                self.fake.random_digit()))
+                        for i in range(3)]
+        self.applicant_ids = [str(self.fake.uuid4()) for i in range(20)]
+        self.store.add_applicants(self.applicant_ids)
+
+    def test_add_and_remove(self):
+        expected = {program:{} for program in self.programs}
+        for i in range(200):
+            program = random.choice(self.programs)
+            applicant_id = random.choice(self.applicant_ids)
+            if self.fake.boolean(30):
+                self.store.remove(program, applicant_id)
+                expected[program].pop(applicant_id, None)
+            else:
+                priority = self.fake.random_int(1,5)
+                self.store.add(program, applicant_id, priority)
+                expected[program].pop(applicant_id, None)
+                expected[program][applicant_id] = priority
+
+        for program in self.programs:
+            waitlist = self.store.get_waitlist(program)
+            self.assertEqual(waitlist, expected[program])
+            # Sorted by priority, ties in the order the entries were written
+            self.assertEqual(list(waitlist), sorted(expected[program],
+                key=lambda applicant_id: expected[program][applicant_id]))
+
+        waitlists = self.store.get_waitlists()
+        self.assertEqual(len(waitlists),
+                        sum(len(waitlist) for waitlist in expected.values()))
+        for program, waitlist in waitlists.groupby('program'):
+            self.assertEqual(list(waitlist['applicant_id']),
+                            list(self.store.get_waitlist(program)))
+            self.assertEqual(list(waitlist['waitlist_rank']),
+                            list(range(1, len(waitlist) + 1)))
+
+    def test_seed_and_reset(self):
+        program = self.programs[0]
+        seeded, added = self.applicant_ids[:5], self.applicant_ids[5:10]
+        self.store.seed(program, seeded, [1]*len(seeded))
+        self.store.add_many(program, added, [2]*len(added))
+        self.store.remove(program, seeded[0])
+        self.assertEqual(list(self.store.get_waitlist(program)),
+                        seeded[1:] + added)
+
+        self.store.reset()
+        self.assertEqual(list(self.store.get_waitlist(program)), seeded)
+
+        self.store.add_many(program, added, [0]*len(added))
+        self.store.reset_program(program)
+        self.assertEqual(list(self.store.get_waitlist(program)), seeded)
+
+        # drop removes the seeded entry, and a later seed brings it back
+        self.store.drop(program, seeded[0])
+        self.assertNotIn(seeded[0], self.store.get_waitlist(program))
+        self.store.seed(program, [seeded[0]], [3])
+        self.assertEqual(self.store.get_waitlist(program)[seeded[0]], 3)
+
+        self.store.add(program, seeded[1], 4)
+        self.store.restore_seed(program, seeded[1])
+        self.assertEqual(self.store.get_waitlist(program)[seeded[1]], 1)
+
+        self.store.remove_applicant(seeded[1])
+        self.store.reset()
+        self.assertNotIn(seeded[1], self.store.get_waitlist(program))
+
+    def test_disabled(self):
+        store = WaitlistStore(enabled=False)
+        program = store.add_program((0, 0))
+        store.seed(program, self.applicant_ids, np.ones(len(self.applicant_ids)))
+        store.add(program, self.applicant_ids[0], 1)
+        self.assertEqual(store.get_waitlist(program), {})
+        self.assertEqual(len(store.get_waitlists()), 0)
+
+
+if __name__ == '__main__':
+    main()